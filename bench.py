@@ -0,0 +1,121 @@
+"Host-side transfer benchmark, run against the simulated GPIO backend"
+
+import argparse
+import json
+import time
+
+from board import Board, BCM_PINS
+from gpio_backend import SimGPIO
+import emu
+
+
+def make_board(gpio=None, **kwargs):
+    "A board on the simulated backend (or gpio), with no reset delays"
+    if gpio is None:
+        gpio = SimGPIO(BCM_PINS)
+    return Board(gpio, BCM_PINS, reset_delay=0, **kwargs)
+
+
+def bench_download(size, validate=True, repeat=3, block_crc=0, stats=False, burst=False,
+                  trace=False):
+    "Time dload_exec of size bytes; returns the best seconds per run"
+    board = make_board()
+    board.validate = validate
+    board.block_crc = block_crc
+    board.burst = burst
+    board.strobe_gap = 0    # the simulated 6809 takes bytes at once: time the host side
+    if stats:
+        board.enable_stats()
+    if trace:
+        board.enable_trace()
+    data = bytes(range(256)) * (size // 256) + bytes(size % 256)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        board.dload_exec(0x1000, data, 0x1000)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    assert board.gpio.target.memory[0x1000:0x1000 + size] == data
+    return best
+
+
+def bench_emulated(size, repeat=3):
+    """Time dload_exec of size bytes into the emulated 6809 (see emu.py).
+
+    Returns the best seconds per run, and the 6809 cycles per byte of
+    that run, not counting time it spent waiting for the host.
+    """
+    board = make_board(emu.EmuGPIO(BCM_PINS))
+    machine = board.gpio.target
+    data = bytes([0x39]) + (bytes(range(256)) * (size // 256 + 1))[1:size] # RTS first, so it returns
+    best = None
+    for _ in range(repeat):
+        busy = machine.cpu.cycles - machine.cpu.idle_cycles
+        start = time.perf_counter()
+        board.dload_exec(0x1000, data, 0x1000)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+            cycles = machine.cpu.cycles - machine.cpu.idle_cycles - busy
+    assert machine.memory[0x1000:0x1000 + size] == data
+    return best, cycles / size
+
+
+def bench_listen(size, repeat=3):
+    "Time get_bytes draining size bytes of console output; returns the best seconds per run"
+    board = make_board()
+    board.dload_exec(0x1000, b'', 0x1000)   # start the "program" so port B is in handshake mode
+    target = board.gpio.target
+    best = None
+    for _ in range(repeat):
+        target.write(bytes(size))
+        received = 0
+        start = time.perf_counter()
+        while received < size:
+            received += len(board.get_bytes())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(name, size, seconds):
+    result = {
+        'path': name,
+        'bytes': size,
+        'seconds': seconds,
+        'us_per_byte': seconds * 1e6 / size,
+        'bytes_per_second': size / seconds,
+    }
+    print("%-18s %8d bytes %10.2f us/byte %12.0f bytes/s" %
+          (name, size, result['us_per_byte'], result['bytes_per_second']))
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--bytes', type=int, default=16384, help="transfer size")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per path, best is reported")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = [
+        report('download', args.bytes, bench_download(args.bytes, True, args.repeat)),
+        report('download-novalid', args.bytes, bench_download(args.bytes, False, args.repeat)),
+        report('download-crc', args.bytes, bench_download(args.bytes, True, args.repeat, 256)),
+        report('download-burst', args.bytes, bench_download(args.bytes, False, args.repeat, 0, False, True)),
+        report('download-stats', args.bytes, bench_download(args.bytes, True, args.repeat, 0, True)),
+        report('download-trace', args.bytes, bench_download(args.bytes, True, args.repeat, 0, False, False, True)),
+        report('listen', args.bytes, bench_listen(args.bytes, args.repeat)),
+    ]
+    seconds, cycles = bench_emulated(args.bytes, args.repeat)
+    results.append(report('download-emu', args.bytes, seconds))
+    results[-1]['target_cycles_per_byte'] = cycles
+    print("%-18s %8s       %10.1f 6809 cycles/byte" % ('', '', cycles))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return results
+
+
+if __name__ == '__main__':
+    main()
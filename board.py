@@ -0,0 +1,776 @@
+"Host side of the Raspberry Pi to 6809 link, over a pluggable GPIO backend"
+
+import asyncio
+import time
+
+from edgewait import EdgeWaiter
+from protocol import (DLOAD_EXEC, DLOAD_CRC, CHECKSUM, DLOAD_BULK, DLOAD_FRAMED, DLOAD_BURST,
+                      ACK, NAK, crc16)
+import bundle
+import burst
+import ex9
+import framed
+import lz
+from runtime import Runtime
+from stats import TransferStats
+import timing
+import bustrace
+
+STROBE_GAP_MIN = 0.000002   # seconds: burst strobes never come closer together than this
+
+# Pin map for the main board, in Broadcom GPIO numbering
+BCM_PINS = {
+    # 6809 processor control (output, active-high)
+    'NMI': 8,           # GP08
+
+    # data bus (input/output)
+    'D0': 17,           # GP17
+    'D1': 18,           # GP18
+    'D2': 27,           # GP27
+    'D3': 22,           # GP22
+    'D4': 23,           # GP23
+    'D5': 10,           # GP10
+    'D6': 9,            # GP09
+    'D7': 11,           # GP11
+
+    # chip selects (output, active-low, pull-up)
+    'CS_portB': 7,      # CS0 GP07 - only port B drives the data bus
+    'CS_portA': 5,      # CS1 GP05
+    'CS_handshake': 6,  # CS2 GP06 - setting CS2 high resets 6809
+    'CS_x_axis': 2,     # CS3 GP02
+    'CS_y_axis': 3,     # CS4 GP03
+
+    # HCTL2000 control signals
+    'HCTL_CLK': 4,      # GP04
+    'HCTL_RST': 21,     # GP21
+    # 'HCTL_SEL', the byte select (low for the high byte), isn't wired on
+    # this board; a profile that has it gets 12-bit reads (see boards.json)
+
+    # mouse button inputs
+    'PB_1_2': 19,       # GP19
+    'PB_2_3': 26,       # GP26
+
+    # handshakes (active-low)
+    'CA1': 12,          # GP12 - output, port A "data ready"
+    'CA2': 13,          # GP13 - input, port A "data taken"
+    'CB1': 16,          # GP16 - output, port B "data taken"
+    'CB2': 20,          # GP20 - input, port B "data ready"
+}
+
+
+class Board:
+    "One 6809 board, driven through a GPIO backend"
+
+    def __init__(self, gpio, pins=BCM_PINS, mode=None, reset_delay=0.3, timeout=1.0, name='board',
+                 active_low=True):
+        self.gpio = gpio
+        self.pins = pins
+        self.name = name        # key for this board's saved settings
+        self.reset_delay = reset_delay
+        self.validate = True    # read back each downloaded byte from port B
+        self.block_crc = 0      # if set, verify downloads by CRC over blocks of this size instead
+        self.framed = 0         # if set, send downloads as acknowledged frames of this size
+        self.block_timeout = 0.1 # seconds to wait for a frame's acknowledgement
+        self.resume_log = None  # a framed.ResumeLog, so interrupted framed downloads can resume
+        self.burst = False      # send downloads in windows strobed without per-byte handshake
+        self.max_retries = 5    # attempts at a block before giving up
+        self.resent_blocks = 0
+        self.bytes_sent = 0     # running total put on port A, for progress seen from another thread
+        self.compress = False   # send downloads LZ-compressed, with a decompressor stub
+        self.memtop = 0xFE00    # top of RAM free for staging the stub: the 6522 and ROM are above
+        self.manifest = None    # a manifest.Manifest, to skip downloads already resident
+        self.nmi_interval = 5   # seconds between NMIs while listening
+        self.poll_interval = 0.02 # seconds between button/position checks while listening
+        self.stats = None       # a stats.TransferStats while enable_stats() is in force
+        # seconds get_bytes() waits for the next byte of a burst, and seconds
+        # between strobes in a burst download; see calibrate()
+        saved = timing.load(name, {'byte_gap': 0.0002, 'strobe_gap': 0.00002})
+        self.byte_gap = saved['byte_gap']
+        self.strobe_gap = saved['strobe_gap']
+
+        GPIO = gpio
+        assert GPIO.getmode() == None
+        GPIO.setmode(GPIO.BCM if mode is None else mode)
+
+        self.NMI = pins['NMI']
+        GPIO.setup(self.NMI, GPIO.OUT)
+        GPIO.output(self.NMI, GPIO.LOW) # set NMI low before we take the 6809 out of reset
+        self.RST = pins.get('RST')      # a separate reset line, on some boards: held low
+        if self.RST is not None:
+            GPIO.setup(self.RST, GPIO.OUT)
+            GPIO.output(self.RST, GPIO.LOW)
+
+        self.data_bus = [pins['D%d' % bit] for bit in range(7, -1, -1)] # D7..D0
+        self.bus_pins = self.data_bus[::-1]                             # D0..D7
+
+        self.CS_portA = pins['CS_portA']
+        self.CS_portB = pins['CS_portB']
+        self.CS_handshake = pins['CS_handshake']
+        self.CS_x_axis = pins.get('CS_x_axis')
+        self.CS_y_axis = pins.get('CS_y_axis')
+        self.chip_selects = [pins[name] for name in
+                             ('CS_portB', 'CS_portA', 'CS_handshake', 'CS_x_axis', 'CS_y_axis')
+                             if name in pins]
+        GPIO.setup(self.chip_selects, GPIO.OUT)
+        GPIO.output(self.chip_selects, GPIO.HIGH) # setting CS2 high resets 6809
+
+        self.hctl_controls = [pins[name] for name in ('HCTL_CLK', 'HCTL_RST', 'HCTL_SEL')
+                              if name in pins]
+        GPIO.setup(self.hctl_controls, GPIO.OUT)
+        self.HCTL_SEL = pins.get('HCTL_SEL')
+        if self.HCTL_SEL is not None:
+            GPIO.output(self.HCTL_SEL, GPIO.HIGH)
+
+        self.mouse_inputs = [pins[name] for name in ('PB_1_2', 'PB_2_3') if name in pins]
+        GPIO.setup(self.mouse_inputs, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+
+        self.PortA_DATA_READY = pins['CA1']
+        self.PortA_DATA_TAKEN = pins['CA2']
+        self.PortB_DATA_TAKEN = pins['CB1']
+        self.PortB_DATA_READY = pins['CB2']
+        # Handshake levels: asserted, idle, and the edge that asserts an input
+        if active_low:
+            self.hs_active, self.hs_idle, self.hs_edge = GPIO.LOW, GPIO.HIGH, GPIO.FALLING
+        else:
+            self.hs_active, self.hs_idle, self.hs_edge = GPIO.HIGH, GPIO.LOW, GPIO.RISING
+        GPIO.setup(self.PortA_DATA_READY, GPIO.OUT) # "data ready" output
+        GPIO.setup(self.PortA_DATA_TAKEN, GPIO.IN)  # "data taken" input
+        GPIO.setup(self.PortB_DATA_TAKEN, GPIO.OUT) # "data taken" output
+        GPIO.setup(self.PortB_DATA_READY, GPIO.IN)  # "data ready" input
+        GPIO.output([self.PortA_DATA_READY, self.PortB_DATA_TAKEN], self.hs_idle) # clear handshakes
+
+        self.bus_owner = None
+        self.bus_direction = GPIO.IN
+        GPIO.setup(self.data_bus, self.bus_direction)
+
+        self.reset()
+        self.start_hctl()
+
+        # We have to catch edges on the handshake inputs because the 6522 is
+        # still in strobe mode during download, so we'd miss the low state if
+        # we just polled for it.
+        self.data_taken = EdgeWaiter(GPIO, self.PortA_DATA_TAKEN, self.hs_edge, timeout=timeout)
+        self.data_ready = EdgeWaiter(GPIO, self.PortB_DATA_READY, self.hs_edge, timeout=timeout)
+
+        self.prev_buttons = None
+
+    def reset(self):
+        "Reset the 6809 through CS2"
+        GPIO = self.gpio
+        GPIO.output(self.CS_handshake, GPIO.HIGH)
+        time.sleep(self.reset_delay) # give the 6809 time to reset, after CS2 going high above
+        # Enable IC2 to pass handshake signals to/from target. This also
+        # takes the 6809 out of reset.
+        GPIO.output(self.CS_handshake, GPIO.LOW)
+        time.sleep(self.reset_delay) # give the 6809 time to come out of reset (?)
+
+    def start_hctl(self):
+        "Reset both HCTL-2000s and start their clock"
+        GPIO = self.gpio
+        if 'HCTL_RST' not in self.pins:
+            return
+        GPIO.output(self.pins['HCTL_RST'], GPIO.LOW)  # reset the HCTL2000s
+        GPIO.output(self.pins['HCTL_RST'], GPIO.HIGH)
+        # Start the clock to the HCTL-2000s
+        self.pwm = GPIO.PWM(self.pins['HCTL_CLK'], 10000)
+        self.pwm.start(50) # 50% duty cycle
+
+    def claim_bus(self, cs, dir):
+        "Acquire exclusive use of the data bus, for a particular chip select"
+        GPIO = self.gpio
+        assert self.bus_owner == None
+        self.bus_owner = cs
+        GPIO.output(self.bus_owner, GPIO.LOW)  # enable the selected chip
+
+        if self.bus_direction != dir:
+            self.bus_direction = dir
+            GPIO.setup(self.data_bus, self.bus_direction)
+
+    def release_bus(self, cs):
+        "Release the previous exclusive use of the data bus"
+        GPIO = self.gpio
+        assert self.bus_owner != None
+        assert self.bus_owner == cs
+        GPIO.output(self.bus_owner, GPIO.HIGH)  # disable the current owning chip
+        self.bus_owner = None
+
+        if self.bus_direction != GPIO.IN:
+            self.bus_direction = GPIO.IN
+            GPIO.setup(self.data_bus, self.bus_direction)
+
+    def bus_read_int8(self):
+        "Read the 8 bits of the data bus into an integer"
+        return self.gpio.read_byte(self.bus_pins)
+
+    def bus_read(self):
+        "Read the 8 bits of the data bus a list"
+        int8 = self.bus_read_int8()
+        return [int(x) for x in '{:08b}'.format(int8)]
+
+    def send_bytes(self, out_bytes):
+        "write a series of bytes to Port A, with handshake, and read back from port B"
+        GPIO = self.gpio
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        for int8 in out_bytes:
+            assert int8 < 256
+            self.gpio.write_byte(self.bus_pins, int8)
+            GPIO.output(self.PortA_DATA_READY, self.hs_active)   # signal data ready
+            # Wait for the 6809 to signal data taken.
+            try:
+                self.data_taken.wait()
+            finally:
+                GPIO.output(self.PortA_DATA_READY, self.hs_idle)  # clear data ready
+            self.bytes_sent += 1
+
+            # Optional readback validation of sent byte
+            if self.validate:
+                self.data_ready.wait()
+
+                # read back
+                # setup for input from port B
+                self.release_bus(self.CS_portA)
+                self.claim_bus(self.CS_portB, GPIO.IN)
+
+                # read data from bus, compare output and input
+                input = self.bus_read_int8()
+                if input != int8:
+                    print("output = ", hex(int8), "input = ", hex(input))
+                    if stats is not None:
+                        stats.mismatches += 1
+
+                # Note that we don't signal "data taken" during download validation,
+                # as the 6809 is in strobe mode and isn't looking for it. Also,
+                # signalling data taken was causing us to miss the first byte sent
+                # by the downloaded program.
+                self.release_bus(self.CS_portB)
+                self.claim_bus(self.CS_portA, GPIO.OUT)
+
+        if stats is not None:
+            stats.bytes_sent += len(out_bytes)
+            stats.send_time += time.perf_counter() - start
+
+    def send_word(self, word):
+        "Helper function to send a 16-bit integer, in hi-lo order"
+        self.send_bytes(word.to_bytes(2, byteorder='big'))
+        return word
+
+    def get_bytes(self):
+        "read a (possibly empty) sequence of bytes from the 6809. Non-blocking."
+        GPIO = self.gpio
+        in_bytes = bytearray() # return value, possibly empty
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        self.claim_bus(self.CS_portB, GPIO.IN)
+
+        # check for data ready on port B (active low)
+        while self.hs_active == GPIO.input(self.PortB_DATA_READY):
+            # Data ready, so read the bus and append to in_bytes.
+            # This assumes that the data bus is set for input,
+            # and that the port B chip select is active.
+            int8 = self.bus_read_int8()
+            # Pulse PortB_DATA_TAKEN (CB1) active low.
+            # This will set PortB_DATA_READY (CB2) high immediately,
+            # so if we see it low again at the top of the loop then it's a new byte.
+            GPIO.output(self.PortB_DATA_TAKEN, self.hs_active)
+            in_bytes.append(int8)
+            GPIO.output(self.PortB_DATA_TAKEN, self.hs_idle)
+            # Give the 6809 up to byte_gap to send the next byte (if any)
+            deadline = time.perf_counter() + self.byte_gap
+            while (GPIO.input(self.PortB_DATA_READY) != self.hs_active and
+                   time.perf_counter() < deadline):
+                pass
+
+        self.release_bus(self.CS_portB)
+
+        if stats is not None and in_bytes:
+            stats.bytes_received += len(in_bytes)
+            stats.receive_time += time.perf_counter() - start
+        return in_bytes
+
+    def recv_bytes(self, count, timeout=None):
+        "read exactly count bytes from the 6809, waiting up to timeout for each"
+        GPIO = self.gpio
+        in_bytes = bytearray()
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        self.claim_bus(self.CS_portB, GPIO.IN)
+        try:
+            while len(in_bytes) < count:
+                if self.hs_active != GPIO.input(self.PortB_DATA_READY):
+                    self.data_ready.wait(timeout)
+                    continue
+                in_bytes.append(self.bus_read_int8())
+                GPIO.output(self.PortB_DATA_TAKEN, self.hs_active)   # signal data taken
+                GPIO.output(self.PortB_DATA_TAKEN, self.hs_idle)
+        finally:
+            self.release_bus(self.CS_portB)
+
+        if stats is not None:
+            stats.bytes_received += len(in_bytes)
+            stats.receive_time += time.perf_counter() - start
+        return in_bytes
+
+    def calibrate(self, samples=32, save=True):
+        """Measure the 6809's gap between the bytes it sends, and set byte_gap from it.
+
+        Each CHECKSUM reply is two bytes back to back, so the time from
+        taking the first to the second being ready is the target's
+        inter-byte latency. Needs a bootloader that answers CHECKSUM.
+        The slowest data taken seen while sending the requests sets
+        strobe_gap for burst downloads.
+        """
+        GPIO = self.gpio
+        gaps = []
+        validate = self.validate
+        self.validate = False
+        self.data_taken.reset_stats()
+        try:
+            for _ in range(samples):
+                self.claim_bus(self.CS_portA, GPIO.OUT)
+                try:
+                    self.send_bytes(bytes([CHECKSUM]))
+                    self.send_word(0)
+                    self.send_word(1)
+                finally:
+                    self.release_bus(self.CS_portA)
+                self.claim_bus(self.CS_portB, GPIO.IN)
+                try:
+                    while GPIO.input(self.PortB_DATA_READY) != self.hs_active:
+                        self.data_ready.wait()
+                    self.bus_read_int8()
+                    GPIO.output(self.PortB_DATA_TAKEN, self.hs_active)
+                    GPIO.output(self.PortB_DATA_TAKEN, self.hs_idle)
+                    start = time.perf_counter()
+                    while GPIO.input(self.PortB_DATA_READY) != self.hs_active:
+                        if time.perf_counter() - start > self.data_ready.timeout:
+                            raise TimeoutError("no second byte from CHECKSUM")
+                    gaps.append(time.perf_counter() - start)
+                    self.bus_read_int8()
+                    GPIO.output(self.PortB_DATA_TAKEN, self.hs_active)
+                    GPIO.output(self.PortB_DATA_TAKEN, self.hs_idle)
+                finally:
+                    self.release_bus(self.CS_portB)
+        finally:
+            self.validate = validate
+
+        self.byte_gap = timing.pick(gaps, floor=0.00001)
+        print("byte gap: worst %.1f us, using %.1f us" % (max(gaps) * 1e6, self.byte_gap * 1e6))
+        self.strobe_gap = timing.pick([self.data_taken.max_latency], floor=STROBE_GAP_MIN)
+        print("strobe gap: %.1f us" % (self.strobe_gap * 1e6))
+        if save:
+            timing.save(self.name, {'byte_gap': self.byte_gap, 'strobe_gap': self.strobe_gap})
+        return self.byte_gap
+
+    def pulse_nmi(self):
+        "Pulse the 6809's NMI input"
+        GPIO = self.gpio
+        GPIO.output(self.NMI, GPIO.HIGH)
+        time.sleep(0.000001)
+        GPIO.output(self.NMI, GPIO.LOW)
+
+    def listen(self):
+        "Wait for bytes from the 6809 and output them to the console (see runtime.py)"
+        asyncio.run(Runtime(self).run())
+
+    def wait_stats(self):
+        "Latency accounting for the handshake waits"
+        return {'data_taken': self.data_taken.stats(), 'data_ready': self.data_ready.stats()}
+
+    def enable_stats(self):
+        "Start collecting transfer statistics (see stats.py); returns the collector"
+        self.stats = TransferStats()
+        self.data_taken.recorder = self.stats.recorder('data_taken')
+        self.data_ready.recorder = self.stats.recorder('data_ready')
+        return self.stats
+
+    def disable_stats(self):
+        "Stop collecting; returns what was collected"
+        collected = self.stats
+        self.stats = None
+        self.data_taken.recorder = None
+        self.data_ready.recorder = None
+        return collected
+
+    def enable_trace(self, size=65536):
+        "Start recording bus transactions (see bustrace.py); returns the tracer"
+        self.disable_trace()
+        tracer = bustrace.Tracer(size)
+        GPIO = self.gpio
+        tracer.meta = {
+            'pins': self.pins,
+            'data_bus': self.bus_pins,
+            'edges': {self.PortA_DATA_TAKEN: self.hs_edge, self.PortB_DATA_READY: self.hs_edge},
+        }
+        # Start the trace from the lines as they are now, reached from all
+        # of them high (6809 in reset) the way __init__() gets there, so a
+        # replay can bring a fresh backend to the same state
+        outputs = [self.NMI, self.PortA_DATA_READY, self.PortB_DATA_TAKEN] \
+            + self.hctl_controls + self.chip_selects
+        levels = [GPIO.input(pin) for pin in outputs]
+        for pin in outputs:
+            tracer.record(bustrace.SETUP, pin, GPIO.OUT)
+            tracer.record(bustrace.OUT, pin, GPIO.HIGH)
+        for pin, level in zip(outputs, levels):
+            tracer.record(bustrace.OUT, pin, level)
+        tracer.record(bustrace.BUS, 0, self.bus_direction)
+        self.gpio = bustrace.TracingGPIO(GPIO, tracer, self.data_bus)
+        self.data_taken.gpio = self.data_ready.gpio = self.gpio
+        return tracer
+
+    def disable_trace(self):
+        "Stop recording; returns the tracer, or None if there wasn't one"
+        if not isinstance(self.gpio, bustrace.TracingGPIO):
+            return None
+        tracer = self.gpio.tracer
+        self.gpio = self.data_taken.gpio = self.data_ready.gpio = self.gpio.gpio
+        return tracer
+
+    def dload_exec(self, load_addr, data, exec_addr):
+        "Download bytes and execute specified address - not necessarily within the download"
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+
+        if self.burst:
+            self.dload_exec_burst(load_addr, data, exec_addr)
+        elif self.framed:
+            self.dload_exec_framed(load_addr, data, exec_addr, self.framed)
+        elif self.block_crc:
+            self.dload_exec_crc(load_addr, data, exec_addr, self.block_crc)
+        else:
+            self.claim_bus(self.CS_portA, self.gpio.OUT)
+            try:
+                self.send_bytes(bytes([DLOAD_EXEC]))  # send the download prefix byte
+                self.send_word(load_addr)     # send the destination addess
+                self.send_word(len(data))     # send the data length
+                self.send_bytes(data)         # send the data
+                self.send_word(exec_addr)     # send the execution address
+            finally:
+                self.release_bus(self.bus_owner)
+
+        if stats is not None:
+            stats.transfer(len(data), time.perf_counter() - start)
+
+    def dload_exec_crc(self, load_addr, data, exec_addr, block_size=256):
+        """Download bytes with a CRC-16 check per block, then execute.
+
+        Rather than reading back every byte, which turns the bus round
+        twice per byte, the 6809 returns one CRC per block over port B and
+        only blocks that fail are sent again.
+        """
+        validate = self.validate
+        self.validate = False
+        self.claim_bus(self.CS_portA, self.gpio.OUT)
+        try:
+            self.send_bytes(bytes([DLOAD_CRC]))
+            self.send_word(load_addr)
+            self.send_word(len(data))
+            self.send_word(block_size)
+
+            view = memoryview(data)
+            for offset in range(0, len(data), block_size):
+                block = view[offset:offset + block_size]
+                crc = crc16(block)
+                for attempt in range(self.max_retries):
+                    self.send_bytes(block)
+                    self.release_bus(self.CS_portA)
+                    reply = self.recv_bytes(2)
+                    self.claim_bus(self.CS_portA, self.gpio.OUT)
+                    if int.from_bytes(reply, 'big') == crc:
+                        self.send_bytes(bytes([ACK]))
+                        break
+                    self.resent_blocks += 1
+                    self.send_bytes(bytes([NAK]))
+                else:
+                    raise IOError("block at %s failed CRC %d times" %
+                                  (hex(load_addr + offset), self.max_retries))
+
+            self.send_word(exec_addr)
+        finally:
+            self.validate = validate
+            if self.bus_owner is not None:
+                self.release_bus(self.bus_owner)
+
+    def dload_exec_burst(self, load_addr, data, exec_addr):
+        """Download bytes in windows strobed at strobe_gap without waiting for each byte, then execute.
+
+        The 6809 checks each window with a CRC-16 (see burst.py), so the
+        per-byte round trip goes, and the window and strobe gap adapt to errors.
+        """
+        window = burst.Window(self.strobe_gap, STROBE_GAP_MIN, max_retries=self.max_retries)
+        view = memoryview(data)
+        validate = self.validate
+        self.validate = False
+        try:
+            self.claim_bus(self.CS_portA, self.gpio.OUT)
+            try:
+                self.send_bytes(burst.header(DLOAD_BURST, load_addr, len(data)))
+            finally:
+                self.release_bus(self.CS_portA)
+            offset = 0
+            while offset < len(data):
+                chunk = view[offset:offset + window.size]
+                self.claim_bus(self.CS_portA, self.gpio.OUT)
+                try:
+                    self.send_word(len(chunk))
+                    self.send_strobed(chunk, window.gap)
+                finally:
+                    self.release_bus(self.CS_portA)
+                good = burst.check(self.burst_reply(len(chunk), window.gap), chunk)
+                self.claim_bus(self.CS_portA, self.gpio.OUT)
+                try:
+                    self.send_bytes(bytes([ACK if good else NAK]))
+                finally:
+                    self.release_bus(self.CS_portA)
+                if good:
+                    offset += len(chunk)
+                    window.ok()
+                    continue
+                self.resent_blocks += 1
+                if not window.failed():
+                    raise IOError("window at %s still failing with a %.1f us strobe gap" %
+                                  (hex(load_addr + offset), window.gap * 1e6))
+            self.claim_bus(self.CS_portA, self.gpio.OUT)
+            try:
+                self.send_word(0)
+                self.send_word(exec_addr)
+            finally:
+                self.release_bus(self.CS_portA)
+        finally:
+            self.validate = validate
+        if window.slowed:
+            self.strobe_gap = window.gap
+            timing.save(self.name, {'strobe_gap': self.strobe_gap})
+            print ("burst strobe gap raised to %.1f us" % (self.strobe_gap * 1e6))
+
+    def send_strobed(self, out_bytes, gap):
+        "Write bytes to port A with a CA1 strobe every gap seconds, not waiting for data taken"
+        GPIO = self.gpio
+        write_byte = GPIO.write_byte
+        output = GPIO.output
+        bus_pins = self.bus_pins
+        ca1 = self.PortA_DATA_READY
+        active, idle = self.hs_active, self.hs_idle
+        perf_counter = time.perf_counter
+        next_time = perf_counter()
+        for int8 in out_bytes:
+            write_byte(bus_pins, int8)
+            while perf_counter() < next_time:
+                pass
+            output(ca1, active)
+            output(ca1, idle)
+            next_time = perf_counter() + gap
+        self.bytes_sent += len(out_bytes)
+        self.data_taken.discard()
+
+    def burst_reply(self, count, gap):
+        """The CRC of a burst window; if bytes were lost, pad until it comes.
+
+        Returns None if the target never answers.
+        """
+        try:
+            return self.recv_bytes(2, timeout=self.block_timeout)
+        except TimeoutError:
+            pass
+        for _ in range(count):
+            self.claim_bus(self.CS_portA, self.gpio.OUT)
+            try:
+                self.send_strobed(bytes([burst.PAD]), gap)
+            finally:
+                self.release_bus(self.CS_portA)
+            try:
+                return self.recv_bytes(2, timeout=0.01)
+            except TimeoutError:
+                pass
+        return None
+
+    def dload_exec_framed(self, load_addr, data, exec_addr, block_size=256):
+        """Download bytes as sequence-numbered, acknowledged frames, then execute (see framed.py).
+
+        A NAKed frame is sent again. If the target stops answering, it will
+        have dropped out of the transfer, so the header goes again and the
+        transfer carries on from the first unacknowledged block. If the
+        transfer is interrupted (Ctrl-C, or a block that never gets
+        through), that block goes in the resume log, and the next download
+        of the same data to the same address starts from there.
+        """
+        transfer = framed.key(load_addr, data)
+        log = self.resume_log
+        first = log.start(transfer, block_size) if log is not None else 0
+        blocks = (len(data) + block_size - 1) // block_size
+        if first:
+            print ("resuming at block", first, "of", blocks)
+
+        view = memoryview(data)
+        validate = self.validate
+        self.validate = False
+        seq = first
+        restarts = 0
+        try:
+            if first:
+                time.sleep(2 * framed.FRAME_TIMEOUT) # make sure the target isn't mid-frame
+            while True:
+                self.claim_bus(self.CS_portA, self.gpio.OUT)
+                try:
+                    self.send_bytes(framed.header(DLOAD_FRAMED, load_addr, len(data), block_size))
+                finally:
+                    self.release_bus(self.CS_portA)
+                try:
+                    while seq < blocks:
+                        self.send_frame(seq, view[seq * block_size:(seq + 1) * block_size])
+                        seq += 1
+                    self.send_frame(framed.END, exec_addr.to_bytes(2, 'big'))
+                    break
+                except TimeoutError:
+                    # The target drops out of the transfer when the bytes stop,
+                    # so wait for that and pick up again from the header.
+                    restarts += 1
+                    if restarts > self.max_retries:
+                        raise IOError("frame %d timed out %d times" % (seq, restarts))
+                    time.sleep(2 * framed.FRAME_TIMEOUT)
+        except (KeyboardInterrupt, IOError):
+            print ("download interrupted with %d of %d blocks acknowledged" % (seq, blocks))
+            if log is not None:
+                log.interrupted(transfer, block_size, seq)
+            raise
+        finally:
+            self.validate = validate
+        if log is not None:
+            log.finished(transfer)
+
+    def send_frame(self, seq, payload):
+        "Send one frame until the target acknowledges it; TimeoutError if it stops answering"
+        out = framed.frame(seq, payload)
+        for attempt in range(self.max_retries):
+            self.claim_bus(self.CS_portA, self.gpio.OUT)
+            try:
+                self.send_bytes(out)
+            finally:
+                self.release_bus(self.CS_portA)
+            if framed.acked(self.recv_bytes(3, timeout=self.block_timeout), seq):
+                return
+            self.resent_blocks += 1
+        raise IOError("frame %d not acknowledged after %d attempts" % (seq, self.max_retries))
+
+    def dload_exec_compressed(self, load_addr, data, exec_addr, staging_addr=None):
+        """Download bytes compressed, with the decompressor stub in front, then execute.
+
+        The stub and compressed data go to staging_addr, which defaults to
+        just above the destination (or below it, if there's no room there),
+        within free RAM: from lz.RAM_BOTTOM up to memtop. The stub unpacks
+        into place and jumps to exec_addr. Raises ValueError if the stub
+        image doesn't fit in free RAM clear of the destination.
+        """
+        start = time.time()
+        packed = lz.compress(data)
+        image = lz.stub_image(load_addr, len(data), exec_addr, packed)
+        if len(image) >= len(data):
+            return self.dload_exec(load_addr, data, exec_addr) # doesn't pay
+
+        if staging_addr is None:
+            staging_addr = lz.staging_addr(load_addr, len(data), len(image), self.memtop)
+        elif (staging_addr < lz.RAM_BOTTOM or staging_addr + len(image) > self.memtop or
+              (staging_addr < load_addr + len(data) and load_addr < staging_addr + len(image))):
+            raise ValueError("staging area %04X-%04X is outside free RAM or overlaps the destination" %
+                             (staging_addr, staging_addr + len(image)))
+
+        self.dload_exec(staging_addr, image, staging_addr)
+        if self.manifest is not None:
+            self.manifest.overwritten(staging_addr, len(image))
+        elapsed = time.time() - start
+        print ("compressed", len(data), "to", len(image), "bytes",
+               "(ratio %.2f)," % (len(data) / len(image)),
+               "effective %.0f bytes/s" % (len(data) / elapsed if elapsed else 0))
+
+    def dload_bundle(self, filename):
+        "Download a bundle made by bundle.py in one transaction, and run its trampoline"
+        body = bundle.load(filename)
+        print ("bundle", filename, "length =", len(body))
+        stats = self.stats
+        if stats is not None:
+            start = time.perf_counter()
+        self.claim_bus(self.CS_portA, self.gpio.OUT)
+        try:
+            self.send_bytes(bytes([DLOAD_BULK]))
+            self.send_bytes(body)
+        finally:
+            self.release_bus(self.bus_owner)
+        if stats is not None:
+            stats.transfer(len(body), time.perf_counter() - start)
+
+    def checksum(self, addr, length):
+        "Ask the 6809 for the CRC-16 of a region of its memory; None if it doesn't answer"
+        validate = self.validate
+        self.validate = False
+        self.claim_bus(self.CS_portA, self.gpio.OUT)
+        try:
+            self.send_bytes(bytes([CHECKSUM]))
+            self.send_word(addr)
+            self.send_word(length)
+        finally:
+            self.validate = validate
+            self.release_bus(self.CS_portA)
+        try:
+            return int.from_bytes(self.recv_bytes(2, timeout=0.1), 'big')
+        except TimeoutError:
+            return None
+
+    def dload_exec_file(self, filename):
+        "Download and execute the specified file"
+        if filename.endswith('.b9'):
+            return self.dload_bundle(filename)
+        load_addr, data, exec_addr = ex9.load(filename)
+        print ("load address = ", hex(load_addr),
+               "length = ", len(data),
+               "exec address = ", hex(exec_addr));
+
+        manifest = self.manifest
+        if manifest is not None and manifest.resident(filename, data, load_addr,
+                                                      exec_addr, self.checksum):
+            # Already in RAM: a zero-length download just runs it
+            print (filename, "unchanged, not downloaded")
+            self.dload_exec(load_addr, b'', exec_addr)
+            return
+
+        if self.compress:
+            self.dload_exec_compressed(load_addr, data, exec_addr)
+        else:
+            self.dload_exec(load_addr, data, exec_addr)
+
+        if manifest is not None:
+            manifest.record(filename, data, load_addr, exec_addr)
+            manifest.save()
+
+    def chk_buttons(self):
+        GPIO = self.gpio
+        if not self.mouse_inputs:
+            return
+        buttons = [GPIO.input(pin) for pin in self.mouse_inputs]
+        if buttons != self.prev_buttons:
+            print ("buttons =", buttons)
+            self.prev_buttons = buttons
+
+    def read_hctl(self, cs):
+        """Read an HCTL-2000 counter: both bytes if there's a SEL line, else the low byte.
+
+        Taking OE (the chip select) low stops the counter updating its output
+        latch, so the two bytes always belong to the same count.
+        """
+        GPIO = self.gpio
+        self.claim_bus(cs, GPIO.IN)
+        try:
+            if self.HCTL_SEL is None:
+                return self.bus_read_int8()
+            GPIO.output(self.HCTL_SEL, GPIO.LOW)
+            high = self.bus_read_int8()
+            GPIO.output(self.HCTL_SEL, GPIO.HIGH)
+            return (high << 8) | self.bus_read_int8()
+        finally:
+            self.release_bus(cs)
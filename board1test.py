@@ -1,6 +1,8 @@
 import sys
 import os
 
+import ex9
+
 try:
     import RPi.GPIO as GPIO
 except RuntimeError:
@@ -220,22 +222,12 @@ def dload_exec(load_addr, data, exec_addr):
 def dload_exec_file(filename):
     "Download and execute the specified file"
     assert bus_owner == None
-    with open (filename, 'rb') as f:
-        # Get load address
-        load_addr = int.from_bytes(f.read(2), "big")
-        # Get data length
-        length = int.from_bytes(f.read(2), "big")
-        # Get data
-        data = f.read(length)
-        assert length == len(data)
-        # Get exec address
-        exec_addr = int.from_bytes(f.read(2), "big")
-
-        print ("load address = ", hex(load_addr),
-               "length = ", length,
-               "exec address = ", hex(exec_addr));
-        
-        dload_exec(load_addr, data, exec_addr)
+    load_addr, data, exec_addr = ex9.load(filename)
+    print ("load address = ", hex(load_addr),
+           "length = ", len(data),
+           "exec address = ", hex(exec_addr));
+
+    dload_exec(load_addr, data, exec_addr)
 
 # Main program starts here
 GPIO.add_event_detect(PortA_DATA_TAKEN, GPIO.FALLING)
@@ -1,3 +1,5 @@
+import ex9
+
 try:
     import RPi.GPIO as GPIO
 except RuntimeError:
@@ -171,22 +173,12 @@ def dload_exec(load_addr, data, exec_addr):
 
 def dload_exec_file(filename):
     "Download and execute the specified file"
-    with open (filename, 'rb') as f:
-        # Get load address
-        load_addr = int.from_bytes(f.read(2), "big")
-        # Get data length
-        length = int.from_bytes(f.read(2), "big")
-        # Get data
-        data = f.read(length)
-        assert(length == len(data))
-        # Get exec address
-        exec_addr = int.from_bytes(f.read(2), "big")
-
-        print ("load address = ", hex(load_addr),
-               "length = ", length,
-               "exec address = ", hex(exec_addr));
-        
-        dload_exec(load_addr, data, exec_addr)
+    load_addr, data, exec_addr = ex9.load(filename)
+    print ("load address = ", hex(load_addr),
+           "length = ", len(data),
+           "exec address = ", hex(exec_addr));
+
+    dload_exec(load_addr, data, exec_addr)
 
 def test1():
     # Main program starts here
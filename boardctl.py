@@ -0,0 +1,89 @@
+"""Client for boardd.py: download to, reset, NMI or watch a board the daemon keeps running.
+
+    python boardctl.py [--board NAME] [--socket PATH] download FILE [--crc] [--burst] [--compress]
+    python boardctl.py [--board NAME] [--socket PATH] reset | nmi | status | stop
+    python boardctl.py [--board NAME] [--socket PATH] console
+
+Kept to the standard library's socket and json, so it starts quickly.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+
+def socket_path(board_name):
+    "Same as boardd.socket_path(), without importing the daemon's dependencies"
+    return os.environ.get('BOARD_SOCKET', '/tmp/6809-%s.sock' % board_name)
+
+
+def request(path, fields):
+    "Send one request; returns the answer and the connection, still open"
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(path)
+    conn.sendall(json.dumps(fields).encode() + b'\n')
+    stream = conn.makefile('rb')
+    answer = json.loads(stream.readline())
+    return answer, stream, conn
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send a request to a board's daemon (boardd.py)")
+    parser.add_argument('--board', default='board', help="profile name from boards.json")
+    parser.add_argument('--socket', help="Unix socket path (default $BOARD_SOCKET or /tmp/6809-BOARD.sock)")
+    ops = parser.add_subparsers(dest='op', metavar='op')
+    ops.required = True
+    download = ops.add_parser('download', help="download and run an .ex9 file")
+    download.add_argument('file')
+    download.add_argument('--crc', action='store_true', help="verify by CRC per block")
+    download.add_argument('--burst', action='store_true', help="strobe in CRC-checked windows")
+    download.add_argument('--compress', action='store_true', help="send LZ-compressed")
+    ops.add_parser('reset', help="reset the 6809")
+    ops.add_parser('nmi', help="pulse NMI")
+    ops.add_parser('status', help="show the daemon's status")
+    ops.add_parser('stop', help="stop the daemon")
+    ops.add_parser('console', help="show the 6809's console output")
+    args = parser.parse_args(argv)
+
+    op = args.op
+    fields = {'op': op}
+    if op == 'download':
+        fields['file'] = os.path.abspath(args.file)    # the daemon has its own cwd
+        for flag in ('crc', 'burst', 'compress'):
+            fields[flag] = getattr(args, flag)
+
+    try:
+        answer, stream, conn = request(args.socket or socket_path(args.board), fields)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print("no daemon for %s (start boardd.py)" % args.board, file=sys.stderr)
+        return 1
+    try:
+        if not answer['ok']:
+            print(answer['error'], file=sys.stderr)
+            return 1
+        if op == 'console':
+            out = sys.stdout.buffer
+            try:
+                while True:
+                    data = stream.read1(4096)
+                    if not data:
+                        break
+                    out.write(data)
+                    out.flush()
+            except KeyboardInterrupt:
+                pass
+        elif op == 'download':
+            print("downloaded in %.3f s" % answer['seconds'])
+        elif op == 'status':
+            for key, value in sorted(answer.items()):
+                if key != 'ok':
+                    print("%s: %s" % (key, value))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+"""Board daemon: keeps one board's GPIO set up and its 6809 running between downloads.
+
+    python boardd.py [--board NAME] [--socket PATH]
+
+Setting up the pins, resetting the 6809 (two reset_delay sleeps) and
+starting the HCTL clock happen once, when the daemon starts; after that
+it runs the board's Runtime (console, buttons, axes, NMI) and takes
+requests on a Unix socket, so a download costs only its transfer time.
+boardctl.py is the client.
+
+A request is one line of JSON with an "op", answered by one line of JSON
+with "ok" and, if that's false, "error":
+
+    {"op": "download", "file": "/abs/path.ex9", "crc": false, "burst": false, "compress": false}
+    {"op": "reset"}
+    {"op": "nmi"}
+    {"op": "status"}
+    {"op": "console"}       the 6809's console output follows the answer, until the client goes
+    {"op": "stop"}
+
+While a client is subscribed to the console, output goes to it rather
+than to the daemon's stdout. A subscriber that lets more than
+CONSOLE_BACKLOG bytes pile up unread is dropped, so a stalled client
+can't make the daemon's memory grow without limit.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+from gpio_backend import load_backend
+import profiles
+from runtime import Runtime
+
+CONSOLE_BACKLOG = 64 * 1024     # bytes a console client may leave unread before it's dropped
+
+
+def socket_path(board_name):
+    "Where the daemon for a board listens, unless $BOARD_SOCKET says otherwise"
+    return os.environ.get('BOARD_SOCKET', '/tmp/6809-%s.sock' % board_name)
+
+
+def claim_socket(path):
+    "Clear path for a new daemon; RuntimeError if another daemon is still listening there"
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except FileNotFoundError:
+        return
+    except ConnectionRefusedError:
+        os.unlink(path)     # left behind by a daemon that didn't get to clean up
+        return
+    finally:
+        probe.close()
+    raise RuntimeError("a daemon is already listening on %s" % path)
+
+
+class Daemon:
+    "One board and the requests to it"
+
+    def __init__(self, board, path):
+        self.board = board
+        self.path = path
+        self.runtime = Runtime(board)
+        self.runtime.output = self.console_output
+        self.subscribers = set()    # StreamWriters of console clients
+        self.started = time.time()
+        self.downloads = 0
+        self.stopped = None
+
+    def console_output(self, data):
+        if not self.subscribers:
+            print(str(data, encoding='utf-8', errors='replace'), end='')
+            return
+        for writer in list(self.subscribers):
+            if writer.is_closing():
+                self.subscribers.discard(writer)
+            elif writer.transport.get_write_buffer_size() > CONSOLE_BACKLOG:
+                self.subscribers.discard(writer)
+                writer.close()      # not reading: drop it rather than buffer for it
+            else:
+                writer.write(data)
+
+    # Requests, each returning the fields of its answer
+
+    async def op_download(self, request):
+        board = self.board
+
+        def download():
+            # Set the modes holding the bus, so they can't change under a download already running
+            board.block_crc = 256 if request.get('crc') else 0
+            board.burst = bool(request.get('burst'))
+            board.compress = bool(request.get('compress'))
+            board.dload_exec_file(request['file'])
+
+        start = time.perf_counter()
+        await self.runtime.call(download)
+        self.downloads += 1
+        return {'seconds': time.perf_counter() - start}
+
+    async def op_reset(self, request):
+        await self.runtime.call(self.board.reset)
+        return {}
+
+    async def op_nmi(self, request):
+        await self.runtime.call(self.board.pulse_nmi)
+        return {}
+
+    async def op_status(self, request):
+        return {'board': self.board.name, 'uptime': time.time() - self.started,
+                'downloads': self.downloads, 'subscribers': len(self.subscribers)}
+
+    async def op_stop(self, request):
+        self.stopped.set()
+        return {}
+
+    async def handle(self, reader, writer):
+        "One client connection: a request and its answer"
+        try:
+            request = json.loads(await reader.readline())
+            if request.get('op') == 'console':
+                writer.write(b'{"ok": true}\n')
+                self.subscribers.add(writer)
+                try:
+                    await reader.read()     # until the client hangs up
+                finally:
+                    self.subscribers.discard(writer)
+                    writer.close()
+                return
+            op = getattr(self, 'op_%s' % request.get('op'), None)
+            if op is None:
+                raise ValueError("unknown op %r" % request.get('op'))
+            answer = dict(await op(request), ok=True)
+        except Exception as e:
+            answer = {'ok': False, 'error': "%s: %s" % (type(e).__name__, e)}
+        try:
+            writer.write(json.dumps(answer).encode() + b'\n')
+            await writer.drain()
+            writer.close()
+        except ConnectionError:
+            pass
+
+    async def serve(self):
+        self.stopped = asyncio.Event()
+        claim_socket(self.path)
+        server = await asyncio.start_unix_server(self.handle, path=self.path)
+        tasks = self.runtime.start()
+        print("Listening on", self.path)
+        try:
+            await self.stopped.wait()
+        finally:
+            server.close()
+            for writer in list(self.subscribers):
+                writer.close()      # ends their handlers' reads
+            await asyncio.sleep(0.1)
+            for task in tasks:
+                task.cancel()
+            os.unlink(self.path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep a board set up and serve requests to it")
+    parser.add_argument('--board', default='board', help="profile name from boards.json")
+    parser.add_argument('--socket', help="Unix socket path (default $BOARD_SOCKET or /tmp/6809-BOARD.sock)")
+    args = parser.parse_args(argv)
+    path = args.socket or socket_path(args.board)
+    # Before touching the pins: another daemon may be driving this board
+    try:
+        claim_socket(path)
+    except RuntimeError as e:
+        parser.error(e.args[0])
+
+    profile = profiles.get(args.board)
+    # The GPIO backend is RPi.GPIO unless $BOARD_GPIO says otherwise ("sim", "emu" or "gpiomem")
+    GPIO = load_backend(pins=profile['pins'])
+    board = profiles.make_board(GPIO, args.board)
+    daemon = Daemon(board, path)
+    try:
+        asyncio.run(daemon.serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("Done.")
+        GPIO.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""Pack a list of .ex9 modules into one bundle, downloaded in a single transaction.
+
+Relocation is resolved here, offline, the same way dload_exec_file does it
+at download time: a module with load address 0 is placed just below memtop,
+and memtop moves down past it. Adjacent regions are merged, and a small
+6809 trampoline calls each module's exec address in turn (JSR) and then
+jumps to the last one's, so the whole list costs one exec.
+
+A bundle file is MAGIC followed by the DLOAD_BULK body:
+
+    count                       number of regions (1 byte)
+    address, length, data       count times (2-byte words, hi-lo)
+    exec address                of the trampoline
+
+Usage: python bundle.py [--memtop 0xFE00] -o modules.b9 despatch.ex9 ... blink7.ex9
+"""
+
+import ex9
+
+MAGIC = b'B9\x01'
+
+JSR = 0xBD          # JSR extended
+JMP = 0x7E          # JMP extended
+
+
+def pack(modules, memtop=0xFE00, relocate=True):
+    """Lay out modules (a list of (load, data, exec) tuples) in 6809 memory.
+
+    Returns (regions, exec_addr): regions is a sorted list of
+    [address, bytearray] with adjacent ones merged. The trampoline goes
+    just below the relocated modules, so exec_addr is also the new memtop.
+    """
+    regions = []
+    execs = []
+    for load_addr, data, exec_addr in modules:
+        if load_addr == 0 and relocate: # relocatable, load below memtop
+            memtop -= len(data)
+            load_addr += memtop
+            exec_addr += memtop
+        regions.append([load_addr, bytearray(data)])
+        execs.append(exec_addr)
+
+    # Trampoline: call every module's exec address, then jump to the last
+    trampoline = bytearray()
+    for exec_addr in execs[:-1]:
+        trampoline += bytes([JSR]) + exec_addr.to_bytes(2, 'big')
+    trampoline += bytes([JMP]) + execs[-1].to_bytes(2, 'big')
+    memtop -= len(trampoline)
+    regions.append([memtop, trampoline])
+
+    regions.sort()
+    merged = []
+    for addr, data in regions:
+        if merged:
+            prev_addr, prev_data = merged[-1]
+            prev_end = prev_addr + len(prev_data)
+            if addr < prev_end:
+                raise ValueError("modules overlap at " + hex(addr))
+            if addr == prev_end:
+                prev_data += data
+                continue
+        merged.append([addr, data])
+    if len(merged) > 255:
+        raise ValueError("too many regions")
+    return merged, memtop
+
+
+def body(regions, exec_addr):
+    "The DLOAD_BULK body for a list of regions"
+    out = bytearray([len(regions)])
+    for addr, data in regions:
+        out += addr.to_bytes(2, 'big')
+        out += len(data).to_bytes(2, 'big')
+        out += data
+    out += exec_addr.to_bytes(2, 'big')
+    return out
+
+
+def load(filename):
+    "Read a bundle file; returns its DLOAD_BULK body"
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(filename + " is not a bundle")
+    return data[len(MAGIC):]
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Pack .ex9 modules into a single bundle")
+    parser.add_argument('modules', nargs='+', help=".ex9 files, in load order; the last is run")
+    parser.add_argument('-o', '--output', required=True, help="bundle file to write")
+    parser.add_argument('--memtop', type=lambda s: int(s, 0), default=0xFE00,
+                        help="top of RAM for relocatable modules (default 0xFE00)")
+    args = parser.parse_args(argv)
+
+    regions, exec_addr = pack([ex9.load(name) for name in args.modules], args.memtop)
+    with open(args.output, 'wb') as f:
+        f.write(MAGIC)
+        f.write(body(regions, exec_addr))
+    for addr, data in regions:
+        print("region", hex(addr), "length", len(data))
+    print("exec address", hex(exec_addr))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Burst downloads (DLOAD_BURST): shared by the Pi and Pico sides, runs under MicroPython too.
+
+After the DLOAD_BURST header (load address, length) the host sends windows:
+
+    count                       2 bytes, hi-lo, with the normal handshake
+    data                        count bytes, strobed on CA1 at a fixed rate
+                                without waiting for each to be taken
+
+The target answers each window with its CRC-16, and the host sends ACK to
+commit it or NAK to send it again. A count of 0 ends the transfer and is
+followed by the exec address.
+
+If the strobes come faster than the 6809 takes them, bytes are lost. The
+target is then still waiting for the rest of the window, so the host
+strobes padding until the CRC arrives (it won't match), NAKs, and
+retries. Each failure halves the window. At the smallest window it
+lengthens the gap between strobes instead, giving up only after
+max_retries lengthenings in a row have failed, and a run of clean
+windows doubles the window again. The gap never goes below min_gap, so
+there is always something to lengthen.
+"""
+
+from protocol import crc16
+
+PAD = 0xFF
+
+
+def header(command, load_addr, length):
+    return bytes([command]) + load_addr.to_bytes(2, 'big') + length.to_bytes(2, 'big')
+
+
+class Window:
+    "The current window size and strobe gap, adapted to errors"
+
+    def __init__(self, gap, min_gap, max_window=256, min_window=16, grow_after=4, max_retries=5):
+        assert min_gap > 0, "the strobe gap needs a minimum above zero"
+        self.gap = max(gap, min_gap)    # time between strobes, in the caller's units
+        self.min_gap = min_gap
+        self.size = max_window
+        self.max_window = max_window
+        self.min_window = min_window
+        self.grow_after = grow_after    # clean windows before doubling
+        self.max_retries = max_retries  # gap lengthenings in a row before giving up
+        self.retries = 0
+        self.clean = 0
+        self.errors = 0
+        self.slowed = False             # gap was lengthened: worth saving
+
+    def ok(self):
+        self.retries = 0
+        self.clean += 1
+        if self.clean >= self.grow_after and self.size < self.max_window:
+            self.size = min(self.size * 2, self.max_window)
+            self.clean = 0
+
+    def failed(self):
+        "Adapt to a failed window; False if there's nothing left to try"
+        self.clean = 0
+        self.errors += 1
+        if self.size > self.min_window:
+            self.size = max(self.size // 2, self.min_window)
+            return True
+        if self.retries >= self.max_retries:
+            return False
+        self.retries += 1
+        self.gap = self.gap * 3 / 2
+        self.slowed = True
+        return True
+
+
+def check(reply, window):
+    "True if a 2-byte CRC reply matches the window's data"
+    return reply is not None and len(reply) == 2 and (reply[0] << 8 | reply[1]) == crc16(window)
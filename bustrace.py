@@ -0,0 +1,256 @@
+"""Bus-transaction tracing: record what a Board does to the GPIO, save it, and replay it.
+
+A Tracer keeps the most recent events in two preallocated arrays,
+timestamps (perf_counter_ns) and packed events (kind << 16 | pin << 8 |
+value), so recording one is a clock read and two stores; it is cheap
+enough to leave on. TracingGPIO wraps a backend and records every
+chip-select and handshake output, bus direction change, byte written to
+or read from the bus, input level change and handshake edge.
+
+A saved trace is the magic, a JSON header (pins, data bus, edges,
+events lost to wrapping) and the two arrays. Replaying it drives a fresh
+simulated backend (sim or emu) through the same host-side actions and
+reports where what the target did differs from what was recorded:
+
+    python bustrace.py dump bus.trace
+    python bustrace.py replay bus.trace [--backend sim|emu]
+"""
+
+from array import array
+import json
+import struct
+import sys
+import time
+
+MAGIC = b'BT9\x01'
+
+# Event kinds
+OUT = 1         # output pin set to value
+SETUP = 2       # pin set up as input (1) or output (0)
+BUS = 3         # data bus set up as input or output
+WRITE = 4       # byte driven onto the data bus
+READ = 5        # byte read from the data bus
+INPUT = 6       # input pin seen at a new level
+EDGE = 7        # edge detected on pin
+
+KINDS = {OUT: 'out', SETUP: 'setup', BUS: 'bus', WRITE: 'write', READ: 'read',
+         INPUT: 'input', EDGE: 'edge'}
+
+
+class Tracer:
+    "The most recent size events, in preallocated arrays"
+
+    def __init__(self, size=65536):
+        assert size & (size - 1) == 0, "trace size must be a power of two"
+        self.size = size
+        self.mask = size - 1
+        self.times = array('q', [0]) * size
+        self.events = array('I', [0]) * size
+        self.head = 0           # total events recorded
+        self.clock = time.perf_counter_ns
+        self.meta = {}
+
+    def __len__(self):
+        return min(self.head, self.size)
+
+    def record(self, kind, pin, value):
+        i = self.head
+        self.head = i + 1
+        i &= self.mask
+        self.times[i] = self.clock()
+        self.events[i] = kind << 16 | pin << 8 | value
+
+    def lost(self):
+        "Events overwritten by newer ones"
+        return max(0, self.head - self.size)
+
+    def snapshot(self):
+        "The recorded events, oldest first, as (times, events) arrays"
+        count = len(self)
+        start = (self.head - count) & self.mask
+        if start + count <= self.size:
+            return self.times[start:start + count], self.events[start:start + count]
+        return (self.times[start:] + self.times[:start + count - self.size],
+                self.events[start:] + self.events[:start + count - self.size])
+
+    def save(self, path):
+        times, events = self.snapshot()
+        meta = dict(self.meta, lost=self.lost(), byteorder=sys.byteorder)
+        header = json.dumps(meta).encode()
+        with open(path, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<II', len(header), len(times)))
+            f.write(header)
+            times.tofile(f)
+            events.tofile(f)
+
+
+def load(path):
+    "A saved trace: (meta, times, events)"
+    with open(path, 'rb') as f:
+        if f.read(4) != MAGIC:
+            raise ValueError("%s is not a bus trace" % path)
+        header_size, count = struct.unpack('<II', f.read(8))
+        meta = json.loads(f.read(header_size))
+        times = array('q')
+        times.fromfile(f, count)
+        events = array('I')
+        events.fromfile(f, count)
+    if meta.get('byteorder', sys.byteorder) != sys.byteorder:
+        times.byteswap()
+        events.byteswap()
+    return meta, times, events
+
+
+def unpack(event):
+    "(kind, pin, value) of a packed event"
+    return event >> 16, (event >> 8) & 0xFF, event & 0xFF
+
+
+class TracingGPIO:
+    "A GPIO backend that records what passes through it into a Tracer"
+
+    def __init__(self, gpio, tracer, data_bus):
+        self.gpio = gpio
+        self.tracer = tracer
+        self.record = tracer.record
+        self.data_bus = list(data_bus)
+        self.levels = {}        # last level input() returned, per pin
+
+    def __getattr__(self, name):
+        # Keep what's looked up (constants like GPIO.LOW, mostly), so the
+        # hot path doesn't come through here again
+        value = getattr(self.gpio, name)
+        setattr(self, name, value)
+        return value
+
+    def setup(self, channels, direction, *args, **kwargs):
+        self.gpio.setup(channels, direction, *args, **kwargs)
+        record = self.record
+        if isinstance(channels, (list, tuple)):
+            if list(channels) == self.data_bus:
+                record(BUS, 0, direction)
+                return
+        else:
+            channels = [channels]
+        for pin in channels:
+            record(SETUP, pin, direction)
+
+    def output(self, channels, values):
+        self.gpio.output(channels, values)
+        record = self.record
+        if not isinstance(channels, (list, tuple)):
+            record(OUT, channels, 1 if values else 0)
+            return
+        if not isinstance(values, (list, tuple)):
+            values = [values] * len(channels)
+        for pin, value in zip(channels, values):
+            record(OUT, pin, 1 if value else 0)
+
+    def input(self, pin):
+        level = self.gpio.input(pin)
+        if self.levels.get(pin) != level:
+            self.levels[pin] = level
+            self.record(INPUT, pin, level)
+        return level
+
+    def write_byte(self, pins, int8):
+        self.gpio.write_byte(pins, int8)
+        self.record(WRITE, 0, int8)
+
+    def read_byte(self, pins):
+        int8 = self.gpio.read_byte(pins)
+        self.record(READ, 0, int8)
+        return int8
+
+    def event_detected(self, pin):
+        if self.gpio.event_detected(pin):
+            self.record(EDGE, pin, 1)
+            return True
+        return False
+
+
+def describe(meta, times, events):
+    "One line per event, with times in microseconds from the first"
+    names = {pin: name for name, pin in meta['pins'].items()}
+    start = times[0] if times else 0
+    for t, event in zip(times, events):
+        kind, pin, value = unpack(event)
+        if kind in (WRITE, READ):
+            what = "0x%02X" % value
+        elif kind == BUS:
+            what = "in" if value else "out"
+        else:
+            what = "%s = %d" % (names.get(pin, pin), value)
+        yield "%12.1f  %-6s %s" % ((t - start) / 1000, KINDS.get(kind, kind), what)
+
+
+def replay(meta, times, events, gpio, edge_polls=10000):
+    """Drive gpio through the recorded host-side actions; returns the mismatches.
+
+    Each mismatch is (index, time in us, kind, pin, recorded, replayed).
+    Input levels are timing-dependent (a spin loop may see a line before
+    or after it changes), so only reads and edges are compared.
+    """
+    data_bus = meta['data_bus']
+    gpio.setmode(gpio.BCM)
+    for pin, edge in meta.get('edges', {}).items():
+        gpio.add_event_detect(int(pin), edge)
+    start = times[0] if times else 0
+    mismatches = []
+    for index, (t, event) in enumerate(zip(times, events)):
+        kind, pin, value = unpack(event)
+        if kind == OUT:
+            gpio.output(pin, value)
+        elif kind == SETUP:
+            gpio.setup(pin, value)
+        elif kind == BUS:
+            gpio.setup(data_bus, value)
+        elif kind == WRITE:
+            gpio.write_byte(data_bus, value)
+        elif kind == INPUT:
+            gpio.input(pin)
+        else:
+            if kind == READ:
+                got = gpio.read_byte(data_bus)
+            else:
+                got = 0
+                for _ in range(edge_polls):
+                    if gpio.event_detected(pin):
+                        got = 1
+                        break
+            if got != value:
+                mismatches.append((index, (t - start) / 1000, kind, pin, value, got))
+    return mismatches
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Dump or replay a bus trace")
+    parser.add_argument('command', choices=('dump', 'replay'))
+    parser.add_argument('trace')
+    parser.add_argument('--backend', default='sim', help="sim or emu, for replay")
+    args = parser.parse_args(argv)
+
+    meta, times, events = load(args.trace)
+    if meta.get('lost'):
+        print("%d earlier events were lost to wrapping" % meta['lost'])
+    if args.command == 'dump':
+        for line in describe(meta, times, events):
+            print(line)
+        return 0
+
+    from gpio_backend import load_backend
+    gpio = load_backend(args.backend, pins=meta['pins'])
+    mismatches = replay(meta, times, events, gpio)
+    names = {pin: name for name, pin in meta['pins'].items()}
+    for index, t, kind, pin, recorded, replayed in mismatches:
+        print("event %d at %.1f us: %s %s recorded 0x%02X, replayed 0x%02X" %
+              (index, t, KINDS[kind], names.get(pin, '') if kind == EDGE else 'bus',
+               recorded, replayed))
+    print("%d events replayed, %d mismatches" % (len(events), len(mismatches)))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
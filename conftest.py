@@ -0,0 +1,27 @@
+"Shared test fixtures: a Board on the simulated target, and one on the emulated 6809"
+
+import pytest
+
+from board import Board, BCM_PINS
+import emu
+from gpio_backend import SimGPIO
+
+
+@pytest.fixture
+def sim_board(tmp_path, monkeypatch):
+    "A Board on SimGPIO; its SimTarget is board.gpio.target"
+    monkeypatch.chdir(tmp_path)     # for timing.json and the like
+    board = Board(SimGPIO(BCM_PINS), BCM_PINS, reset_delay=0)
+    board.reset()
+    yield board
+    board.gpio.cleanup()
+
+
+@pytest.fixture
+def emu_board(tmp_path, monkeypatch):
+    "A Board on the emulated 6809 and 6522; the emu.Machine is board.gpio.target"
+    monkeypatch.chdir(tmp_path)
+    board = Board(emu.EmuGPIO(BCM_PINS), BCM_PINS, reset_delay=0)
+    board.reset()
+    yield board
+    board.gpio.cleanup()
@@ -0,0 +1,112 @@
+"Waiting for handshake edges without burning a core"
+
+import threading
+import time
+
+
+class EdgeWaiter:
+    """Waits for an edge on one input pin.
+
+    A wait first spins on event_detected() for up to spin polls, which
+    catches a prompt 6809 with no added latency, then blocks on the edge
+    callback (or, on backends without callbacks, sleeps between polls)
+    until the edge arrives or the timeout expires. Every wait is timed.
+    """
+
+    def __init__(self, gpio, pin, edge, spin=2000, timeout=1.0):
+        self.gpio = gpio
+        self.pin = pin
+        self.spin = spin
+        self.timeout = timeout
+        self.event = threading.Event()
+        self.recorder = None    # if set, called with (latency in seconds, polls) for every wait
+        try:
+            gpio.add_event_detect(pin, edge, callback=self._edge)
+        except NotImplementedError:
+            gpio.add_event_detect(pin, edge)
+            self.event = None
+        self.reset_stats()
+
+    def _edge(self, pin):
+        self.event.set()
+
+    def reset_stats(self):
+        self.waits = 0          # edges waited for
+        self.spun = 0           # ...caught while spinning
+        self.blocked = 0        # ...caught after blocking
+        self.timeouts = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def stats(self):
+        "Wait counts and latencies (in seconds) since the last reset_stats()"
+        return {
+            'waits': self.waits,
+            'spun': self.spun,
+            'blocked': self.blocked,
+            'timeouts': self.timeouts,
+            'mean_latency': self.total_latency / self.waits if self.waits else 0.0,
+            'max_latency': self.max_latency,
+        }
+
+    def _done(self, start, polls):
+        latency = time.perf_counter() - start
+        self.waits += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+        if self.recorder is not None:
+            self.recorder(latency, polls)
+        return True
+
+    def wait(self, timeout=None, raise_timeout=True):
+        """Wait for the next edge; returns True, or False/TimeoutError on timeout.
+
+        timeout defaults to the waiter's own; None there means wait forever.
+        """
+        event_detected = self.gpio.event_detected
+        pin = self.pin
+        start = time.perf_counter()
+
+        for polls in range(1, self.spin + 1):
+            if event_detected(pin):
+                self.spun += 1
+                return self._done(start, polls)
+
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else start + timeout
+        delay = 0.00005
+        while True:
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if self.event is not None:
+                # Clear before checking, so an edge between the two
+                # still wakes us: no lost wakeups.
+                self.event.clear()
+                if event_detected(pin):
+                    break
+                if remaining is not None and remaining <= 0:
+                    return self._timeout(raise_timeout)
+                self.event.wait(remaining)
+            else:
+                if event_detected(pin):
+                    break
+                if remaining is not None and remaining <= 0:
+                    return self._timeout(raise_timeout)
+                time.sleep(delay if remaining is None else min(delay, remaining))
+                delay = min(delay * 2, 0.001)
+        self.blocked += 1
+        return self._done(start, self.spin + 1)
+
+    def discard(self):
+        "Forget an edge already latched, e.g. one from bytes sent without waiting"
+        self.gpio.event_detected(self.pin)
+
+    def _timeout(self, raise_timeout):
+        self.timeouts += 1
+        if raise_timeout:
+            raise TimeoutError("no edge on GPIO %d" % self.pin)
+        return False
+
+    def close(self):
+        self.gpio.remove_event_detect(self.pin)
@@ -0,0 +1,209 @@
+"""An emulated board: 6809, RAM, ROM and 6522 (see mc6809.py and via6522.py) behind the GPIO backend interface.
+
+With BOARD_GPIO=emu the scripts run unchanged against real .ex9
+binaries, with no board attached. The host's handshake lines are wired
+to the 6522 as on the board: CA1 in, CA2 out for port A, CB1 in and CB2
+out for port B.
+
+The emulated 6809 runs only when the host touches the GPIO, catching up
+with wall-clock time at CLOCK cycles a second (at least QUANTUM cycles
+per poll, and at most MAX_QUANTUM), and it skips ahead whenever it is
+spinning on the 6522 waiting for the host. Cycles counts emulated time;
+idle_cycles is the part of that spent waiting, so the rest is what the
+6809 itself took.
+
+The memory map is an assumption, as are the defaults here; set them to
+match the board. ROM images follow rombuild.py's layout: offset 0 at
+rom_base, the vector table in the last 16 bytes. BOARD_EMU_ROM names a
+raw ROM image (e.g. boot.rom) and BOARD_EMU_ROM_BASE its base; without
+one, a minimal boot ROM that understands DLOAD_EXEC (below) is used.
+"""
+
+import os
+import time
+
+from gpio_backend import SimGPIO, HIGH, LOW
+from mc6809 import CPU
+from rombuild import Rom
+from via6522 import VIA
+
+CLOCK = 1_000_000       # E clock, cycles per second
+VIA_BASE = 0xFE00       # the 6522's 16 registers
+QUANTUM = 200           # fewest cycles run per host poll
+MAX_QUANTUM = 20_000    # most, however long since the last poll
+
+# The built-in boot ROM: echoes each byte it receives on port B (CB2 in
+# pulse mode) and runs DLOAD_EXEC, calling the downloaded program so that
+# it can return for the next command.
+#
+# FF00 10 CE 01 00   reset   LDS   #$0100
+# FF04 86 FF                 LDA   #$FF
+# FF06 B7 FE 02              STA   DDRB          ; port B out
+# FF09 7F FE 03              CLR   DDRA          ; port A in
+# FF0C 86 01                 LDA   #$01
+# FF0E B7 FE 0B              STA   ACR           ; latch port A on CA1
+# FF11 86 AA         command LDA   #$AA
+# FF13 B7 FE 0C              STA   PCR           ; CA2, CB2 pulse; CA1, CB1 falling
+# FF16 8D 20                 BSR   getb
+# FF18 81 AA                 CMPA  #DLOAD_EXEC
+# FF1A 26 F5                 BNE   command
+# FF1C 8D 28                 BSR   getw
+# FF1E 1F 01                 TFR   D,X           ; load address
+# FF20 8D 24                 BSR   getw
+# FF22 1F 02                 TFR   D,Y           ; length
+# FF24 31 A4                 LEAY  ,Y
+# FF26 27 08                 BEQ   done
+# FF28 8D 0E         loop    BSR   getb
+# FF2A A7 80                 STA   ,X+
+# FF2C 31 3F                 LEAY  -1,Y
+# FF2E 26 F8                 BNE   loop
+# FF30 8D 14         done    BSR   getw
+# FF32 1F 01                 TFR   D,X           ; exec address
+# FF34 AD 84                 JSR   ,X
+# FF36 20 D9                 BRA   command
+# FF38 B6 FE 0D      getb    LDA   IFR
+# FF3B 85 02                 BITA  #$02          ; CA1: data ready
+# FF3D 27 F9                 BEQ   getb
+# FF3F B6 FE 01              LDA   ORA           ; take it, pulsing CA2
+# FF42 B7 FE 00              STA   ORB           ; echo it, pulsing CB2
+# FF45 39                    RTS
+# FF46 8D F0         getw    BSR   getb
+# FF48 34 02                 PSHS  A
+# FF4A 8D EC                 BSR   getb
+# FF4C 1F 89                 TFR   A,B
+# FF4E 35 02                 PULS  A
+# FF50 39                    RTS
+# FF51 3B            ignore  RTI
+BOOT_BASE = 0xFF00
+BOOT_CODE = bytes([
+    0x10, 0xCE, 0x01, 0x00, 0x86, 0xFF, 0xB7, 0xFE, 0x02, 0x7F, 0xFE, 0x03,
+    0x86, 0x01, 0xB7, 0xFE, 0x0B, 0x86, 0xAA, 0xB7, 0xFE, 0x0C, 0x8D, 0x20,
+    0x81, 0xAA, 0x26, 0xF5, 0x8D, 0x28, 0x1F, 0x01, 0x8D, 0x24, 0x1F, 0x02,
+    0x31, 0xA4, 0x27, 0x08, 0x8D, 0x0E, 0xA7, 0x80, 0x31, 0x3F, 0x26, 0xF8,
+    0x8D, 0x14, 0x1F, 0x01, 0xAD, 0x84, 0x20, 0xD9, 0xB6, 0xFE, 0x0D, 0x85,
+    0x02, 0x27, 0xF9, 0xB6, 0xFE, 0x01, 0xB7, 0xFE, 0x00, 0x39, 0x8D, 0xF0,
+    0x34, 0x02, 0x8D, 0xEC, 0x1F, 0x89, 0x35, 0x02, 0x39, 0x3B,
+])
+
+
+def boot_rom():
+    "The built-in boot ROM, as rombuild would make it"
+    rom = Rom(size=0x10000 - BOOT_BASE, base=BOOT_BASE)
+    rom.place(BOOT_BASE, BOOT_CODE, "boot")
+    ignore = BOOT_BASE + len(BOOT_CODE) - 1
+    for name in ('SWI3', 'SWI2', 'FIRQ', 'IRQ', 'SWI', 'NMI'):
+        rom.set_vector(name, ignore)
+    rom.set_vector('RESET', BOOT_BASE)
+    return rom.data
+
+
+class Machine:
+    "The 6809 and its memory and 6522"
+
+    def __init__(self, rom=None, rom_base=None, via_base=VIA_BASE, clock=CLOCK):
+        if rom is None:
+            rom, rom_base = boot_rom(), BOOT_BASE
+        elif rom_base is None:
+            rom_base = 0xF000
+        self.clock = clock
+        self.memory = bytearray(0x10000)
+        self.load_rom(rom, rom_base)
+        self.via = VIA()
+        self.cpu = CPU(self.memory, io_base=via_base, device=self.via, rom_base=rom_base)
+        self.via.attach(self.cpu)
+
+    def load_rom(self, data, base):
+        "Map a ROM image: offset 0 at base, and its last 16 bytes over the vectors"
+        size = min(len(data), 0x10000 - base) - 16
+        self.memory[base:base + size] = data[:size]
+        self.memory[0xFFF0:] = data[-16:]
+
+    def reset(self):
+        self.via.reset()
+        self.cpu.reset()
+
+    def run(self, cycles):
+        return self.cpu.run(cycles)
+
+    def nmi(self):
+        self.cpu.nmi()
+
+    def seconds(self, cycles):
+        return cycles / self.clock
+
+    def stats(self):
+        "Emulated time and how the 6809 spent it"
+        cpu = self.cpu
+        return {
+            'cycles': cpu.cycles,
+            'idle_cycles': cpu.idle_cycles,
+            'busy_cycles': cpu.cycles - cpu.idle_cycles,
+            'instructions': cpu.instructions,
+            'seconds': self.seconds(cpu.cycles),
+        }
+
+
+class EmuGPIO(SimGPIO):
+    "SimGPIO's board with an emulated 6809 and 6522 in place of the scripted target"
+
+    def __init__(self, pins, machine=None):
+        if machine is None:
+            machine = Machine()
+        SimGPIO.__init__(self, pins, target=machine)
+        self.via = machine.via
+        self.via.pa_pins = self._port_a_pins
+        self.via.on_ca2 = lambda level: self._edge(self.pins['CA2'], level)
+        self.via.on_cb2 = lambda level: self._edge(self.pins['CB2'], level)
+        self.last_poll = time.perf_counter()
+
+    def input(self, pin):
+        if pin == self.pins['CA2']:
+            self.poll()
+        return SimGPIO.input(self, pin)
+
+    def event_detected(self, pin):
+        self.poll()
+        return SimGPIO.event_detected(self, pin)
+
+    def cleanup(self, channels=None):
+        self.__init__(self.pins, self.target)
+
+    def poll(self):
+        "Let the 6809 catch up with the time since the last poll"
+        now = time.perf_counter()
+        if self.running:
+            cycles = int((now - self.last_poll) * self.target.clock)
+            self.target.run(min(max(cycles, QUANTUM), MAX_QUANTUM))
+        self.last_poll = now
+
+    def _port_a_pins(self):
+        return self._bus_output() if self._selected('CS_portA') else 0xFF
+
+    def _pin_changed(self, pin, value):
+        pins = self.pins
+        if pin == pins['CS_handshake']:
+            # CS2 high holds the 6809 in reset, low lets it run
+            running = value == LOW
+            if running and not self.running:
+                self.target.reset()
+                self.last_poll = time.perf_counter()
+            self.running = running
+        elif not self.running:
+            return
+        self.poll()     # the 6809 has had until now to get ready for it
+        if pin == pins['CA1']:
+            self.via.set_ca1(value)
+        elif pin == pins['CB1']:
+            self.via.set_cb1(value)
+        elif pin == pins['NMI'] and value == HIGH:
+            self.target.nmi()
+
+
+def backend(pins):
+    "The emulated board, configured from the environment"
+    rom = os.environ.get('BOARD_EMU_ROM')
+    if rom is not None:
+        with open(rom, 'rb') as f:
+            rom = f.read()
+    base = os.environ.get('BOARD_EMU_ROM_BASE')
+    return EmuGPIO(pins, Machine(rom, int(base, 0) if base else None))
@@ -0,0 +1,74 @@
+"""Loader for .ex9 images, shared by all the scripts (runs under MicroPython too).
+
+An .ex9 file is a 2-byte load address, a 2-byte length, that many bytes of
+data and a 2-byte exec address, all hi-lo. Files are memory-mapped where
+mmap exists (read in one go where it doesn't) and the data comes back as a
+memoryview into that, without copying. Parsed images are cached by path,
+keyed on the file's inode, size and modification time in nanoseconds, so
+a batch touching the same image many times only parses it once, and a
+rebuild within the same second as the last load is still seen.
+"""
+
+import os
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+HEADER = 4
+TRAILER = 2
+
+_cache = {}     # path -> (stamp, image)
+
+
+def _contents(path):
+    with open(path, 'rb') as f:
+        if mmap is not None:
+            try:
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            except ValueError:  # empty file, which can't be mapped
+                return memoryview(b'')
+        return memoryview(f.read())
+
+
+def parse(contents, name='image'):
+    "Split .ex9 contents into (load address, data, exec address)"
+    if len(contents) < HEADER + TRAILER:
+        raise ValueError(name + ": too short for an .ex9 header")
+    load_addr = (contents[0] << 8) | contents[1]
+    length = (contents[2] << 8) | contents[3]
+    if len(contents) != HEADER + length + TRAILER:
+        raise ValueError("%s: header says %d bytes of data, file has %d" %
+                         (name, length, len(contents) - HEADER - TRAILER))
+    if load_addr + length > 0x10000:
+        raise ValueError(name + ": data runs past 0xFFFF")
+    end = HEADER + length
+    exec_addr = (contents[end] << 8) | contents[end + 1]
+    return load_addr, contents[HEADER:end], exec_addr
+
+
+def _stamp(path):
+    "What changes when the file does: inode, size and mtime, to the nanosecond where the OS has it"
+    st = os.stat(path)
+    # MicroPython's stat is a plain tuple, with whole-second times
+    return st[1], st[6], getattr(st, 'st_mtime_ns', st[8])
+
+
+def load(path):
+    "Return (load address, data, exec address) of an .ex9 file; data is a read-only memoryview"
+    stamp = _stamp(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    image = parse(_contents(path), path)
+    _cache[path] = (stamp, image)
+    return image
+
+
+def forget(path=None):
+    "Drop one cached image, or all of them"
+    if path is None:
+        _cache.clear()
+    else:
+        _cache.pop(path, None)
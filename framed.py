@@ -0,0 +1,89 @@
+"""Framed, resumable downloads (DLOAD_FRAMED): shared by the Pi and Pico sides, runs under MicroPython too.
+
+After the DLOAD_FRAMED header (load address, length, block size) the host
+sends frames of
+
+    sequence number             2 bytes, hi-lo; block n goes to load + n * block size
+    payload                     the block (the last may be short)
+    CRC-16                      of the sequence number and payload
+
+and the target answers each with ACK or NAK and the sequence number. The
+final frame has sequence number END and the exec address as its payload.
+A target that gets no byte for FRAME_TIMEOUT drops out of the transfer
+back to its command loop, so after waiting longer than that the host can
+always start again with the header.
+
+Blocks land at fixed addresses, so after an interruption the transfer can
+resume from the first unacknowledged block with the same header; the
+resume log remembers where each interrupted transfer got to.
+"""
+
+import json
+
+try:
+    import hashlib
+    from binascii import hexlify
+except ImportError:
+    import uhashlib as hashlib
+    from ubinascii import hexlify
+
+from protocol import ACK, crc16
+
+END = 0xFFFF
+FRAME_TIMEOUT = 0.05    # seconds the target waits for the next byte of a transfer
+
+
+def header(command, load_addr, length, block_size):
+    return (bytes([command]) + load_addr.to_bytes(2, 'big') +
+            length.to_bytes(2, 'big') + block_size.to_bytes(2, 'big'))
+
+
+def frame(seq, payload):
+    "One frame, ready to send"
+    out = bytearray(seq.to_bytes(2, 'big'))
+    out += payload
+    out += crc16(out).to_bytes(2, 'big')
+    return out
+
+
+def acked(reply, seq):
+    "True if a 3-byte reply acknowledges frame seq"
+    return (reply is not None and len(reply) == 3 and reply[0] == ACK and
+            (reply[1] << 8 | reply[2]) == seq)
+
+
+def key(load_addr, data):
+    "What identifies a transfer in the resume log: where it goes and what it is"
+    return '%04X:%d:%s' % (load_addr, len(data),
+                           hexlify(hashlib.sha256(bytes(data)).digest()).decode())
+
+
+class ResumeLog:
+    "Interrupted transfers and the first block each still needs, kept in a JSON file"
+
+    def __init__(self, path='resume.json'):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def start(self, transfer_key, block_size):
+        "The block to start from: 0, unless this transfer was interrupted with the same block size"
+        entry = self.entries.get(transfer_key)
+        if entry is None or entry['block_size'] != block_size:
+            return 0
+        return entry['next']
+
+    def interrupted(self, transfer_key, block_size, next_block):
+        self.entries[transfer_key] = {'block_size': block_size, 'next': next_block}
+        self.save()
+
+    def finished(self, transfer_key):
+        if self.entries.pop(transfer_key, None) is not None:
+            self.save()
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump(self.entries, f)
@@ -0,0 +1,516 @@
+"GPIO backends for the host side of the 6809 link"
+
+import os
+import time
+
+from protocol import (DLOAD_EXEC, DLOAD_CRC, CHECKSUM, DLOAD_BULK, DLOAD_FRAMED, DLOAD_BURST,
+                      ACK, NAK, crc16)
+import bundle
+import framed
+import lz
+
+# Constants with the same values as RPi.GPIO, so the simulated backends
+# can stand in for it without translation.
+BOARD = 10
+BCM = 11
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+RISING = 31
+FALLING = 32
+BOTH = 33
+
+
+class Backend:
+    "Base class for GPIO backends, with the RPi.GPIO calling conventions"
+    BOARD = BOARD
+    BCM = BCM
+    OUT = OUT
+    IN = IN
+    LOW = LOW
+    HIGH = HIGH
+    PUD_OFF = PUD_OFF
+    PUD_DOWN = PUD_DOWN
+    PUD_UP = PUD_UP
+    RISING = RISING
+    FALLING = FALLING
+    BOTH = BOTH
+
+    def write_byte(self, pins, int8):
+        "Drive a byte onto the data bus pins, given in D0..D7 order"
+        self.output(pins, [(int8 >> bit) & 1 for bit in range(8)])
+
+    def read_byte(self, pins):
+        "Read a byte from the data bus pins, given in D0..D7 order"
+        int8 = 0
+        for bit, pin in enumerate(pins):
+            int8 |= self.input(pin) << bit
+        return int8
+
+
+class RPiBackend(Backend):
+    "The real RPi.GPIO library"
+
+    def __init__(self):
+        try:
+            import RPi.GPIO as GPIO
+        except RuntimeError:
+            print("Error importing RPi.GPIO")
+            raise
+        self.GPIO = GPIO
+
+    def __getattr__(self, name):
+        return getattr(self.GPIO, name)
+
+
+class SimTarget:
+    """Stand-in for the 6809 bootloader and downloaded program, seen through its 6522.
+
+    Each bootloader command is a generator that yields to receive the next
+    byte from port A, so commands read like the 6809 code that implements them.
+    """
+
+    def __init__(self, echo=True):
+        self.echo = echo            # bootloader echoes each received byte on port B
+        self.memory = bytearray(0x10000)
+        self.output = bytearray()   # bytes waiting to go out on port B
+        self.execs = []             # addresses the bootloader has jumped to
+        self.nmi_count = 0
+        self.faults = set()         # indices of received bytes to corrupt, for testing
+        self.drops = set()          # ...and to lose
+        self.received = 0
+        self.byte_timeout = None    # set by commands that give up when the host goes quiet
+        self.last_byte = 0.0
+        self.commands = {
+            DLOAD_EXEC: self.cmd_dload_exec,
+            DLOAD_CRC: self.cmd_dload_crc,
+            CHECKSUM: self.cmd_checksum,
+            DLOAD_BULK: self.cmd_dload_bulk,
+            DLOAD_FRAMED: self.cmd_dload_framed,
+            DLOAD_BURST: self.cmd_dload_burst,
+        }
+        self.reset()
+
+    def reset(self):
+        "Restart the bootloader from the top"
+        self.echoing = True
+        self.cb2_handshake = False  # pulse mode during download, handshake mode after
+        self.byte_timeout = None
+        self.loader = self.bootloader()
+        next(self.loader)
+
+    def write(self, data):
+        "Queue console output, as the running program would"
+        self.output += data
+
+    def reply(self, data):
+        "Send bytes to the host on port B, with handshake"
+        self.cb2_handshake = True
+        self.output += data
+
+    def nmi(self):
+        self.nmi_count += 1
+
+    def executed(self, exec_addr):
+        "Called when the bootloader jumps to a downloaded program"
+        stub = lz.STUB_CODE
+        if self.memory[exec_addr:exec_addr + len(stub)] == stub:
+            # Do what the decompressor stub would, then follow it to its exec address
+            params = exec_addr + len(stub)
+            dst, end, stub_exec = [int.from_bytes(self.memory[p:p + 2], 'big')
+                                   for p in range(params, params + 6, 2)]
+            packed = self.memory[params + 6:]
+            self.memory[dst:end] = lz.decompress(packed, end - dst)
+            exec_addr = stub_exec
+        # Follow a bundle's trampoline: each JSR runs a module, JMP the last
+        while self.memory[exec_addr] == bundle.JSR:
+            self.executed(int.from_bytes(self.memory[exec_addr + 1:exec_addr + 3], 'big'))
+            exec_addr += 3
+        if self.memory[exec_addr] == bundle.JMP:
+            exec_addr = int.from_bytes(self.memory[exec_addr + 1:exec_addr + 3], 'big')
+        self.execs.append(exec_addr)
+        self.cb2_handshake = True
+
+    def receive(self, int8):
+        "Accept a byte from port A; returns True if the bootloader echoes it"
+        if self.received in self.faults:
+            int8 ^= 0x01
+        if self.received in self.drops:
+            self.received += 1
+            return False    # overrun: the 6809 never saw it
+        self.received += 1
+        now = time.monotonic()
+        if self.byte_timeout is not None and now - self.last_byte > self.byte_timeout:
+            # The command timed out, back to the command loop
+            self.byte_timeout = None
+            self.loader = self.bootloader()
+            next(self.loader)
+        self.last_byte = now
+        echo = self.echoing
+        self.loader.send(int8)
+        return echo
+
+    def bootloader(self):
+        while True:
+            self.echoing = True
+            command = yield
+            handler = self.commands.get(command)
+            if handler is not None:
+                yield from handler()
+
+    def word(self):
+        hi = yield
+        lo = yield
+        return (hi << 8) | lo
+
+    def cmd_dload_exec(self):
+        load_addr = yield from self.word()
+        length = yield from self.word()
+        for i in range(length):
+            self.memory[(load_addr + i) & 0xFFFF] = yield
+        exec_addr = yield from self.word()
+        self.executed(exec_addr)
+
+    def cmd_dload_crc(self):
+        self.echoing = False
+        addr = yield from self.word()
+        remaining = yield from self.word()
+        block_size = yield from self.word()
+        while remaining:
+            block = bytearray()
+            for _ in range(min(block_size, remaining)):
+                block.append((yield))
+            self.reply(crc16(block).to_bytes(2, 'big'))
+            if (yield) == ACK:
+                self.memory[addr:addr + len(block)] = block
+                addr += len(block)
+                remaining -= len(block)
+        exec_addr = yield from self.word()
+        self.executed(exec_addr)
+
+    def cmd_dload_bulk(self):
+        count = yield
+        for _ in range(count):
+            load_addr = yield from self.word()
+            length = yield from self.word()
+            for i in range(length):
+                self.memory[(load_addr + i) & 0xFFFF] = yield
+        exec_addr = yield from self.word()
+        self.executed(exec_addr)
+
+    def cmd_dload_framed(self):
+        self.echoing = False
+        self.byte_timeout = framed.FRAME_TIMEOUT
+        load_addr = yield from self.word()
+        length = yield from self.word()
+        block_size = yield from self.word()
+        while True:
+            seq = yield from self.word()
+            if seq == framed.END:
+                size = 2
+            else:
+                size = max(0, min(block_size, length - seq * block_size))
+            payload = bytearray()
+            for _ in range(size):
+                payload.append((yield))
+            crc = yield from self.word()
+            if crc != crc16(seq.to_bytes(2, 'big') + payload):
+                self.reply(bytes([NAK]) + seq.to_bytes(2, 'big'))
+                continue
+            self.reply(bytes([ACK]) + seq.to_bytes(2, 'big'))
+            if seq == framed.END:
+                self.byte_timeout = None
+                self.executed(int.from_bytes(payload, 'big'))
+                return
+            addr = load_addr + seq * block_size
+            self.memory[addr:addr + size] = payload
+
+    def cmd_dload_burst(self):
+        self.echoing = False
+        addr = yield from self.word()
+        length = yield from self.word()
+        while True:
+            count = yield from self.word()
+            if count == 0:
+                break
+            window = bytearray()
+            for _ in range(count):
+                window.append((yield))
+            self.reply(crc16(window).to_bytes(2, 'big'))
+            if (yield) == ACK:
+                self.memory[addr:addr + count] = window
+                addr += count
+        exec_addr = yield from self.word()
+        self.executed(exec_addr)
+
+    def cmd_checksum(self):
+        self.echoing = False
+        addr = yield from self.word()
+        length = yield from self.word()
+        self.reply(crc16(self.memory[addr:addr + length]).to_bytes(2, 'big'))
+
+
+class SimVIA:
+    "The handshake side of a 6522: port A input latched by CA1, port B output with CB1/CB2"
+
+    def __init__(self):
+        self.port_a = 0xFF
+        self.port_b = 0xFF
+        self.ca2 = HIGH
+        self.cb2 = HIGH
+
+    def reset(self):
+        self.__init__()
+
+
+class SimGPIO(Backend):
+    "Pure-Python backend that models the board, its 6522 handshakes and a target"
+
+    def __init__(self, pins, target=None):
+        self.pins = pins
+        self.target = target if target is not None else SimTarget()
+        self.via = SimVIA()
+        self.mode = None
+        self.levels = {}
+        self.directions = {}
+        self.pulls = {}
+        self.detect = {}            # pin -> edge for add_event_detect()
+        self.events = set()         # pins with an undelivered edge event
+        self.callbacks = {}
+        self.hctl = {pins['CS_x_axis']: 0, pins['CS_y_axis']: 0} if 'CS_x_axis' in pins else {}
+        self.data_bus = [pins['D%d' % bit] for bit in range(8)]
+        self.bus_pins = set(self.data_bus)
+        self.running = False
+
+    # RPi.GPIO API
+
+    def getmode(self):
+        return self.mode
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channels, direction, pull_up_down=PUD_OFF, initial=None):
+        for pin in self._channels(channels):
+            self.directions[pin] = direction
+            self.pulls[pin] = pull_up_down
+            if direction == OUT and initial is not None:
+                self.output(pin, initial)
+            elif pin not in self.levels:
+                self.levels[pin] = HIGH if direction == IN else LOW
+
+    def output(self, channels, values):
+        channels = self._channels(channels)
+        if not isinstance(values, (list, tuple)):
+            values = [values] * len(channels)
+        for pin, value in zip(channels, values):
+            previous = self.levels.get(pin)
+            value = HIGH if value else LOW
+            self.levels[pin] = value
+            if previous != value:
+                self._pin_changed(pin, value)
+
+    def input(self, pin):
+        if pin in self.bus_pins and self.directions.get(pin) == IN:
+            return (self._bus_value() >> self.data_bus.index(pin)) & 1
+        if pin == self.pins['CA2']:
+            return self.via.ca2
+        if pin == self.pins['CB2']:
+            self.poll()
+            return self.via.cb2
+        return self.levels.get(pin, HIGH)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        self.detect[pin] = edge
+        self.events.discard(pin)
+        if callback is not None:
+            self.callbacks[pin] = [callback]
+
+    def add_event_callback(self, pin, callback):
+        self.callbacks.setdefault(pin, []).append(callback)
+
+    def remove_event_detect(self, pin):
+        self.detect.pop(pin, None)
+        self.callbacks.pop(pin, None)
+        self.events.discard(pin)
+
+    def event_detected(self, pin):
+        if pin in self.events:
+            self.events.discard(pin)
+            return True
+        return False
+
+    def wait_for_edge(self, pin, edge, timeout=None, bouncetime=None):
+        # The target only ever moves in response to the host, so if the
+        # edge hasn't already happened it never will.
+        if self.event_detected(pin):
+            return pin
+        return None
+
+    def PWM(self, pin, frequency):
+        return SimPWM(pin, frequency)
+
+    def cleanup(self, channels=None):
+        self.__init__(self.pins, self.target)
+
+    # Bus helpers (the data bus is modelled as a whole byte)
+
+    def write_byte(self, pins, int8):
+        for bit, pin in enumerate(pins):
+            self.levels[pin] = (int8 >> bit) & 1
+
+    def read_byte(self, pins):
+        if pins == self.data_bus and self.directions.get(pins[0]) == IN:
+            return self._bus_value()
+        return Backend.read_byte(self, pins)
+
+    # Simulation controls
+
+    def set_position(self, cs, value):
+        "Set the count an HCTL-2000 presents when its chip select is active"
+        self.hctl[cs] = value
+
+    def set_input(self, pin, value):
+        "Drive an input pin (e.g. a mouse button) from outside the board"
+        self.levels[pin] = value
+
+    # Model
+
+    def _channels(self, channels):
+        if isinstance(channels, (list, tuple)):
+            return list(channels)
+        return [channels]
+
+    def _selected(self, role):
+        pin = self.pins.get(role)
+        return pin is not None and self.levels.get(pin, HIGH) == LOW
+
+    def _bus_value(self):
+        if self._selected('CS_portB'):
+            return self.via.port_b
+        for cs, value in self.hctl.items():
+            if self.levels.get(cs, HIGH) == LOW:
+                if self._selected('HCTL_SEL'):
+                    return (value >> 8) & 0xFF
+                return value & 0xFF
+        return 0xFF  # nothing driving the bus
+
+    def _bus_output(self):
+        int8 = 0
+        for bit, pin in enumerate(self.data_bus):
+            int8 |= (self.levels.get(pin, LOW) & 1) << bit
+        return int8
+
+    def _edge(self, pin, value):
+        edge = self.detect.get(pin)
+        if edge is None:
+            return
+        if edge == BOTH or (edge == FALLING) == (value == LOW):
+            self.events.add(pin)
+            for callback in self.callbacks.get(pin, ()):
+                callback(pin)
+
+    def _pin_changed(self, pin, value):
+        pins = self.pins
+        if pin == pins['CS_handshake']:
+            # CS2 high holds the 6809 in reset, low lets it run
+            self.running = value == LOW
+            if not self.running:
+                self.via.reset()
+                self.target.reset()
+        elif not self.running:
+            return
+        elif pin == pins['CA1'] and value == LOW:
+            self._port_a_strobe()
+        elif pin == pins['CB1'] and value == LOW:
+            self._port_b_taken()
+        elif pin == pins['NMI'] and value == HIGH:
+            self.target.nmi()
+
+    def _port_a_strobe(self):
+        "CA1 active edge: latch port A, the target reads it and pulses CA2"
+        via = self.via
+        via.port_a = self._bus_output() if self._selected('CS_portA') else 0xFF
+        echo = self.target.receive(via.port_a)
+        via.ca2 = LOW
+        self._edge(self.pins['CA2'], LOW)
+        via.ca2 = HIGH
+        if echo and self.target.echo:
+            # Readback: the bootloader writes the byte to port B, CB2 in pulse mode
+            via.port_b = via.port_a
+            via.cb2 = LOW
+            self._edge(self.pins['CB2'], LOW)
+            via.cb2 = HIGH
+        if self.target.cb2_handshake:
+            self._next_output()
+
+    def _port_b_taken(self):
+        "CB1 active edge: the host has taken the byte on port B"
+        via = self.via
+        if self.target.cb2_handshake and via.cb2 == LOW:
+            via.cb2 = HIGH
+            self._next_output()
+
+    def _next_output(self):
+        via = self.via
+        output = self.target.output
+        if via.cb2 == HIGH and output:
+            via.port_b = output[0]
+            del output[0]
+            via.cb2 = LOW
+            self._edge(self.pins['CB2'], LOW)
+
+    def poll(self):
+        "Let the target present any console output queued since the last poll"
+        if self.running and self.target.cb2_handshake:
+            self._next_output()
+
+
+class SimPWM:
+    def __init__(self, pin, frequency):
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0
+
+    def start(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.duty_cycle = 0
+
+
+EMULATED = ('sim', 'emu')  # backends with a board of their own in each process
+
+
+def backend_name(name=None):
+    "The backend load_backend(name) would load"
+    return name or os.environ.get('BOARD_GPIO', 'rpi')
+
+
+def load_backend(name=None, pins=None):
+    "Return the named GPIO backend, defaulting to $BOARD_GPIO or the real RPi.GPIO"
+    name = backend_name(name)
+    if name == 'rpi':
+        return RPiBackend()
+    if name == 'sim':
+        return SimGPIO(pins)
+    if name == 'emu':
+        import emu
+        return emu.backend(pins)
+    if name == 'gpiomem':
+        from gpiomem import GpioMemBackend
+        return GpioMemBackend(os.environ.get('BOARD_GPIOMEM', '/dev/gpiomem'))
+    raise ValueError("unknown GPIO backend: " + name)
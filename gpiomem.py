@@ -0,0 +1,361 @@
+"Register-level GPIO backend, through a memory map of /dev/gpiomem"
+
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+
+from gpio_backend import (Backend, BCM, BOARD, IN, OUT, LOW, HIGH,
+                          PUD_OFF, PUD_UP, PUD_DOWN, RISING, FALLING, BOTH)
+
+# Register offsets in the GPIO block (BCM2835/6/7 and BCM2711)
+GPFSEL0 = 0x00      # function select, 3 bits per pin, 10 pins per register
+GPSET0 = 0x1C       # output set, write 1s
+GPCLR0 = 0x28       # output clear, write 1s
+GPLEV0 = 0x34       # pin level
+GPEDS0 = 0x40       # event detect status, write 1s to clear
+GPREN0 = 0x4C       # rising edge detect enable
+GPFEN0 = 0x58       # falling edge detect enable
+GPPUD = 0x94        # pull-up/down enable (BCM2835/6/7)
+GPPUDCLK0 = 0x98    # pull-up/down clock (BCM2835/6/7)
+GPIO_PUP_PDN_CNTRL_REG0 = 0xE4 # pull-up/down, 2 bits per pin (BCM2711)
+
+BLOCK_SIZE = 4096
+
+# Asking the GPIO character device who has a line
+GPIO_GET_LINEINFO_IOCTL = 0xC048B402    # _IOWR(0xB4, 0x02, struct gpioline_info)
+GPIOLINE_INFO = 'II32s32s'              # line_offset, flags, name, consumer
+GPIOLINE_FLAG_KERNEL = 1 << 0           # in use by the kernel (a driver, or sysfs)
+
+# Pi connector pin to Broadcom GPIO, for GPIO.setmode(GPIO.BOARD)
+BOARD_TO_BCM = {
+     3:  2,  5:  3,  7:  4,  8: 14, 10: 15, 11: 17, 12: 18, 13: 27,
+    15: 22, 16: 23, 18: 24, 19: 10, 21:  9, 22: 25, 23: 11, 24:  8,
+    26:  7, 27:  0, 28:  1, 29:  5, 31:  6, 32: 12, 33: 13, 35: 19,
+    36: 16, 37: 26, 38: 20, 40: 21,
+}
+
+
+def bus_tables(pins):
+    """Build the lookup tables for a data bus on bank 0 GPIOs, pins in D0..D7 order.
+
+    Returns (set_masks, clr_masks, runs, gather): set_masks[b] and clr_masks[b]
+    are the GPSET0/GPCLR0 words that put byte b on the bus. runs is a list of
+    (shift, mask) pairs that pack the bus bits of a GPLEV0 word into an 8-bit
+    key, in ascending pin order, and gather[key] is the byte that key represents.
+    """
+    assert len(pins) == 8 and all(0 <= pin < 32 for pin in pins)
+    set_masks = []
+    clr_masks = []
+    all_mask = 0
+    for pin in pins:
+        all_mask |= 1 << pin
+    for int8 in range(256):
+        mask = 0
+        for bit, pin in enumerate(pins):
+            if int8 >> bit & 1:
+                mask |= 1 << pin
+        set_masks.append(mask)
+        clr_masks.append(all_mask & ~mask)
+
+    # Group the sorted pins into runs of consecutive GPIOs, so each run
+    # can be moved into place in the key with one shift and mask.
+    ordered = sorted(pins)
+    runs = []
+    key_bit = 0
+    start = 0
+    for i in range(1, 9):
+        if i == 8 or ordered[i] != ordered[i - 1] + 1:
+            width = i - start
+            runs.append((ordered[start] - key_bit, ((1 << width) - 1) << key_bit))
+            key_bit += width
+            start = i
+
+    gather = bytearray(256)
+    for key in range(256):
+        int8 = 0
+        for key_bit, pin in enumerate(ordered):
+            if key >> key_bit & 1:
+                int8 |= 1 << pins.index(pin)
+        gather[key] = int8
+    return set_masks, clr_masks, runs, gather
+
+
+def line_owner(pin, chip='/dev/gpiochip0'):
+    "Who the kernel says has claimed a GPIO line, or None if nobody has (or there's no chip to ask)"
+    try:
+        fd = os.open(chip, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        info = bytearray(struct.pack(GPIOLINE_INFO, pin, 0, b'', b''))
+        fcntl.ioctl(fd, GPIO_GET_LINEINFO_IOCTL, info)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+    offset, flags, name, consumer = struct.unpack(GPIOLINE_INFO, info)
+    if not flags & GPIOLINE_FLAG_KERNEL:
+        return None
+    return consumer.rstrip(b'\0').decode() or 'the kernel'
+
+
+class SoftPWM:
+    "Software PWM on a GPIO, for when the hardware clocks aren't mapped"
+
+    def __init__(self, gpio, pin, frequency):
+        self.gpio = gpio
+        self.pin = pin
+        self.frequency = frequency
+        self.duty_cycle = 0
+        self.thread = None
+        self.running = False
+
+    def start(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while self.running:
+            period = 1.0 / self.frequency
+            high = period * self.duty_cycle / 100.0
+            self.gpio.output(self.pin, HIGH)
+            time.sleep(high)
+            self.gpio.output(self.pin, LOW)
+            time.sleep(period - high)
+
+
+class GpioMemBackend(Backend):
+    """GPIO through the register block, with single-access data bus reads and writes.
+
+    path can be any file at least BLOCK_SIZE long; a plain temporary file
+    stands in for /dev/gpiomem when testing off the Pi.
+
+    Edge detection sets GPREN0/GPFEN0 from user space, because the 6522's
+    strobes are a cycle long and polling GPLEV0 would miss them. Those
+    registers belong to the kernel's GPIO interrupt controller: an event
+    on a line it has no handler for raises the bank's interrupt with
+    nobody to clear it, and the kernel may disable that interrupt ("nobody
+    cared"), taking the edges of every line in the bank with it. So only
+    use edges on a Pi where nothing else needs GPIO interrupts, and never
+    on a line a kernel driver (or a sysfs export) has claimed:
+    add_event_detect() refuses those.
+    """
+
+    def __init__(self, path='/dev/gpiomem', soc=None):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        self.mem = mmap.mmap(self.fd, BLOCK_SIZE, mmap.MAP_SHARED,
+                             mmap.PROT_READ | mmap.PROT_WRITE)
+        self.regs = memoryview(self.mem).cast('I')
+        self.soc = soc or self._detect_soc()
+        self.mode = None
+        self.used = set()
+        self.edges = {}
+        self.tables = {}
+
+    def _detect_soc(self):
+        try:
+            with open('/proc/device-tree/compatible', 'rb') as f:
+                if b'bcm2711' in f.read():
+                    return 'bcm2711'
+        except OSError:
+            pass
+        return 'bcm2835'
+
+    def _bcm(self, channel):
+        if self.mode == BOARD:
+            return BOARD_TO_BCM[channel]
+        return channel
+
+    def _channels(self, channels):
+        if isinstance(channels, (list, tuple)):
+            return [self._bcm(channel) for channel in channels]
+        return [self._bcm(channels)]
+
+    # RPi.GPIO API
+
+    def getmode(self):
+        return self.mode
+
+    def setmode(self, mode):
+        assert mode in (BCM, BOARD)
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, channels, direction, pull_up_down=PUD_OFF, initial=None):
+        for pin in self._channels(channels):
+            self._setup(pin, direction, pull_up_down, initial)
+
+    def _setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        regs = self.regs
+        self.used.add(pin)
+        if direction == OUT and initial is not None:
+            self._write(pin, initial)
+        index = GPFSEL0 // 4 + pin // 10
+        shift = (pin % 10) * 3
+        regs[index] = (regs[index] & ~(7 << shift)) | ((1 if direction == OUT else 0) << shift)
+        if direction == IN:
+            self._pull(pin, pull_up_down)
+
+    def _pull(self, pin, pull_up_down):
+        regs = self.regs
+        if self.soc == 'bcm2711':
+            bits = {PUD_OFF: 0, PUD_UP: 1, PUD_DOWN: 2}[pull_up_down]
+            index = GPIO_PUP_PDN_CNTRL_REG0 // 4 + pin // 16
+            shift = (pin % 16) * 2
+            regs[index] = (regs[index] & ~(3 << shift)) | (bits << shift)
+        else:
+            regs[GPPUD // 4] = {PUD_OFF: 0, PUD_DOWN: 1, PUD_UP: 2}[pull_up_down]
+            time.sleep(0.00001) # 150 cycles of set-up time for the control signal
+            regs[GPPUDCLK0 // 4 + pin // 32] = 1 << (pin % 32)
+            time.sleep(0.00001)
+            regs[GPPUD // 4] = 0
+            regs[GPPUDCLK0 // 4 + pin // 32] = 0
+
+    def _write(self, pin, value):
+        register = GPSET0 if value else GPCLR0
+        self.regs[register // 4 + pin // 32] = 1 << (pin % 32)
+
+    def output(self, channels, values):
+        channels = self._channels(channels)
+        if not isinstance(values, (list, tuple)):
+            values = [values] * len(channels)
+        set0 = clr0 = 0
+        for pin, value in zip(channels, values):
+            if pin < 32:
+                if value:
+                    set0 |= 1 << pin
+                else:
+                    clr0 |= 1 << pin
+            else:
+                self._write(pin, value)
+        if set0:
+            self.regs[GPSET0 // 4] = set0
+        if clr0:
+            self.regs[GPCLR0 // 4] = clr0
+
+    def input(self, channel):
+        pin = self._bcm(channel)
+        return (self.regs[GPLEV0 // 4 + pin // 32] >> (pin % 32)) & 1
+
+    def add_event_detect(self, channel, edge, callback=None, bouncetime=None):
+        if callback is not None:
+            raise NotImplementedError("gpiomem backend has no edge callbacks")
+        pin = self._bcm(channel)
+        owner = line_owner(pin)
+        if owner is not None:
+            raise RuntimeError("GPIO%d is claimed by %s, whose interrupt handler owns its edges" % (pin, owner))
+        regs = self.regs
+        bank = pin // 32
+        mask = 1 << (pin % 32)
+        if edge in (RISING, BOTH):
+            regs[GPREN0 // 4 + bank] |= mask
+        if edge in (FALLING, BOTH):
+            regs[GPFEN0 // 4 + bank] |= mask
+        regs[GPEDS0 // 4 + bank] = mask   # discard any stale event
+        self.edges[pin] = edge
+
+    def add_event_callback(self, channel, callback):
+        raise NotImplementedError("gpiomem backend has no edge callbacks")
+
+    def remove_event_detect(self, channel):
+        self._remove_event_detect(self._bcm(channel))
+
+    def _remove_event_detect(self, pin):
+        regs = self.regs
+        bank = pin // 32
+        mask = 1 << (pin % 32)
+        regs[GPREN0 // 4 + bank] &= ~mask
+        regs[GPFEN0 // 4 + bank] &= ~mask
+        regs[GPEDS0 // 4 + bank] = mask
+        self.edges.pop(pin, None)
+
+    def event_detected(self, channel):
+        pin = self._bcm(channel)
+        index = GPEDS0 // 4 + pin // 32
+        mask = 1 << (pin % 32)
+        if self.regs[index] & mask:
+            self.regs[index] = mask   # write 1 to clear
+            return True
+        return False
+
+    def wait_for_edge(self, channel, edge, timeout=None, bouncetime=None):
+        "Poll for an edge; timeout is in milliseconds, as in RPi.GPIO"
+        pin = self._bcm(channel)
+        remove = pin not in self.edges
+        if remove:
+            self.add_event_detect(channel, edge)
+        deadline = None if timeout is None else time.monotonic() + timeout / 1000.0
+        try:
+            while not self.event_detected(channel):
+                if deadline is not None and time.monotonic() > deadline:
+                    return None
+                time.sleep(0)
+            return channel
+        finally:
+            if remove:
+                self.remove_event_detect(channel)
+
+    def PWM(self, channel, frequency):
+        return SoftPWM(self, channel, frequency)
+
+    def cleanup(self, channels=None):
+        pins = self.used if channels is None else self._channels(channels)
+        for pin in list(self.edges):
+            if pin in pins:
+                self._remove_event_detect(pin)
+        for pin in pins:
+            self._setup(pin, IN)
+        if channels is None:
+            self.used = set()
+            self.mode = None
+
+    # Data bus fast paths
+
+    def _tables(self, pins):
+        key = tuple(pins)
+        tables = self.tables.get(key)
+        if tables is None:
+            tables = self.tables[key] = bus_tables([self._bcm(pin) for pin in pins])
+        return tables
+
+    def write_byte(self, pins, int8):
+        "Drive the data bus with one GPSET0 and one GPCLR0 store"
+        set_masks, clr_masks, runs, gather = self._tables(pins)
+        regs = self.regs
+        regs[GPSET0 // 4] = set_masks[int8]
+        regs[GPCLR0 // 4] = clr_masks[int8]
+
+    def read_byte(self, pins):
+        "Read the data bus with one GPLEV0 load"
+        set_masks, clr_masks, runs, gather = self._tables(pins)
+        level = self.regs[GPLEV0 // 4]
+        key = 0
+        for shift, mask in runs:
+            key |= (level >> shift) & mask
+        return gather[key]
+
+    def close(self):
+        self.regs.release()
+        self.mem.close()
+        os.close(self.fd)
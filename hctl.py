@@ -0,0 +1,114 @@
+"""Fixed-rate sampling of the HCTL-2000 quadrature counters, with timestamps and velocity.
+
+The HCTL-2000's counter is 12 bits (the HCTL-2016's 16), read a byte at a
+time through the SEL line on boards whose profile has one (HCTL_SEL);
+elsewhere only the low byte can be read, and counts are 8 bits. Each
+sample is unwrapped into an unbounded position by taking the shortest
+way round from the previous count, which is right as long as an axis
+moves less than half the counter's range between samples.
+
+Samples go into preallocated array rings, one per column, so sampling
+doesn't allocate; consumers drain them in bulk.
+"""
+
+import asyncio
+import time
+
+from ring import ArrayRing
+
+
+class Axis:
+    "Position and velocity of one counter"
+
+    def __init__(self, name, cs, size, bits, smoothing):
+        self.name = name
+        self.cs = cs
+        self.mask = (1 << bits) - 1
+        self.half = 1 << (bits - 1)
+        self.smoothing = smoothing
+        self.count = None       # last raw count
+        self.position = 0       # unwrapped
+        self.velocity = 0.0     # counts per second, smoothed
+        self.positions = ArrayRing('q', size)
+        self.velocities = ArrayRing('d', size)
+
+    def update(self, count, dt):
+        if self.count is not None:
+            delta = (count - self.count) & self.mask
+            if delta >= self.half:
+                delta -= self.mask + 1
+            self.position += delta
+            if dt > 0:
+                self.velocity += self.smoothing * (delta / dt - self.velocity)
+        self.count = count
+        self.positions.append(self.position)
+        self.velocities.append(self.velocity)
+
+
+class Sampler:
+    """Samples a board's X and Y counters at a fixed rate.
+
+    rate is in samples per second, size the ring length in samples (a
+    power of two) and smoothing the weight of each new velocity estimate.
+    """
+
+    def __init__(self, board, rate=500, size=4096, bits=None, smoothing=0.2):
+        if bits is None:
+            bits = 12 if board.HCTL_SEL is not None else 8
+        self.board = board
+        self.period = 1.0 / rate
+        self.axes = [Axis(name, cs, size, bits, smoothing) for name, cs in
+                     (('x', board.CS_x_axis), ('y', board.CS_y_axis)) if cs is not None]
+        self.times = ArrayRing('d', size)
+        self.last_time = None
+        self.late = 0           # samples taken more than a period late
+
+    def sample(self, now=None):
+        "Read every axis once"
+        if now is None:
+            now = time.monotonic()
+        dt = 0.0 if self.last_time is None else now - self.last_time
+        self.last_time = now
+        read_hctl = self.board.read_hctl
+        for axis in self.axes:
+            axis.update(read_hctl(axis.cs) & axis.mask, dt)
+        self.times.append(now)
+
+    def drain(self):
+        """Everything sampled since the last drain: times, then positions and velocities per axis.
+
+        Returns {'t': array, 'x': array, 'vx': array, 'y': ..., 'vy': ...}.
+        """
+        samples = {'t': self.times.drain()}
+        for axis in self.axes:
+            samples[axis.name] = axis.positions.drain()
+            samples['v' + axis.name] = axis.velocities.drain()
+        return samples
+
+    def position(self):
+        return tuple(axis.position for axis in self.axes)
+
+    def velocity(self):
+        return tuple(axis.velocity for axis in self.axes)
+
+    async def run(self, lock, on_sample=None):
+        """Sample at the fixed rate until cancelled, taking lock (an asyncio.Lock) for the bus.
+
+        Sample times are scheduled from the start, not the last sample, so
+        the rate doesn't drift; a late sample is counted and the schedule
+        skips ahead rather than bunching up.
+        """
+        period = self.period
+        next_time = time.monotonic()
+        while True:
+            async with lock:
+                self.sample()
+            if on_sample is not None:
+                on_sample(self)
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay < 0:
+                self.late += 1
+                next_time = time.monotonic()
+                delay = 0
+            await asyncio.sleep(delay)
@@ -0,0 +1,114 @@
+"""Byte-level link engine for the RP2040's second core (plain Python, runs under CPython too).
+
+new_board-1.py starts it with _thread once bootloading is done. From
+then on the engine alone drives Port A and NMI: it moves what the 6809
+sends into the rx queue, sends what core 0 puts in the tx queue, and
+pulses NMI when asked. Core 0 keeps the asyncio tasks, decoding and USB
+output, so a slow print never holds up a handshake. The queues are
+ring.ByteQueues, one producer and one consumer each, so the cores share
+no locks; under CPython the same code runs on an ordinary thread.
+
+The port is anything with:
+
+    start(), stop()     take over and give back the port
+    receive()           bytes from the 6809 since the last call, possibly empty
+    send(data)          bytes to the 6809, with handshake
+    pulse_nmi()
+"""
+
+import _thread
+
+try:
+    from time import sleep_us
+except ImportError:
+    from time import sleep
+
+    def sleep_us(us):
+        sleep(us / 1_000_000)
+
+from ring import ByteQueue
+
+TX_CHUNK = 256      # most bytes sent per turn of the loop, so receiving keeps up
+
+
+class LinkEngine:
+    "Port A and NMI, driven from one loop on a thread (or core) of their own"
+
+    def __init__(self, port, rx_size=4096, tx_size=1024, idle_us=0):
+        self.port = port
+        self.rx = ByteQueue(rx_size)    # 6809 to core 0
+        self.tx = ByteQueue(tx_size)    # core 0 to 6809
+        self.idle_us = idle_us          # sleep when there's nothing to do (0: spin)
+        self.running = False
+        self.stopped = True
+        self.nmi_requests = 0           # written by core 0...
+        self.nmi_done = 0               # ...and this by the engine
+        self.queued = 0                 # bytes written for the 6809, by core 0...
+        self.sent = 0                   # ...and sent to it, by the engine
+        self.received = 0               # bytes from it, likewise
+
+    # Core 0 side
+
+    def start(self):
+        "Run the engine on a new thread (on the Pico, the second core)"
+        self.running = True
+        self.stopped = False
+        _thread.start_new_thread(self.run, ())
+
+    def stop(self):
+        "Ask the engine to finish, and wait until it has given the port back"
+        self.running = False
+        while not self.stopped:
+            sleep_us(100)
+
+    def write(self, data):
+        "Queue bytes for the 6809; returns how many there was room for"
+        count = self.tx.put(data)
+        self.queued += count
+        return count
+
+    def read(self, limit=None):
+        "What the 6809 has sent, possibly empty"
+        return self.rx.get(limit)
+
+    def nmi(self):
+        "Have the engine pulse NMI, between bytes"
+        self.nmi_requests += 1
+
+    def flushed(self):
+        "True when everything written has been sent"
+        return self.sent == self.queued
+
+    # Engine side
+
+    def run(self):
+        port = self.port
+        rx = self.rx
+        tx = self.tx
+        pending = b''   # received, waiting for room in rx: held, never dropped
+        port.start()
+        try:
+            while self.running:
+                busy = False
+                if not pending:
+                    pending = port.receive()
+                    self.received += len(pending)
+                if pending:
+                    taken = rx.put(pending)
+                    if taken:
+                        pending = pending[taken:]
+                        busy = True
+                data = tx.get(TX_CHUNK)
+                if data:
+                    port.send(data)
+                    self.sent += len(data)
+                    busy = True
+                if self.nmi_done != self.nmi_requests:
+                    port.pulse_nmi()
+                    self.nmi_done += 1
+                    busy = True
+                if not busy and self.idle_us:
+                    sleep_us(self.idle_us)
+        finally:
+            port.stop()
+            self.stopped = True
@@ -0,0 +1,199 @@
+"""LZ/RLE compression for downloads, and the 6809 stub that decompresses them.
+
+The format is a sequence of tokens, decoded until the destination is full:
+
+    0nnnnnnn                    n+1 literal bytes follow (1..128)
+    10nnnnnn vv                 n+3 copies of byte vv (3..66)
+    11nnnnnn hh ll              copy n+3 bytes (3..66) from hhll bytes back
+                                in the output
+
+Zero fill and repeated tables, which 6809 images are full of, become fill
+and copy tokens that the stub decodes with a few instructions per byte.
+Runs under MicroPython too.
+"""
+
+RAM_BOTTOM = 0x0100  # lowest RAM free for staging: the first stage's stack is the page below
+MAX_LITERALS = 128
+MIN_RUN = 3
+MAX_RUN = 66
+MAX_OFFSET = 0xFFFF
+CHAIN_DEPTH = 32    # match candidates tried per position
+
+
+def compress(data):
+    "Compress data; returns a bytearray of tokens"
+    out = bytearray()
+    literals = bytearray()
+    heads = {}      # 3-byte sequence -> most recent position
+    prev = {}       # position -> previous position with the same sequence
+    n = len(data)
+
+    def flush():
+        start = 0
+        while start < len(literals):
+            chunk = literals[start:start + MAX_LITERALS]
+            out.append(len(chunk) - 1)
+            out.extend(chunk)
+            start += MAX_LITERALS
+        literals[:] = b''
+
+    def insert(pos):
+        if pos + 3 <= n:
+            key = bytes(data[pos:pos + 3])
+            if key in heads:
+                prev[pos] = heads[key]
+            heads[key] = pos
+
+    i = 0
+    while i < n:
+        value = data[i]
+        run = 1
+        while i + run < n and run < MAX_RUN and data[i + run] == value:
+            run += 1
+
+        best_len = 0
+        best_pos = 0
+        if i + 3 <= n:
+            candidate = heads.get(bytes(data[i:i + 3]))
+            depth = CHAIN_DEPTH
+            limit = min(MAX_RUN, n - i)
+            while candidate is not None and depth and i - candidate <= MAX_OFFSET:
+                length = 0
+                while length < limit and data[candidate + length] == data[i + length]:
+                    length += 1
+                if length > best_len:
+                    best_len = length
+                    best_pos = candidate
+                    if length == limit:
+                        break
+                candidate = prev.get(candidate)
+                depth -= 1
+
+        if run >= MIN_RUN and run >= best_len:
+            flush()
+            out.append(0x80 | (run - MIN_RUN))
+            out.append(value)
+            step = run
+        elif best_len >= 4:   # a 3-byte copy saves nothing over literals
+            flush()
+            offset = i - best_pos
+            out.append(0xC0 | (best_len - MIN_RUN))
+            out.append(offset >> 8)
+            out.append(offset & 0xFF)
+            step = best_len
+        else:
+            literals.append(value)
+            step = 1
+
+        for pos in range(i, i + step):
+            insert(pos)
+        i += step
+
+    flush()
+    return out
+
+
+def decompress(packed, length):
+    "Reference decoder, doing exactly what the 6809 stub does"
+    out = bytearray()
+    i = 0
+    while len(out) < length:
+        token = packed[i]
+        i += 1
+        if token < 0x80:
+            count = token + 1
+            out += packed[i:i + count]
+            i += count
+        elif token < 0xC0:
+            out += bytes([packed[i]]) * ((token & 0x3F) + MIN_RUN)
+            i += 1
+        else:
+            offset = (packed[i] << 8) | packed[i + 1]
+            i += 2
+            start = len(out) - offset
+            for j in range((token & 0x3F) + MIN_RUN):
+                out.append(out[start + j])
+    return out
+
+
+# Position-independent 6809 decompressor. It is downloaded with its
+# parameters and the compressed data appended, and executed in place:
+#
+# 00 34 40        start   PSHS  U
+# 02 30 8C 4F             LEAX  data,PCR      ; X: compressed data
+# 05 10 AE 8C 45          LDY   dst,PCR       ; Y: destination
+# 09 10 AC 8C 43  loop    CMPY  end,PCR
+# 0D 24 3A                BHS   done
+# 0F E6 80                LDB   ,X+           ; token
+# 11 2B 0A                BMI   notlit
+# 13 5C                   INCB                ; literals: n+1 bytes
+# 14 A6 80        lit     LDA   ,X+
+# 16 A7 A0                STA   ,Y+
+# 18 5A                   DECB
+# 19 26 F9                BNE   lit
+# 1B 20 EC                BRA   loop
+# 1D C5 40        notlit  BITB  #$40
+# 1F 26 0D                BNE   match
+# 21 C4 3F                ANDB  #$3F          ; fill: n+3 copies of a byte
+# 23 CB 03                ADDB  #3
+# 25 A6 80                LDA   ,X+
+# 27 A7 A0        fill    STA   ,Y+
+# 29 5A                   DECB
+# 2A 26 FB                BNE   fill
+# 2C 20 DB                BRA   loop
+# 2E C4 3F        match   ANDB  #$3F          ; copy: n+3 bytes from earlier output
+# 30 CB 03                ADDB  #3
+# 32 34 04                PSHS  B
+# 34 EC 81                LDD   ,X++          ; offset
+# 36 34 06                PSHS  D
+# 38 1F 20                TFR   Y,D
+# 3A A3 E1                SUBD  ,S++
+# 3C 1F 03                TFR   D,U
+# 3E 35 04                PULS  B
+# 40 A6 C0        copy    LDA   ,U+
+# 42 A7 A0                STA   ,Y+
+# 44 5A                   DECB
+# 45 26 F9                BNE   copy
+# 47 20 C0                BRA   loop
+# 49 35 40        done    PULS  U
+# 4B 6E 9C 04             JMP   [exec,PCR]
+# 4E              dst     FDB   destination start
+# 50              end     FDB   destination end
+# 52              exec    FDB   address to run when done
+# 54              data    compressed data
+STUB_CODE = bytes([
+    0x34, 0x40, 0x30, 0x8C, 0x4F, 0x10, 0xAE, 0x8C, 0x45, 0x10, 0xAC, 0x8C,
+    0x43, 0x24, 0x3A, 0xE6, 0x80, 0x2B, 0x0A, 0x5C, 0xA6, 0x80, 0xA7, 0xA0,
+    0x5A, 0x26, 0xF9, 0x20, 0xEC, 0xC5, 0x40, 0x26, 0x0D, 0xC4, 0x3F, 0xCB,
+    0x03, 0xA6, 0x80, 0xA7, 0xA0, 0x5A, 0x26, 0xFB, 0x20, 0xDB, 0xC4, 0x3F,
+    0xCB, 0x03, 0x34, 0x04, 0xEC, 0x81, 0x34, 0x06, 0x1F, 0x20, 0xA3, 0xE1,
+    0x1F, 0x03, 0x35, 0x04, 0xA6, 0xC0, 0xA7, 0xA0, 0x5A, 0x26, 0xF9, 0x20,
+    0xC0, 0x35, 0x40, 0x6E, 0x9C, 0x04,
+])
+
+
+def stub_image(load_addr, length, exec_addr, packed):
+    "The stub, its parameters and the compressed data, ready to download and run"
+    image = bytearray(STUB_CODE)
+    image += load_addr.to_bytes(2, 'big')
+    image += ((load_addr + length) & 0xFFFF).to_bytes(2, 'big')
+    image += exec_addr.to_bytes(2, 'big')
+    image += packed
+    return image
+
+
+def staging_addr(load_addr, length, size, top, bottom=RAM_BOTTOM):
+    """Where to stage a size-byte stub image in free RAM [bottom, top), clear of the destination.
+
+    Just above the destination if it fits there, else as high as it will
+    go below it (or below top, if the destination is above that). Raises
+    ValueError if there's no room anywhere.
+    """
+    above = load_addr + length
+    if above >= bottom and above + size <= top:
+        return above
+    below = min(load_addr, top) - size
+    if below >= bottom:
+        return below
+    raise ValueError("no room for a %d-byte stub image in free RAM %04X-%04X clear of %04X-%04X" %
+                     (size, bottom, top, load_addr, load_addr + length))
@@ -0,0 +1,108 @@
+"Record of the modules resident in 6809 RAM, to skip re-downloading them (runs under MicroPython too)"
+
+import json
+
+try:
+    import hashlib
+    from binascii import hexlify
+except ImportError:
+    import uhashlib as hashlib
+    from ubinascii import hexlify
+
+from protocol import crc16
+
+
+def digest(data):
+    return hexlify(hashlib.sha256(bytes(data)).digest()).decode()
+
+
+class Manifest:
+    """Map of module name to (hash, load address, length, exec address, CRC-16).
+
+    A module can be skipped when its file, its load address and the
+    target's own checksum of the region all still match what we sent.
+
+    It also notes whether a program that never returns to the loader has
+    been started since (running), because until the next reset the loader
+    can't take commands however intact it is.
+    """
+
+    def __init__(self, path='manifest.json'):
+        self.path = path
+        self.entries = {}
+        self.running = None     # name of a program started since that doesn't return to the loader
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        if 'modules' in saved:
+            self.entries = saved['modules']
+            self.running = saved.get('running')
+        else:
+            self.entries = saved    # written before running was kept
+        self.skipped = 0        # bytes not sent, this run
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'modules': self.entries, 'running': self.running}, f)
+
+    def forget(self):
+        "After a cold start, nothing can be assumed resident, and the loader is what's running"
+        self.entries = {}
+        self.running = None
+
+    def started(self, name):
+        "Note that a program that doesn't return to the loader has been started"
+        self.running = name
+
+    def resident(self, name, data, load_addr, exec_addr, checksum):
+        """True if the module is already in RAM at load_addr.
+
+        checksum(addr, length) asks the target for the CRC-16 of a region,
+        returning None if the target didn't answer.
+        """
+        entry = self.entries.get(name)
+        if entry is None:
+            return False
+        if (entry['load'] != load_addr or entry['length'] != len(data) or
+                entry['exec'] != exec_addr or entry['hash'] != digest(data)):
+            return False
+        if checksum(load_addr, len(data)) != entry['crc']:
+            return False
+        self.skipped += len(data)
+        return True
+
+    def loader_resident(self, name, data, load_addr, exec_addr, probe, checksum):
+        """True if the loader module is resident and waiting for commands, so it needs no bootstrap.
+
+        False without asking if a program that doesn't return to the
+        loader has been started since (see started()): the loader can't
+        answer, and probing would drive the port under that program.
+        Otherwise probe() asks for something only the loader answers,
+        raising OSError if it doesn't, before the loader's own region is
+        checked as resident() does.
+        """
+        if self.running is not None:
+            return False
+        probe()
+        return self.resident(name, data, load_addr, exec_addr, checksum)
+
+    def overwritten(self, addr, length, keep=None):
+        "Forget the modules (but keep) overlapping a region that has been written over"
+        end = addr + length
+        for other in list(self.entries):
+            entry = self.entries[other]
+            if other != keep and entry['load'] < end and addr < entry['load'] + entry['length']:
+                del self.entries[other]
+
+    def record(self, name, data, load_addr, exec_addr):
+        "Note that a module has been downloaded"
+        self.overwritten(load_addr, len(data), keep=name)
+        self.entries[name] = {
+            'hash': digest(data),
+            'load': load_addr,
+            'length': len(data),
+            'exec': exec_addr,
+            'crc': crc16(data),
+        }
@@ -0,0 +1,856 @@
+"""Motorola 6809 CPU emulator, for running 6809 code off the board (see emu.py).
+
+All the documented instructions and addressing modes, with the datasheet
+cycle counts (indexed-mode extras included), so target-side timing can
+be measured. Memory is a 64 KiB bytearray; accesses to the I/O window go
+to a device (the 6522) instead, and writes at or above rom_base are
+dropped.
+
+A device has read(reg), write(reg, value) and update(), which the CPU
+calls once cycles reaches next_event; it drives the IRQ line with
+set_irq(), and calls idle() when it sees the program spinning on it, so
+the CPU can skip ahead to the next event instead of emulating the loop.
+"""
+
+from rombuild import VECTORS
+
+# Condition code bits
+E = 0x80    # entire state stacked
+F = 0x40    # FIRQ mask
+H = 0x20    # half carry
+I = 0x10    # IRQ mask
+N = 0x08
+Z = 0x04
+V = 0x02
+C = 0x01
+
+NEVER = 1 << 62
+
+# N and Z for each 8-bit result
+NZ8 = bytes([(N if value & 0x80 else 0) | (0 if value else Z) for value in range(256)])
+
+# TFR/EXG register numbers
+REGISTERS = {0: 'd', 1: 'x', 2: 'y', 3: 'u', 4: 's', 5: 'pc', 8: 'a', 9: 'b', 10: 'cc', 11: 'dp'}
+INDEX_REGISTERS = ('x', 'y', 'u', 's')
+
+
+def nz16(value):
+    return ((value >> 12) & N) | (0 if value else Z)
+
+
+def signed8(value):
+    return value - 0x100 if value & 0x80 else value
+
+
+class CPU:
+    "A 6809 and its memory"
+
+    def __init__(self, memory=None, io_base=None, io_size=16, device=None, rom_base=0x10000):
+        self.memory = memory if memory is not None else bytearray(0x10000)
+        self.io_base = io_base if io_base is not None else NEVER
+        self.io_end = self.io_base + io_size
+        self.device = device
+        self.rom_base = rom_base
+        self.cycles = 0
+        self.idle_cycles = 0        # skipped waiting, rather than emulated
+        self.instructions = 0
+        self.next_event = NEVER
+        self.stop = 0
+        self.irq = False
+        self.firq = False
+        self.reset()
+
+    def reset(self):
+        self.a = self.b = self.dp = 0
+        self.x = self.y = self.u = self.s = 0
+        self.cc = I | F
+        self.nmi_armed = False      # until S is loaded
+        self.nmi_pending = False
+        self.waiting = None         # 'sync' or 'cwai'
+        self.pc = self.read16(VECTORS['RESET'])
+
+    # Interrupt lines
+
+    def nmi(self):
+        "An edge on NMI"
+        if self.nmi_armed:
+            self.nmi_pending = True
+
+    def set_irq(self, level):
+        self.irq = level
+
+    def set_firq(self, level):
+        self.firq = level
+
+    def idle(self, since=None):
+        """The program is waiting on the device: skip to the next event, or the end of the run.
+
+        since is when the waiting started, if the device knows.
+        """
+        target = max(min(self.stop, self.next_event), self.cycles)
+        self.idle_cycles += target - (self.cycles if since is None else since)
+        self.cycles = target
+
+    # Execution
+
+    def run(self, cycles):
+        "Run for (at least) cycles; returns the cycles that passed"
+        start = self.cycles
+        self.stop = start + cycles
+        ops = OPS
+        memory = self.memory
+        while self.cycles < self.stop:
+            if self.cycles >= self.next_event:
+                self.device.update()
+            if self.nmi_pending or self.irq or self.firq:
+                if self.interrupt():
+                    continue
+            if self.waiting is not None:
+                self.idle()
+                continue
+            pc = self.pc
+            self.pc = (pc + 1) & 0xFFFF
+            self.instructions += 1
+            ops[memory[pc]](self)
+        return self.cycles - start
+
+    def interrupt(self):
+        "Take a pending interrupt if it isn't masked; True if one was taken"
+        cc = self.cc
+        if self.nmi_pending:
+            self.nmi_pending = False
+            self.enter(VECTORS['NMI'], True, F | I)
+        elif self.firq and not cc & F:
+            self.enter(VECTORS['FIRQ'], False, F | I)
+        elif self.irq and not cc & I:
+            self.enter(VECTORS['IRQ'], True, I)
+        else:
+            if self.waiting == 'sync':
+                self.waiting = None     # a masked interrupt just ends SYNC
+            return False
+        return True
+
+    def enter(self, vector, entire, mask):
+        if self.waiting == 'cwai':
+            self.cycles += 1            # state already stacked
+        elif entire:
+            self.cc |= E
+            self.push('s', 0xFF)
+            self.cycles += 19
+        else:
+            self.cc &= ~E
+            self.push('s', 0x81)
+            self.cycles += 10
+        self.waiting = None
+        self.cc |= mask
+        self.pc = self.read16(vector)
+
+    # Memory
+
+    def read(self, addr):
+        if self.io_base <= addr < self.io_end:
+            return self.device.read(addr - self.io_base)
+        return self.memory[addr]
+
+    def write(self, addr, value):
+        if self.io_base <= addr < self.io_end:
+            self.device.write(addr - self.io_base, value)
+        elif addr < self.rom_base:
+            self.memory[addr] = value
+
+    def read16(self, addr):
+        return (self.read(addr) << 8) | self.read((addr + 1) & 0xFFFF)
+
+    def write16(self, addr, value):
+        self.write(addr, value >> 8)
+        self.write((addr + 1) & 0xFFFF, value & 0xFF)
+
+    def fetch(self):
+        pc = self.pc
+        self.pc = (pc + 1) & 0xFFFF
+        return self.memory[pc]
+
+    def fetch16(self):
+        pc = self.pc
+        memory = self.memory
+        self.pc = (pc + 2) & 0xFFFF
+        return (memory[pc] << 8) | memory[(pc + 1) & 0xFFFF]
+
+    # Registers
+
+    @property
+    def d(self):
+        return (self.a << 8) | self.b
+
+    @d.setter
+    def d(self, value):
+        self.a = value >> 8
+        self.b = value & 0xFF
+
+    def get(self, number):
+        "A register by its TFR/EXG number; 8-bit registers read as 0xFFnn in a 16-bit context"
+        return getattr(self, REGISTERS[number])
+
+    def set(self, number, value, wide):
+        name = REGISTERS[number]
+        if number < 8:
+            if not wide:
+                value |= 0xFF00
+            if name == 's':
+                self.nmi_armed = True
+        else:
+            value &= 0xFF
+        setattr(self, name, value)
+
+    # Stacks
+
+    def push(self, stack, postbyte):
+        "PSHS/PSHU: push the registers in postbyte, highest first"
+        other = 'u' if stack == 's' else 's'
+        sp = getattr(self, stack)
+        write = self.write
+        cycles = 0
+        for bit, name in ((0x80, 'pc'), (0x40, other), (0x20, 'y'), (0x10, 'x')):
+            if postbyte & bit:
+                value = getattr(self, name)
+                sp = (sp - 1) & 0xFFFF
+                write(sp, value & 0xFF)
+                sp = (sp - 1) & 0xFFFF
+                write(sp, value >> 8)
+                cycles += 2
+        for bit, name in ((0x08, 'dp'), (0x04, 'b'), (0x02, 'a'), (0x01, 'cc')):
+            if postbyte & bit:
+                sp = (sp - 1) & 0xFFFF
+                write(sp, getattr(self, name))
+                cycles += 1
+        setattr(self, stack, sp)
+        return cycles
+
+    def pull(self, stack, postbyte):
+        "PULS/PULU: pull the registers in postbyte, lowest first"
+        other = 'u' if stack == 's' else 's'
+        sp = getattr(self, stack)
+        read = self.read
+        cycles = 0
+        for bit, name in ((0x01, 'cc'), (0x02, 'a'), (0x04, 'b'), (0x08, 'dp')):
+            if postbyte & bit:
+                setattr(self, name, read(sp))
+                sp = (sp + 1) & 0xFFFF
+                cycles += 1
+        for bit, name in ((0x10, 'x'), (0x20, 'y'), (0x40, other), (0x80, 'pc')):
+            if postbyte & bit:
+                setattr(self, name, (read(sp) << 8) | read((sp + 1) & 0xFFFF))
+                sp = (sp + 2) & 0xFFFF
+                cycles += 2
+        setattr(self, stack, sp)
+        return cycles
+
+    # Addressing modes: each returns an effective address
+
+    def direct(self):
+        return (self.dp << 8) | self.fetch()
+
+    def extended(self):
+        return self.fetch16()
+
+    def indexed(self):
+        postbyte = self.fetch()
+        name = INDEX_REGISTERS[(postbyte >> 5) & 3]
+        reg = getattr(self, name)
+        if not postbyte & 0x80:
+            self.cycles += 1
+            offset = postbyte & 0x1F
+            return (reg + (offset - 0x20 if offset & 0x10 else offset)) & 0xFFFF
+        mode = postbyte & 0x0F
+        if postbyte & 0x10 and mode in (0x0, 0x2) or mode == 0xF and not postbyte & 0x10:
+            # [,R+] and [,-R] don't exist, and n16 alone is only ever indirect
+            raise ValueError("illegal indexed postbyte 0x%02X at 0x%04X" % (postbyte, self.pc))
+        if mode == 0x0:     # ,R+
+            setattr(self, name, (reg + 1) & 0xFFFF)
+            self.cycles += 2
+            return reg
+        if mode == 0x1:     # ,R++
+            setattr(self, name, (reg + 2) & 0xFFFF)
+            self.cycles += 3
+            addr = reg
+        elif mode == 0x2:   # ,-R
+            reg = (reg - 1) & 0xFFFF
+            setattr(self, name, reg)
+            self.cycles += 2
+            return reg
+        elif mode == 0x3:   # ,--R
+            reg = (reg - 2) & 0xFFFF
+            setattr(self, name, reg)
+            self.cycles += 3
+            addr = reg
+        elif mode == 0x4:   # ,R
+            addr = reg
+        elif mode == 0x5:   # B,R
+            addr = reg + signed8(self.b)
+            self.cycles += 1
+        elif mode == 0x6:   # A,R
+            addr = reg + signed8(self.a)
+            self.cycles += 1
+        elif mode == 0x8:   # n8,R
+            addr = reg + signed8(self.fetch())
+            self.cycles += 1
+        elif mode == 0x9:   # n16,R
+            addr = reg + self.fetch16()
+            self.cycles += 4
+        elif mode == 0xB:   # D,R
+            addr = reg + self.d
+            self.cycles += 4
+        elif mode == 0xC:   # n8,PCR
+            offset = signed8(self.fetch())
+            addr = self.pc + offset
+            self.cycles += 1
+        elif mode == 0xD:   # n16,PCR
+            offset = self.fetch16()
+            addr = self.pc + offset
+            self.cycles += 5
+        elif mode == 0xF:   # [n16]
+            addr = self.fetch16()
+            self.cycles += 2
+        else:
+            raise ValueError("illegal indexed postbyte 0x%02X at 0x%04X" % (postbyte, self.pc))
+        addr &= 0xFFFF
+        if postbyte & 0x10:
+            self.cycles += 3
+            addr = self.read16(addr)
+        return addr
+
+    def immediate(self):
+        pc = self.pc
+        self.pc = (pc + 1) & 0xFFFF
+        return pc
+
+    def immediate16(self):
+        pc = self.pc
+        self.pc = (pc + 2) & 0xFFFF
+        return pc
+
+
+# 8-bit operations: op(cpu, register, operand) returns the new register
+# value, or None for those that only set flags
+
+def op_sub(cpu, r, m):
+    t = r - m
+    cpu.cc = (cpu.cc & 0xF0) | NZ8[t & 0xFF] | ((r ^ m) & (r ^ t) & 0x80) >> 6 | (t >> 8) & C
+    return t & 0xFF
+
+
+def op_cmp(cpu, r, m):
+    op_sub(cpu, r, m)
+
+
+def op_sbc(cpu, r, m):
+    t = r - m - (cpu.cc & C)
+    cpu.cc = (cpu.cc & 0xF0) | NZ8[t & 0xFF] | ((r ^ m) & (r ^ t) & 0x80) >> 6 | (t >> 8) & C
+    return t & 0xFF
+
+
+def op_add(cpu, r, m):
+    t = r + m
+    cpu.cc = ((cpu.cc & 0xD0) | ((r ^ m ^ t) & 0x10) << 1 | NZ8[t & 0xFF] |
+              ((r ^ t) & (m ^ t) & 0x80) >> 6 | (t >> 8))
+    return t & 0xFF
+
+
+def op_adc(cpu, r, m):
+    t = r + m + (cpu.cc & C)
+    cpu.cc = ((cpu.cc & 0xD0) | ((r ^ m ^ t) & 0x10) << 1 | NZ8[t & 0xFF] |
+              ((r ^ t) & (m ^ t) & 0x80) >> 6 | (t >> 8))
+    return t & 0xFF
+
+
+def op_and(cpu, r, m):
+    t = r & m
+    cpu.cc = (cpu.cc & 0xF1) | NZ8[t]
+    return t
+
+
+def op_bit(cpu, r, m):
+    cpu.cc = (cpu.cc & 0xF1) | NZ8[r & m]
+
+
+def op_eor(cpu, r, m):
+    t = r ^ m
+    cpu.cc = (cpu.cc & 0xF1) | NZ8[t]
+    return t
+
+
+def op_or(cpu, r, m):
+    t = r | m
+    cpu.cc = (cpu.cc & 0xF1) | NZ8[t]
+    return t
+
+
+def op_ld(cpu, r, m):
+    cpu.cc = (cpu.cc & 0xF1) | NZ8[m]
+    return m
+
+
+# 16-bit operations, the same way
+
+def op_sub16(cpu, r, m):
+    t = r - m
+    cpu.cc = ((cpu.cc & 0xF0) | nz16(t & 0xFFFF) | ((r ^ m) & (r ^ t) & 0x8000) >> 14 |
+              (t >> 16) & C)
+    return t & 0xFFFF
+
+
+def op_cmp16(cpu, r, m):
+    op_sub16(cpu, r, m)
+
+
+def op_add16(cpu, r, m):
+    t = r + m
+    cpu.cc = (cpu.cc & 0xF0) | nz16(t & 0xFFFF) | ((r ^ t) & (m ^ t) & 0x8000) >> 14 | (t >> 16)
+    return t & 0xFFFF
+
+
+def op_ld16(cpu, r, m):
+    cpu.cc = (cpu.cc & 0xF1) | nz16(m)
+    return m
+
+
+# Read-modify-write operations: op(cpu, operand) returns the result, or None
+
+def op_neg(cpu, m):
+    t = -m
+    cpu.cc = (cpu.cc & 0xF0) | NZ8[t & 0xFF] | (m & t & 0x80) >> 6 | (t >> 8) & C
+    return t & 0xFF
+
+
+def op_com(cpu, m):
+    t = m ^ 0xFF
+    cpu.cc = (cpu.cc & 0xF0) | NZ8[t] | C
+    return t
+
+
+def op_lsr(cpu, m):
+    t = m >> 1
+    cpu.cc = (cpu.cc & 0xF2) | NZ8[t] | (m & C)
+    return t
+
+
+def op_ror(cpu, m):
+    t = (m >> 1) | (cpu.cc & C) << 7
+    cpu.cc = (cpu.cc & 0xF2) | NZ8[t] | (m & C)
+    return t
+
+
+def op_asr(cpu, m):
+    t = (m >> 1) | (m & 0x80)
+    cpu.cc = (cpu.cc & 0xF2) | NZ8[t] | (m & C)
+    return t
+
+
+def op_asl(cpu, m):
+    t = (m << 1) & 0xFF
+    cpu.cc = (cpu.cc & 0xF0) | NZ8[t] | ((m ^ t) & 0x80) >> 6 | (m >> 7)
+    return t
+
+
+def op_rol(cpu, m):
+    t = ((m << 1) & 0xFF) | (cpu.cc & C)
+    cpu.cc = (cpu.cc & 0xF0) | NZ8[t] | ((m ^ (m << 1)) & 0x80) >> 6 | (m >> 7)
+    return t
+
+
+def op_dec(cpu, m):
+    t = (m - 1) & 0xFF
+    cpu.cc = (cpu.cc & 0xF1) | NZ8[t] | (V if m == 0x80 else 0)
+    return t
+
+
+def op_inc(cpu, m):
+    t = (m + 1) & 0xFF
+    cpu.cc = (cpu.cc & 0xF1) | NZ8[t] | (V if m == 0x7F else 0)
+    return t
+
+
+def op_tst(cpu, m):
+    cpu.cc = (cpu.cc & 0xF1) | NZ8[m]
+
+
+def op_clr(cpu, m):
+    cpu.cc = (cpu.cc & 0xF0) | Z
+    return 0
+
+
+# Branch conditions, by the low nibble of the opcode
+
+CONDITIONS = (
+    lambda cc: True,                                    # BRA
+    lambda cc: False,                                   # BRN
+    lambda cc: not cc & (C | Z),                        # BHI
+    lambda cc: cc & (C | Z),                            # BLS
+    lambda cc: not cc & C,                              # BHS/BCC
+    lambda cc: cc & C,                                  # BLO/BCS
+    lambda cc: not cc & Z,                              # BNE
+    lambda cc: cc & Z,                                  # BEQ
+    lambda cc: not cc & V,                              # BVC
+    lambda cc: cc & V,                                  # BVS
+    lambda cc: not cc & N,                              # BPL
+    lambda cc: cc & N,                                  # BMI
+    lambda cc: not (cc ^ (cc << 2)) & N,                # BGE
+    lambda cc: (cc ^ (cc << 2)) & N,                    # BLT
+    lambda cc: not (cc & Z or (cc ^ (cc << 2)) & N),    # BGT
+    lambda cc: cc & Z or (cc ^ (cc << 2)) & N,          # BLE
+)
+
+
+# Instruction handlers, built into three 256-entry tables by opcode page
+
+def illegal(cpu):
+    raise ValueError("illegal opcode at 0x%04X" % ((cpu.pc - 1) & 0xFFFF))
+
+
+OPS = [illegal] * 256
+OPS10 = [illegal] * 256
+OPS11 = [illegal] * 256
+
+MODES = (CPU.immediate, CPU.direct, CPU.indexed, CPU.extended)
+MODES16 = (CPU.immediate16, CPU.direct, CPU.indexed, CPU.extended)
+
+
+def _alu8(op, reg, mode, cycles):
+    def handler(cpu):
+        cpu.cycles += cycles
+        result = op(cpu, getattr(cpu, reg), cpu.read(mode(cpu)))
+        if result is not None:
+            setattr(cpu, reg, result)
+    return handler
+
+
+def _store8(reg, mode, cycles):
+    def handler(cpu):
+        cpu.cycles += cycles
+        value = getattr(cpu, reg)
+        cpu.cc = (cpu.cc & 0xF1) | NZ8[value]
+        cpu.write(mode(cpu), value)
+    return handler
+
+
+def _alu16(op, reg, mode, cycles):
+    def handler(cpu):
+        cpu.cycles += cycles
+        result = op(cpu, getattr(cpu, reg), cpu.read16(mode(cpu)))
+        if result is not None:
+            setattr(cpu, reg, result)
+            if reg == 's':
+                cpu.nmi_armed = True
+    return handler
+
+
+def _store16(reg, mode, cycles):
+    def handler(cpu):
+        cpu.cycles += cycles
+        value = getattr(cpu, reg)
+        cpu.cc = (cpu.cc & 0xF1) | nz16(value)
+        cpu.write16(mode(cpu), value)
+    return handler
+
+
+def _rmw(op, mode, cycles):
+    def handler(cpu):
+        cpu.cycles += cycles
+        addr = mode(cpu)
+        result = op(cpu, cpu.read(addr))
+        if result is not None:
+            cpu.write(addr, result)
+    return handler
+
+
+def _inherent(op, reg):
+    def handler(cpu):
+        cpu.cycles += 2
+        result = op(cpu, getattr(cpu, reg))
+        if result is not None:
+            setattr(cpu, reg, result)
+    return handler
+
+
+def _jmp(mode, cycles):
+    def handler(cpu):
+        cpu.cycles += cycles
+        cpu.pc = mode(cpu)
+    return handler
+
+
+def _jsr(mode, cycles):
+    def handler(cpu):
+        cpu.cycles += cycles
+        addr = mode(cpu)
+        cpu.push('s', 0x80)
+        cpu.pc = addr
+    return handler
+
+
+def _branch(condition):
+    def handler(cpu):
+        cpu.cycles += 3
+        offset = cpu.fetch()
+        if condition(cpu.cc):
+            cpu.pc = (cpu.pc + signed8(offset)) & 0xFFFF
+    return handler
+
+
+def _long_branch(condition):
+    def handler(cpu):
+        cpu.cycles += 5
+        offset = cpu.fetch16()
+        if condition(cpu.cc):
+            cpu.cycles += 1
+            cpu.pc = (cpu.pc + offset) & 0xFFFF
+    return handler
+
+
+def _lea(reg, flags):
+    def handler(cpu):
+        cpu.cycles += 4
+        addr = cpu.indexed()
+        setattr(cpu, reg, addr)
+        if flags:
+            cpu.cc = (cpu.cc & ~Z) | (0 if addr else Z)
+        elif reg == 's':
+            cpu.nmi_armed = True
+    return handler
+
+
+def _push(stack):
+    def handler(cpu):
+        cpu.cycles += 5 + cpu.push(stack, cpu.fetch())
+    return handler
+
+
+def _pull(stack):
+    def handler(cpu):
+        cpu.cycles += 5 + cpu.pull(stack, cpu.fetch())
+    return handler
+
+
+def _swi(vector, mask):
+    def handler(cpu):
+        cpu.cycles += 19 if mask else 20
+        cpu.cc |= E
+        cpu.push('s', 0xFF)
+        cpu.cc |= mask
+        cpu.pc = cpu.read16(vector)
+    return handler
+
+
+def op_page2(cpu):
+    pc = cpu.pc
+    cpu.pc = (pc + 1) & 0xFFFF
+    OPS10[cpu.memory[pc]](cpu)
+
+
+def op_page3(cpu):
+    pc = cpu.pc
+    cpu.pc = (pc + 1) & 0xFFFF
+    OPS11[cpu.memory[pc]](cpu)
+
+
+def op_nop(cpu):
+    cpu.cycles += 2
+
+
+def op_sync(cpu):
+    cpu.cycles += 4
+    cpu.waiting = 'sync'
+
+
+def op_lbra(cpu):
+    cpu.cycles += 5
+    offset = cpu.fetch16()
+    cpu.pc = (cpu.pc + offset) & 0xFFFF
+
+
+def op_lbsr(cpu):
+    cpu.cycles += 9
+    offset = cpu.fetch16()
+    cpu.push('s', 0x80)
+    cpu.pc = (cpu.pc + offset) & 0xFFFF
+
+
+def op_daa(cpu):
+    cpu.cycles += 2
+    a = cpu.a
+    cc = cpu.cc
+    correction = 0
+    if cc & H or (a & 0x0F) > 9:
+        correction |= 0x06
+    if cc & C or a > 0x99 or ((a & 0xF0) > 0x80 and (a & 0x0F) > 9):
+        correction |= 0x60
+    t = a + correction
+    cpu.a = t & 0xFF
+    cpu.cc = (cc & 0xF1) | NZ8[t & 0xFF] | (t >> 8) & C
+
+
+def op_orcc(cpu):
+    cpu.cycles += 3
+    cpu.cc |= cpu.fetch()
+
+
+def op_andcc(cpu):
+    cpu.cycles += 3
+    cpu.cc &= cpu.fetch()
+
+
+def op_sex(cpu):
+    cpu.cycles += 2
+    cpu.a = 0xFF if cpu.b & 0x80 else 0
+    cpu.cc = (cpu.cc & 0xF3) | nz16(cpu.d)
+
+
+def op_exg(cpu):
+    cpu.cycles += 8
+    postbyte = cpu.fetch()
+    first, second = postbyte >> 4, postbyte & 0x0F
+    wide = (first < 8) == (second < 8)
+    value1, value2 = cpu.get(first), cpu.get(second)
+    cpu.set(first, value2, wide)
+    cpu.set(second, value1, wide)
+
+
+def op_tfr(cpu):
+    cpu.cycles += 6
+    postbyte = cpu.fetch()
+    source, dest = postbyte >> 4, postbyte & 0x0F
+    cpu.set(dest, cpu.get(source), (source < 8) == (dest < 8))
+
+
+def op_rts(cpu):
+    cpu.cycles += 5
+    cpu.pull('s', 0x80)
+
+
+def op_abx(cpu):
+    cpu.cycles += 3
+    cpu.x = (cpu.x + cpu.b) & 0xFFFF
+
+
+def op_rti(cpu):
+    cpu.cycles += 6
+    cpu.pull('s', 0x01)
+    if cpu.cc & E:
+        cpu.cycles += 9
+        cpu.pull('s', 0xFE)
+    else:
+        cpu.pull('s', 0x80)
+
+
+def op_cwai(cpu):
+    cpu.cycles += 20
+    cpu.cc = (cpu.cc & cpu.fetch()) | E
+    cpu.push('s', 0xFF)
+    cpu.waiting = 'cwai'
+
+
+def op_mul(cpu):
+    cpu.cycles += 11
+    d = cpu.a * cpu.b
+    cpu.d = d
+    cpu.cc = (cpu.cc & 0xFA) | (0 if d else Z) | (d >> 7) & C
+
+
+def _build():
+    # 0x00-0x0F, 0x40-0x7F: read-modify-write, on memory and on A and B
+    rmw = {0x0: op_neg, 0x3: op_com, 0x4: op_lsr, 0x6: op_ror, 0x7: op_asr, 0x8: op_asl,
+           0x9: op_rol, 0xA: op_dec, 0xC: op_inc, 0xD: op_tst, 0xF: op_clr}
+    for low, op in rmw.items():
+        OPS[0x00 | low] = _rmw(op, CPU.direct, 6)
+        OPS[0x40 | low] = _inherent(op, 'a')
+        OPS[0x50 | low] = _inherent(op, 'b')
+        OPS[0x60 | low] = _rmw(op, CPU.indexed, 6)
+        OPS[0x70 | low] = _rmw(op, CPU.extended, 7)
+    OPS[0x0E] = _jmp(CPU.direct, 3)
+    OPS[0x6E] = _jmp(CPU.indexed, 3)
+    OPS[0x7E] = _jmp(CPU.extended, 4)
+
+    # 0x10-0x3F: everything else
+    OPS[0x10] = op_page2
+    OPS[0x11] = op_page3
+    OPS[0x12] = op_nop
+    OPS[0x13] = op_sync
+    OPS[0x16] = op_lbra
+    OPS[0x17] = op_lbsr
+    OPS[0x19] = op_daa
+    OPS[0x1A] = op_orcc
+    OPS[0x1C] = op_andcc
+    OPS[0x1D] = op_sex
+    OPS[0x1E] = op_exg
+    OPS[0x1F] = op_tfr
+    for low, condition in enumerate(CONDITIONS):
+        OPS[0x20 | low] = _branch(condition)
+        if low:
+            OPS10[0x20 | low] = _long_branch(condition)
+    OPS[0x30] = _lea('x', True)
+    OPS[0x31] = _lea('y', True)
+    OPS[0x32] = _lea('s', False)
+    OPS[0x33] = _lea('u', False)
+    OPS[0x34] = _push('s')
+    OPS[0x35] = _pull('s')
+    OPS[0x36] = _push('u')
+    OPS[0x37] = _pull('u')
+    OPS[0x39] = op_rts
+    OPS[0x3A] = op_abx
+    OPS[0x3B] = op_rti
+    OPS[0x3C] = op_cwai
+    OPS[0x3D] = op_mul
+    OPS[0x3F] = _swi(VECTORS['SWI'], F | I)
+    OPS10[0x3F] = _swi(VECTORS['SWI2'], 0)
+    OPS11[0x3F] = _swi(VECTORS['SWI3'], 0)
+
+    # 0x80-0xFF: accumulator and 16-bit register operations, in four
+    # addressing modes: immediate, direct, indexed and extended
+    alu = {0x0: op_sub, 0x1: op_cmp, 0x2: op_sbc, 0x4: op_and, 0x5: op_bit, 0x6: op_ld,
+           0x8: op_eor, 0x9: op_adc, 0xA: op_or, 0xB: op_add}
+    for column, (mode, mode16) in enumerate(zip(MODES, MODES16)):
+        short = column == 0     # immediate: no memory access
+        for base, reg in ((0x80, 'a'), (0xC0, 'b')):
+            opcode = base | column << 4
+            for low, op in alu.items():
+                OPS[opcode | low] = _alu8(op, reg, mode, 2 if short else 4 + (column == 3))
+            if not short:
+                OPS[opcode | 0x7] = _store8(reg, mode, 4 + (column == 3))
+        opcode = 0x80 | column << 4
+        extra = column == 3
+        # (opcode low nibble, table, operation, register, cycles)
+        for low, table, op, reg, cycles in (
+                (0x3, OPS, op_sub16, 'd', 4 if short else 6),
+                (0xC, OPS, op_cmp16, 'x', 4 if short else 6),
+                (0xE, OPS, op_ld16, 'x', 3 if short else 5),
+                (0x3, OPS10, op_cmp16, 'd', 5 if short else 7),
+                (0xC, OPS10, op_cmp16, 'y', 5 if short else 7),
+                (0xE, OPS10, op_ld16, 'y', 4 if short else 6),
+                (0x3, OPS11, op_cmp16, 'u', 5 if short else 7),
+                (0xC, OPS11, op_cmp16, 's', 5 if short else 7)):
+            table[opcode | low] = _alu16(op, reg, mode16, cycles + extra)
+        opcode_b = 0xC0 | column << 4
+        for low, table, op, reg, cycles in (
+                (0x3, OPS, op_add16, 'd', 4 if short else 6),
+                (0xC, OPS, op_ld16, 'd', 3 if short else 5),
+                (0xE, OPS, op_ld16, 'u', 3 if short else 5),
+                (0xE, OPS10, op_ld16, 's', 4 if short else 6)):
+            table[opcode_b | low] = _alu16(op, reg, mode16, cycles + extra)
+        if short:
+            continue
+        OPS[opcode | 0xF] = _store16('x', mode, 5 + extra)
+        OPS10[opcode | 0xF] = _store16('y', mode, 6 + extra)
+        OPS[opcode_b | 0xD] = _store16('d', mode, 5 + extra)
+        OPS[opcode_b | 0xF] = _store16('u', mode, 5 + extra)
+        OPS10[opcode_b | 0xF] = _store16('s', mode, 6 + extra)
+        OPS[opcode | 0xD] = _jsr(mode, 7 + extra)
+
+    def bsr(cpu):
+        cpu.cycles += 7
+        offset = cpu.fetch()
+        cpu.push('s', 0x80)
+        cpu.pc = (cpu.pc + signed8(offset)) & 0xFFFF
+    OPS[0x8D] = bsr
+
+
+_build()
@@ -0,0 +1,175 @@
+"""Download one image to several boards at once, a worker process per board.
+
+    python multiflash.py FILE BOARD [BOARD ...] [--backend NAME] [--crc] [--burst] [--compress]
+
+BOARD names a profile in boards.json (see profiles.py). Each worker
+drives its own board with the usual Board transfer paths; the parent
+prints a progress line for all of them while they run, then each
+board's result and the combined throughput.
+
+Boards that would drive the same GPIO are refused before anything
+starts: two workers on one pin is a bus fight, not a parallel download.
+A board needs 16 GPIOs and a Pi has 28, so one Pi drives at most one
+real board per run; the others in the run must be emulated (like
+"emu1" and "emu2"). To flash several real boards at once, run
+multiflash on each board's own Pi.
+"""
+
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+
+import ex9
+from gpio_backend import load_backend
+import profiles
+
+PROGRESS_INTERVAL = 0.2     # seconds between progress reports from each worker
+
+
+def image_size(filename):
+    "Bytes a download of filename sends, near enough for a progress figure"
+    if filename.endswith('.b9'):
+        return os.path.getsize(filename)
+    return len(ex9.load(filename)[1])
+
+
+def worker(name, filename, options, results):
+    "Download filename to one board, reporting progress and the outcome on results"
+    profile = profiles.get(name)
+    gpio = load_backend(options.backend or profile.get('backend'), pins=profile['pins'])
+    board = profiles.make_board(gpio, name)
+    if options.crc:
+        board.block_crc = 256
+    board.burst = options.burst
+    board.compress = options.compress
+    stats = board.enable_stats()
+
+    # Sample the board's running byte count from the side, rather than
+    # adding a callback to the send loop
+    done = threading.Event()
+
+    def report():
+        while not done.wait(PROGRESS_INTERVAL):
+            results.put(('progress', name, board.bytes_sent))
+    reporter = threading.Thread(target=report, daemon=True)
+    reporter.start()
+
+    start = time.perf_counter()
+    try:
+        board.dload_exec_file(filename)
+    except Exception as e:
+        results.put(('failed', name, "%s: %s" % (type(e).__name__, e)))
+    else:
+        results.put(('done', name, {'seconds': time.perf_counter() - start,
+                                    'stats': stats.as_dict()}))
+    finally:
+        done.set()
+        reporter.join()
+        gpio.cleanup()
+
+
+def progress_line(names, sent, size, elapsed):
+    parts = ["%s %3d%%" % (name, min(100, 100 * sent[name] // size) if size else 100)
+             for name in names]
+    total = sum(min(sent[name], size) for name in names)
+    rate = total / elapsed if elapsed else 0
+    return "  ".join(parts) + "   %.0f bytes/s" % rate
+
+
+def flash(filename, names, options, out=sys.stdout):
+    """Download filename to the named boards in parallel; returns {name: result}.
+
+    Raises ValueError, before starting any worker, if two of the boards share a GPIO.
+    """
+    conflicts = profiles.pin_conflicts(names, options.backend)
+    if conflicts:
+        raise ValueError("boards can't share GPIOs (one Pi drives one real board): " + "; ".join(
+            "GPIO%d is %s" % (gpio, " and ".join("%s %s" % user for user in users))
+            for gpio, users in sorted(conflicts.items())))
+    size = image_size(filename)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker, args=(name, filename, options, results),
+                                       name=name)
+               for name in names]
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+
+    sent = dict.fromkeys(names, 0)
+    outcome = {}
+    while len(outcome) < len(names):
+        try:
+            kind, name, value = results.get(timeout=PROGRESS_INTERVAL)
+        except queue.Empty:
+            # A worker that died without reporting won't ever report
+            for process in workers:
+                if process.name not in outcome and not process.is_alive() and results.empty():
+                    outcome[process.name] = ('failed', "exit code %s" % process.exitcode)
+            continue
+        if kind == 'progress':
+            sent[name] = value
+        else:
+            outcome[name] = (kind, value)
+            if kind == 'done':
+                sent[name] = size
+        if out is not None:
+            out.write("\r" + progress_line(names, sent, size, time.perf_counter() - start))
+            out.flush()
+    elapsed = time.perf_counter() - start
+    for process in workers:
+        process.join()
+    if out is not None:
+        out.write("\n")
+        report(outcome, size, elapsed, out)
+    return outcome
+
+
+def report(outcome, size, elapsed, out=sys.stdout):
+    "Each board's result, and the combined throughput"
+    busy = 0.0
+    ok = 0
+    for name, (kind, value) in outcome.items():
+        if kind == 'done':
+            ok += 1
+            busy += value['seconds']
+            out.write("%-10s ok      %8d bytes %8.2f s %10.0f bytes/s\n" %
+                      (name, size, value['seconds'], size / value['seconds']))
+        else:
+            out.write("%-10s FAILED  %s\n" % (name, value))
+    out.write("%d of %d boards in %.2f s (%.2f s of transfers between them), %.0f bytes/s combined\n" %
+              (ok, len(outcome), elapsed, busy, ok * size / elapsed if elapsed else 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Download an image to several boards at once",
+        epilog="One Pi drives at most one real board per run: a board needs 16 of its 28 GPIOs, "
+               "and boards sharing a GPIO are refused. The other boards must be emulated "
+               "(profiles with \"backend\": \"emu\", or --backend emu).")
+    parser.add_argument('file')
+    parser.add_argument('boards', nargs='+', help="profile names from boards.json")
+    parser.add_argument('--backend', default=None, help="GPIO backend (default $BOARD_GPIO or rpi)")
+    parser.add_argument('--crc', action='store_true', help="verify by CRC per block")
+    parser.add_argument('--burst', action='store_true', help="strobe in CRC-checked windows")
+    parser.add_argument('--compress', action='store_true', help="send LZ-compressed")
+    options = parser.parse_args(argv)
+    if len(set(options.boards)) != len(options.boards):
+        parser.error("each board can only be flashed once")
+    for name in options.boards:
+        try:
+            profiles.get(name)  # fail here, not in a worker, on a misspelt board
+        except (KeyError, ValueError) as e:
+            parser.error(e.args[0])
+    try:
+        outcome = flash(options.file, options.boards, options)
+    except ValueError as e:
+        parser.error(e.args[0])
+    return 0 if all(kind == 'done' for kind, _ in outcome.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
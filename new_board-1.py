@@ -1,7 +1,20 @@
 import rp2
 import time
+import math
 from machine import Pin
 import uasyncio as asyncio
+from pio_link import PortASender, PortAReceiver, PA0_GPIO
+from sio_port import SIOPort
+import lz
+import bundle
+import ex9
+from manifest import Manifest
+import timing
+from protocol import DLOAD_EXEC, CHECKSUM, DLOAD_BULK, DLOAD_FRAMED, DLOAD_BURST, ACK, NAK
+import framed
+import burst
+from framed import ResumeLog
+from link_engine import LinkEngine
 
 #TXD = Pin(0, Pin.OUT)
 #RXD = Pin(1, Pin.IN)
@@ -27,9 +40,9 @@ CA1 = Pin(20, Pin.OUT, value=1) # set port A "data ready" output high
 #CB1 = Pin(21, Pin.OUT, value=1) # set port B "data taken" output high
 NMI = Pin(22, Pin.OUT, value=0) # set NMI low (inactive)
 LED = Pin(25, Pin.OUT)
-RST = Pin(26, Pin.OUT, value=1) # holds the 6809 in reset until set low, below
+RST = Pin(26, Pin.OUT, value=0) # high holds the 6809 in reset; left low so a warm 6809 keeps running
 
-PORTA = [PA7, PA6, PA5, PA4, PA3, PA2, PA1, PA0]
+port_a = SIOPort(PA0_GPIO)  # PA0..PA7, a byte at a time through the SIO registers
 
 
 @rp2.asm_pio()
@@ -45,70 +58,136 @@ def count_strobes():
 #sm.active(1)
 #time.sleep(0.1)  # give PIO time to start
 
+def send_transaction(buf, timeout_ms=None):
+    "Send a complete command transaction on Port A; timeout_ms, if given, overrides send_bytes' own limit"
+    try:
+        port_a.claim()  # from the PIO, if it had them
+        port_a.output() # set Port A pins to output
+        if timeout_ms is None:
+            send_bytes(buf)
+        else:
+            send_bytes(buf, timeout_ms)
+    finally:
+        port_a.input()  # release Port A pins
+        CA1.init(Pin.OUT, value=1) # take CA1 back from the PIO, if it had it
+
 def dload_exec(load_addr, data, exec_addr):
     "Download bytes and execute specified address - not necessarily within the download"
+    # Build the whole transaction as one buffer, so it can be sent in one go
+    buf = bytearray([DLOAD_EXEC])           # the download prefix byte
+    buf += load_addr.to_bytes(2, 'big')     # the destination addess
+    buf += len(data).to_bytes(2, 'big')     # the data length
+    buf += data                             # the data
+    buf += exec_addr.to_bytes(2, 'big')     # the execution address
+    send_transaction(buf)
+
+def recv_bytes(count, timeout_ms=100):
+    "Read count bytes from the 6809 on Port A, or None if they don't arrive in time"
+    in_bytes = bytearray()
+    deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+    port_a_receiver.start()
     try:
-        for pin in PORTA:
-            pin.init(Pin.OUT)    # set Port A pins to output
-        send_bytes(b'\xAA')      # send the download prefix byte
-        send_word(load_addr)     # send the destination addess
-        send_word(len(data))     # send the data length
-        send_bytes(data)         # send the data
-        send_word(exec_addr)     # send the execution address
-    except Exception as e:
-        print("Error during download/exec:", e)
+        while len(in_bytes) < count:
+            in_bytes += port_a_receiver.drain()
+            if time.ticks_diff(deadline, time.ticks_ms()) < 0:
+                return None
     finally:
-        for pin in PORTA:
-            pin.init(Pin.IN)  # release Port A pins
+        port_a_receiver.stop()
+        CA1.init(Pin.OUT, value=1) # take CA1 back from the PIO
+    return in_bytes[:count]
 
-def bus_read(port):
-    "Read the 8 bits of the specified port into a list of bits"
-    bits = 0
-    for pin in port:
-        bits = (bits << 1) | pin.value()
-    return bits
+def checksum(addr, length):
+    "Ask the 6809 for the CRC-16 of a region of its memory; None if it doesn't answer"
+    buf = bytearray([CHECKSUM])
+    buf += addr.to_bytes(2, 'big')
+    buf += length.to_bytes(2, 'big')
+    send_transaction(buf)
+    reply = recv_bytes(2)
+    if reply is None:
+        return None
+    return int.from_bytes(reply, 'big')
 
 # Send bytes with a pulse on CA1 to indicate data ready.
-# This does not wait for acknowledgement from the 6809, but has a 1ms delay
-# after sending each byte.
+# This does not wait for acknowledgement from the 6809, but holds each byte
+# for a calibrated interval (see bootstrap()) before sending the next.
 # This function is used for bootloading only, to send the second-stage bootloader
 # to the first-stage bootloader.
-def send_bytes_pulse(out_bytes):
-    "write a series of bytes to Port A, with handshaking"
-    
+BOARD_NAME = 'pico'     # key for this board's saved timing
+PULSE_US_SAFE = 1000    # the original fixed interval, known to work
+PULSE_US_MIN = 20       # never go below this, whatever we measure
+STROBE_US_MIN = 1       # burst strobes never closer than this: the gap sets the PIO clock
+pico_timing = timing.load(BOARD_NAME, {'pulse_us': PULSE_US_SAFE, 'strobe_us': PULSE_US_MIN})
+
+class StrobeTimer:
+    "Counts and timestamps the CA2 strobes the 6522 gives as the 6809 takes each byte"
+
+    def __init__(self, pin):
+        self.count = 0
+        self.last = 0
+        # The strobe is only a cycle long, so catch it with a hard IRQ
+        pin.irq(self._strobe, Pin.IRQ_FALLING, hard=True)
+
+    def _strobe(self, pin):
+        self.last = time.ticks_us()
+        self.count += 1
+
+strobe_timer = StrobeTimer(CA2)
+pulse_latencies = []    # CA1 low to CA2 strobe, in us, for bytes sent by send_bytes_pulse
+pulse_missed = 0        # bytes sent without a strobe in return
+
+def send_bytes_pulse(out_bytes, timeout_ms=None):
+    "write a series of bytes to Port A, with handshaking (timeout_ms is ignored: this never waits for the 6809)"
+    global pulse_missed
+    interval = pico_timing['pulse_us']
+    first_strobe = strobe_timer.count
+    write = port_a.write
+
     for int8 in out_bytes:
-        assert int8 < 256
-        output = [int(x) for x in '{:08b}'.format(int8)] # pythonically unpack byte to list of bits
-        for pin, val in zip(PORTA, output):
-            pin.value(val)
+        write(int8)
+        count = strobe_timer.count
+        start = time.ticks_us()
         CA1.low()   # signal data ready
-        time.sleep_ms(1)  # wait 1ms for data taken (should be much less)
+        while time.ticks_diff(time.ticks_us(), start) < interval:
+            pass    # wait for data taken (normally well within the interval)
+        if strobe_timer.count != count:
+            pulse_latencies.append(time.ticks_diff(strobe_timer.last, start))
 
         # Assume the data has been taken.
         CA1.high()  # clear data ready
 
-# Send bytes with handshake on CA1/CA2.
-# This waits for the 6809 to acknowledge each byte before sending the next.
+    pulse_missed += len(out_bytes) - (strobe_timer.count - first_strobe)
+
+# Send bytes with handshake on CA1/CA2, done in hardware by a PIO state
+# machine fed by DMA, so the whole buffer goes in one submit.
 # This function is used for general data transfer after bootloading.
-def send_bytes_handshake(out_bytes, port=PORTA, data_ready=CA1, data_taken=CA2):
-    "write a series of bytes to the specified port, with handshaking"
+SEND_TIMEOUT_MS = 1000  # longest the 6809 may take over a byte before a send gives up
+port_a_sender = PortASender(sm_id=0)
 
-    byte_count = 0
+def send_bytes_pio(out_bytes, timeout_ms=SEND_TIMEOUT_MS):
+    "write a series of bytes to Port A, with handshaking done by PIO, or raise OSError if the 6809 stops taking them"
+    port_a_sender.start()
     try:
-        for int8 in out_bytes:
-            assert int8 < 256
-            output = [int(x) for x in '{:08b}'.format(int8)] # pythonically unpack byte to list of bits
-            for pin, val in zip(port, output):
-                pin.value(val)
-            data_ready.low()   # signal data ready
-            # Wait for the 6809 to signal data taken.
-            while data_taken() != 0:
-                pass
-            data_ready.high()  # clear data ready
-            byte_count += 1
-    except KeyboardInterrupt:
-        print(f"Download/exec interrupted by user, sent {byte_count}/{len(out_bytes)} bytes")
-        raise
+        port_a_sender.send(out_bytes, timeout_ms)
+    finally:
+        port_a_sender.stop()
+
+# Send bytes as send_bytes_pio does, but give up if the 6809 doesn't take
+# them in time: for probing a 6809 that may be running something that
+# doesn't read port A (see warm_boot()).
+PROBE_TIMEOUT_MS = 50
+
+def send_bytes_probe(out_bytes, timeout_ms=PROBE_TIMEOUT_MS):
+    "write a series of bytes to Port A, with handshaking done by PIO, or raise OSError if they aren't taken"
+    port_a_sender.start()
+    try:
+        port_a_sender.submit(out_bytes)
+        deadline = time.ticks_add(time.ticks_ms(), timeout_ms)
+        while port_a_sender.busy():
+            if time.ticks_diff(deadline, time.ticks_ms()) < 0:
+                port_a_sender.dma.active(0)
+                raise OSError("6809 not taking bytes")
+    finally:
+        port_a_sender.stop()
 
 # Initially, use the pulse version for bootloading.
 send_bytes = send_bytes_pulse
@@ -119,34 +198,180 @@ def send_word(word):
 
 memtop = 0xFE00
 
-def dload_exec_file(filename, relocate=True):
+# What we've downloaded, so unchanged modules still in RAM needn't be sent again
+manifest = Manifest('manifest.json')
+
+def dload_exec_compressed(load_addr, data, exec_addr):
+    "Download bytes LZ-compressed behind a decompressor stub, which unpacks them and jumps to exec_addr"
+    start = time.ticks_ms()
+    packed = lz.compress(data)
+    image = lz.stub_image(load_addr, len(data), exec_addr, packed)
+    if len(image) >= len(data):
+        dload_exec(load_addr, data, exec_addr) # doesn't pay
+        return
+    # memtop is already the bottom of all that place() has put at the top
+    # of RAM: the second stage, the modules, and this download too if it
+    # was relocated. Below that, stage clear of the destination.
+    staging_addr = lz.staging_addr(load_addr, len(data), len(image), memtop)
+    dload_exec(staging_addr, image, staging_addr)
+    manifest.overwritten(staging_addr, len(image))
+    elapsed = time.ticks_diff(time.ticks_ms(), start)
+    print("compressed", len(data), "to", len(image), "bytes,",
+          "effective", len(data) * 1000 // max(elapsed, 1), "bytes/s")
+
+# Where interrupted framed downloads got to, so they can carry on from there
+resume_log = ResumeLog('resume.json')
+FRAME_TIMEOUT_MS = int(framed.FRAME_TIMEOUT * 1000)
+max_retries = 5
+
+def send_framed(out):
+    "Send bytes of a framed transfer; False if the 6809 stops taking them (it has dropped out)"
+    try:
+        send_transaction(out, FRAME_TIMEOUT_MS)
+    except OSError:
+        return False
+    return True
+
+def send_frame(seq, payload):
+    "Send one frame until the 6809 acknowledges it; False if it stops answering"
+    out = framed.frame(seq, payload)
+    for attempt in range(max_retries):
+        if not send_framed(out):
+            return False
+        reply = recv_bytes(3, timeout_ms=100)
+        if reply is None:
+            return False
+        if framed.acked(reply, seq):
+            return True
+    raise OSError("frame %d not acknowledged after %d attempts" % (seq, max_retries))
+
+def dload_exec_framed(load_addr, data, exec_addr, block_size=256):
+    """Download bytes as sequence-numbered, acknowledged frames, then execute (see framed.py).
+
+    Progress is counted in blocks the 6809 has acknowledged (send_frame()
+    returns True only for those). If the download is interrupted or times
+    out, the first unacknowledged block goes in the resume log, and the
+    next download of the same data starts from there.
+    """
+    transfer = framed.key(load_addr, data)
+    seq = resume_log.start(transfer, block_size)
+    blocks = (len(data) + block_size - 1) // block_size
+    if seq:
+        print("resuming at block", seq, "of", blocks)
+        time.sleep_ms(2 * FRAME_TIMEOUT_MS) # make sure the 6809 isn't mid-frame
+    restarts = 0
+    try:
+        while True:
+            if send_framed(framed.header(DLOAD_FRAMED, load_addr, len(data), block_size)):
+                while seq < blocks and send_frame(seq, data[seq * block_size:(seq + 1) * block_size]):
+                    seq += 1
+                if seq == blocks and send_frame(framed.END, exec_addr.to_bytes(2, 'big')):
+                    break
+            # The 6809 drops out of the transfer when the bytes stop,
+            # so wait for that and pick up again from the header.
+            restarts += 1
+            if restarts > max_retries:
+                raise OSError("frame %d timed out %d times" % (seq, restarts))
+            time.sleep_ms(2 * FRAME_TIMEOUT_MS)
+    except (KeyboardInterrupt, OSError):
+        print("download interrupted with", seq, "of", blocks, "blocks acknowledged")
+        resume_log.interrupted(transfer, block_size, seq)
+        raise
+    resume_log.finished(transfer)
+
+def send_strobed(out_bytes, gap_us):
+    "write bytes to Port A strobed every gap_us, not waiting for the 6809 to take them"
+    port_a_sender.start(gap_us)
+    try:
+        port_a_sender.send(out_bytes)
+    finally:
+        port_a_sender.stop()
+        CA1.init(Pin.OUT, value=1) # take CA1 back from the PIO
+
+def burst_reply(count, gap_us):
+    "The CRC of a burst window; if bytes were lost, pad until it comes. None if it never does"
+    reply = recv_bytes(2, timeout_ms=100)
+    pad = bytes([burst.PAD])
+    while reply is None and count:
+        send_strobed(pad, gap_us)
+        reply = recv_bytes(2, timeout_ms=10)
+        count -= 1
+    return reply
+
+def dload_exec_burst(load_addr, data, exec_addr):
+    "Download bytes in CRC-checked windows strobed by PIO without per-byte handshake, then execute (see burst.py)"
+    window = burst.Window(pico_timing['strobe_us'], STROBE_US_MIN, max_retries=max_retries)
+    send_transaction(burst.header(DLOAD_BURST, load_addr, len(data)))
+    offset = 0
+    while offset < len(data):
+        chunk = data[offset:offset + window.size]
+        gap_us = math.ceil(window.gap)  # whole microseconds, never below what the window asks for
+        send_transaction(len(chunk).to_bytes(2, 'big'))
+        send_strobed(chunk, gap_us)
+        good = burst.check(burst_reply(len(chunk), gap_us), chunk)
+        send_transaction(bytes([ACK if good else NAK]))
+        if good:
+            offset += len(chunk)
+            window.ok()
+            continue
+        if not window.failed():
+            raise OSError("window at %s still failing with a %d us strobe gap" %
+                          (hex(load_addr + offset), gap_us))
+    send_transaction(bytes(2) + exec_addr.to_bytes(2, 'big')) # end, then exec
+    if window.slowed:
+        pico_timing['strobe_us'] = math.ceil(window.gap)
+        timing.save(BOARD_NAME, pico_timing)
+        print("burst strobe gap raised to", pico_timing['strobe_us'], "us")
+
+def place(filename, relocate=True):
+    "Where the specified file goes: (load address, data, exec address), relocatable files just below memtop"
+    global memtop
+    load_addr, data, exec_addr = ex9.load(filename)
+    length = len(data)
+
+    if load_addr == 0 and relocate: # relocatable file, load below memtop
+        offset = memtop - length
+        memtop = offset
+        load_addr += offset
+        exec_addr += offset
+    return load_addr, data, exec_addr
+
+def dload_exec_file(filename, relocate=True, compress=False, use_manifest=True, use_framed=False,
+                    use_burst=False):
     "Download and execute the specified file"
-    with open (filename, 'rb') as f:
-        global memtop
-
-        # Get load address
-        load_addr = int.from_bytes(f.read(2), "big")
-        # Get data length
-        length = int.from_bytes(f.read(2), "big")
-        # Get data
-        data = f.read(length)
-        assert length == len(data)
-        # Get exec address
-        exec_addr = int.from_bytes(f.read(2), "big")
-
-        if load_addr == 0 and relocate: # relocatable file, load below memtop
-            offset = memtop - length
-            memtop = offset
-            load_addr += offset
-            exec_addr += offset
-
-        print (filename, "load address = ", hex(load_addr),
-               "length = ", length,
-               "exec address = ", hex(exec_addr));
-        
+    load_addr, data, exec_addr = place(filename, relocate)
+    length = len(data)
+
+    print (filename, "load address = ", hex(load_addr),
+           "length = ", length,
+           "exec address = ", hex(exec_addr));
+
+    if use_manifest and manifest.resident(filename, data, load_addr, exec_addr, checksum):
+        # Already in RAM: a zero-length download just runs it
+        print(filename, "unchanged, not downloaded")
+        dload_exec(load_addr, b'', exec_addr)
+        return
+
+    if use_burst:
+        dload_exec_burst(load_addr, data, exec_addr)
+    elif use_framed:
+        dload_exec_framed(load_addr, data, exec_addr)
+    elif compress:
+        dload_exec_compressed(load_addr, data, exec_addr)
+    else:
         dload_exec(load_addr, data, exec_addr)
 
-async def get_bytes(port=PORTA, data_ready=CA2, data_taken=CA1):
+    if use_manifest:
+        manifest.record(filename, data, load_addr, exec_addr)
+        manifest.save()
+
+def dload_bundle(filename):
+    "Download a bundle made by bundle.py (modules and target, pre-relocated) in one transaction"
+    body = bundle.load(filename)
+    print(filename, "length = ", len(body))
+    send_transaction(bytearray([DLOAD_BULK]) + body)
+
+async def get_bytes(port=port_a, data_ready=CA2, data_taken=CA1):
     "read a (non-empty) sequence of bytes from the 6809. Non-blocking coroutine."
     in_bytes = bytearray()
 
@@ -157,7 +382,7 @@ async def get_bytes(port=PORTA, data_ready=CA2, data_taken=CA1):
     # Read at least one byte (to guarantee non-empty result) and keep
     # reading bytes while data_ready remains asserted (low).
     while True:
-        int8 = bus_read(port)
+        int8 = port.read()
         data_taken.low()
         in_bytes.append(int8)
         data_taken.high()
@@ -166,30 +391,154 @@ async def get_bytes(port=PORTA, data_ready=CA2, data_taken=CA1):
             break
     return in_bytes
 
+# Receive bytes from the 6809 with the CA2/CA1 handshake done by a PIO
+# state machine, which DMAs them into a ring buffer.
+port_a_receiver = PortAReceiver(sm_id=1, size=1024)
+
+class PicoPort:
+    "Port A and NMI as LinkEngine drives them, from the second core"
+
+    def __init__(self):
+        self.held = b''     # received while a send had the port
+
+    def start(self):
+        port_a_receiver.start()
+
+    def stop(self):
+        port_a_receiver.stop()
+        CA1.init(Pin.OUT, value=1) # take CA1 back from the PIO
+
+    def receive(self):
+        data = self.held + port_a_receiver.drain()
+        self.held = b''
+        return data
+
+    def send(self, data):
+        self.held += port_a_receiver.drain()
+        self.stop()
+        try:
+            send_transaction(data)
+        finally:
+            self.start()
+
+    def pulse_nmi(self):
+        NMI(1)
+        time.sleep_ms(1)
+        NMI(0)
+
+# After bootloading, the second core runs Port A and NMI; core 0 only
+# decodes and prints, so USB output can't hold up the 6809.
+link = LinkEngine(PicoPort(), idle_us=100)
+
 async def toggle_nmi():
     "Raise NMI every 6 seconds (async task)"
     while True:
         await asyncio.sleep_ms(6000)
-        NMI(1)
-        await asyncio.sleep_ms(1)
-        NMI(0)
+        link.nmi()
 
 async def listen():
     "Wait for bytes from the 6809 and output them to the console (async task)"
 
     asyncio.create_task(toggle_nmi())
+    link.start()
+    try:
+        while True:
+            in_bytes = link.read()
+            if not in_bytes:
+                await asyncio.sleep_ms(10)  # nothing yet, let the queue fill
+                continue
+            LED.toggle()
+            try:
+                # Print the incoming bytes as UTF-8, if valid...
+                print(in_bytes.decode('utf-8'), end='')
+            except UnicodeError:
+                # ...otherwise, just print the raw bytes.
+                print(in_bytes)
+            LED.toggle()
+    finally:
+        link.stop()
 
-    while True:
-        in_bytes = await get_bytes()
-        LED.toggle()
-        try:
-            # Print the incoming bytes as UTF-8, if valid...
-            print(in_bytes.decode('utf-8'), end='')
-        except UnicodeError:
-            # ...otherwise, just print the raw bytes.
-            print(in_bytes)
-        await asyncio.sleep_ms(10)  # yield
-        LED.toggle()
+def reset_6809():
+    "Hold the 6809 in reset, then let it start the first-stage bootloader"
+    RST.high()
+    time.sleep_ms(250)  # wait 250ms for 6809 to reset
+    RST.low() # take 6809 out of reset
+    time.sleep_ms(250)  # wait 250ms for 6809 to start up
+
+def bootstrap(filename):
+    """Send the second-stage bootloader to the first stage in pulse mode.
+
+    The saved interval is tried first, then the safe one if the first
+    stage missed any bytes. The strobe latencies measured on the way set
+    the interval for next time: the worst seen, plus a margin.
+    """
+    global pulse_missed
+    load_addr, data, exec_addr = place(filename)
+    print (filename, "load address = ", hex(load_addr),
+           "length = ", len(data),
+           "exec address = ", hex(exec_addr));
+    for pulse_us in (pico_timing['pulse_us'], PULSE_US_SAFE):
+        pico_timing['pulse_us'] = pulse_us
+        pulse_latencies.clear()
+        pulse_missed = 0
+        reset_6809()
+        # The first-stage bootloader can't answer checksum queries
+        dload_exec(load_addr, data, exec_addr)
+        if not pulse_missed:
+            break
+        print("first stage missed", pulse_missed, "bytes at", pulse_us, "us per byte")
+    # Note what's there now, for warm_boot() to find next time
+    manifest.forget()
+    manifest.record(filename, data, load_addr, exec_addr)
+    manifest.save()
+    pulse_us = timing.pick(pulse_latencies, floor=PULSE_US_MIN)
+    if pulse_us is not None and not pulse_missed:
+        pico_timing['pulse_us'] = int(pulse_us)
+        timing.save(BOARD_NAME, pico_timing)
+        print("worst strobe latency", max(pulse_latencies), "us, next time",
+              pico_timing['pulse_us'], "us per byte")
+
+# A checksum request with no DLOAD_EXEC byte in it. The first stage takes
+# every byte (it strobes CA2 for each) but discards them until DLOAD_EXEC,
+# so only the second stage acts on this one, and only it answers.
+PROBE_REQUEST = bytes([CHECKSUM, 0x00, 0x00, 0x00, 0x01])
+
+def probe_second_stage():
+    "Raise OSError unless the second-stage bootloader answers a request the first stage ignores"
+    send_transaction(PROBE_REQUEST, PROBE_TIMEOUT_MS)
+    if recv_bytes(2, PROBE_TIMEOUT_MS) is None:
+        raise OSError("no answer from the second stage")
+
+def warm_boot(filename):
+    """True if the second-stage bootloader from filename is still resident and waiting for commands.
+
+    That's so when the last run left the 6809 in the second stage's
+    command loop: it stopped (or failed) before starting the target, or
+    the target returns to the second stage when done (target_returns).
+    If the manifest says a target that doesn't return was started, the
+    6809 isn't asked at all; port A is that program's now. Otherwise it
+    is probed with a request the first stage ignores (probe_second_stage),
+    in handshake mode with short timeouts: a 6809 that has been reset or
+    power-cycled is in the first stage, which takes the probe but never
+    answers. Only once the second stage has answered is it asked for the
+    CRC of where bootstrap() last put it, and one that was loaded from a
+    different file gives the wrong CRC. Any of these means bootstrap.
+    """
+    global memtop, send_bytes
+    top = memtop
+    load_addr, data, exec_addr = place(filename)
+    send_bytes = send_bytes_probe
+    try:
+        if manifest.loader_resident(filename, data, load_addr, exec_addr, probe_second_stage, checksum):
+            return True
+        if manifest.running is not None:
+            print("no warm boot:", manifest.running, "was started and doesn't return to", filename)
+    except OSError as e:
+        print("no warm boot:", e)
+    finally:
+        send_bytes = send_bytes_pulse
+    memtop = top    # bootstrap() places it again
+    return False
 
 bootloader = "boot2.ex9"
 modules = [
@@ -200,18 +549,29 @@ modules = [
     "portA.ex9"     # Port A stdout module.
 ]
 target_program = "blink7.ex9"
+target_returns = False  # True if the target ends with RTS, back to the second stage's command loop
+# The modules and target packed by "python bundle.py -o modules.b9 ...", if present
+modules_bundle = "modules.b9"
 
 # Main program starts here
 try:
     LED.on()
-    time.sleep_ms(250)  # wait 250ms for 6809 to reset
-    RST.low() # take 6809 out of reset
-    time.sleep_ms(250)  # wait 250ms for 6809 to start up
-    dload_exec_file(bootloader) # load second-stage bootloader
-    send_bytes = send_bytes_handshake # switch to handshake version after bootloading
-    for module in modules:
-        dload_exec_file(module) # load the support modules
-    dload_exec_file(target_program) # load the target program
+    if warm_boot(bootloader):
+        print(bootloader, "already running, reset and bootstrap skipped")
+    else:
+        bootstrap(bootloader) # load second-stage bootloader
+    send_bytes = send_bytes_pio # switch to handshake version after bootloading
+    if not target_returns:
+        # From here on the second stage may never get control back, so the
+        # next run mustn't look for it (see warm_boot())
+        manifest.started(target_program)
+        manifest.save()
+    try:
+        dload_bundle(modules_bundle) # everything in one go
+    except OSError:
+        for module in modules:
+            dload_exec_file(module, compress=True) # load the support modules
+        dload_exec_file(target_program, compress=True) # load the target program
     print("Download complete, listening...")
     # Run the async listener (this will block here until cancelled)
     asyncio.run(listen())
@@ -0,0 +1,180 @@
+"PIO programs and drivers for the Pico end of the 6809 link (see new_board-1.py)"
+
+try:
+    import rp2
+    from machine import Pin
+    from uctypes import addressof
+    from time import sleep_us, ticks_ms, ticks_diff
+except ImportError:
+    import pio_sim as rp2
+    from pio_sim import Pin, addressof, sleep_us, ticks_ms, ticks_diff
+
+from ring import ByteRing
+
+# Wiring of the new board
+PA0_GPIO = 12       # PA0..PA7 are GP12..GP19
+CA1_GPIO = 20       # port A "data ready" to the 6809
+CA2_GPIO = 11       # port A "data taken" from the 6809: written as 11 in the
+                    # programs below, as asm_pio runs them without this module's globals
+
+DREQ_PIO0_TX0 = 0
+DREQ_PIO0_RX0 = 4
+
+
+# Send bytes with handshake on CA1/CA2, one byte per word pulled from the
+# TX FIFO. The 6522's CA2 may be in pulse or handshake mode: the CA1 edge
+# sets it high (handshake mode) and reading ORA takes it low, so we wait
+# for both rather than risk seeing the previous byte's "data taken".
+@rp2.asm_pio(out_init=(rp2.PIO.OUT_LOW,) * 8, set_init=rp2.PIO.OUT_HIGH,
+             out_shiftdir=rp2.PIO.SHIFT_RIGHT)
+def send_handshake():
+    pull(block)                 # wait for the next byte
+    out(pins, 8)                # put it on PA0..PA7
+    set(pins, 0)                # CA1 low: signal data ready
+    wait(1, gpio, 11)           # CA2 released by the CA1 edge...
+    wait(0, gpio, 11)           # ...then pulled low when the 6809 reads the byte
+    set(pins, 1)                # CA1 high: clear data ready
+
+
+# Send bytes without handshake, for burst downloads (see burst.py): each
+# byte is strobed on CA1 and held for a fixed time set by the clock, not
+# by the 6809. BURST_CYCLES is the loop length, so the gap between strobes
+# is BURST_CYCLES / freq.
+BURST_CYCLES = 20
+
+@rp2.asm_pio(out_init=(rp2.PIO.OUT_LOW,) * 8, set_init=rp2.PIO.OUT_HIGH,
+             out_shiftdir=rp2.PIO.SHIFT_RIGHT)
+def send_burst():
+    pull(block)                 # 1 cycle, once the byte is there
+    out(pins, 8)                # 1: put it on PA0..PA7
+    set(pins, 0)    [7]         # 8: CA1 low, and hold it
+    set(pins, 1)    [9]         # 10: CA1 high, the 6522 latches on the edge
+
+
+# Receive bytes with handshake on CA2/CA1: the 6809 writing ORA takes CA2
+# low (data ready), we sample the port and pulse CA1 low (data taken),
+# which sets CA2 high again.
+@rp2.asm_pio(set_init=rp2.PIO.OUT_HIGH, in_shiftdir=rp2.PIO.SHIFT_LEFT)
+def recv_handshake():
+    wait(0, gpio, 11)           # CA2 low: data ready
+    in_(pins, 8)                # sample PA0..PA7
+    push(block)                 # stall here if the DMA falls behind
+    set(pins, 0)                # CA1 low: signal data taken
+    wait(1, gpio, 11)           # the CA1 edge clears data ready
+    set(pins, 1)                # CA1 high: clear data taken
+
+
+class PortASender:
+    "Port A transmitter: DMA feeds a buffer to a state machine running send_handshake"
+
+    def __init__(self, sm_id=0, freq=10_000_000):
+        self.sm_id = sm_id
+        self.freq = freq
+        self.sm = rp2.StateMachine(sm_id)
+        self.dma = rp2.DMA()
+        self.ca1 = Pin(CA1_GPIO)
+        self.gap_us = None
+
+    def start(self, gap_us=None):
+        """Take over PA0..PA7 and CA1 as outputs.
+
+        With gap_us, send in burst mode: a strobe every gap_us
+        microseconds, without waiting for the 6809 to take each byte.
+        """
+        self.gap_us = gap_us
+        if gap_us is None:
+            self.sm.init(send_handshake, freq=self.freq,
+                         out_base=Pin(PA0_GPIO), set_base=self.ca1)
+        else:
+            self.sm.init(send_burst, freq=BURST_CYCLES * 1_000_000 // gap_us,
+                         out_base=Pin(PA0_GPIO), set_base=self.ca1)
+        self.sm.active(1)
+
+    def stop(self):
+        "Stop the state machine and return PA0..PA7 to inputs"
+        self.sm.active(0)
+        self.sm.exec("mov(osr, null)")
+        self.sm.exec("out(pindirs, 8)")
+
+    def submit(self, buf):
+        "Start sending buf in the background"
+        ctrl = self.dma.pack_ctrl(size=0, inc_write=False,
+                                  treq_sel=DREQ_PIO0_TX0 + self.sm_id)
+        self.dma.config(read=buf, write=self.sm, count=len(buf), ctrl=ctrl, trigger=True)
+
+    def busy(self):
+        "True until every submitted byte has been taken by the 6809"
+        return self.dma.active() or self.sm.tx_fifo() or self.ca1.value() == 0
+
+    def pending(self):
+        "Bytes submitted but not yet taken"
+        return self.dma.count + self.sm.tx_fifo() + (self.ca1.value() == 0)
+
+    def send(self, buf, timeout_ms=None):
+        """Send buf and wait for the last byte to be taken.
+
+        With timeout_ms, give up with OSError if the 6809 takes no byte
+        for that long, rather than wait for a stalled target for ever.
+        """
+        self.submit(buf)
+        try:
+            pending = len(buf)
+            progress = ticks_ms()
+            while self.busy():
+                if timeout_ms is None:
+                    continue
+                left = self.pending()
+                if left != pending:
+                    pending = left
+                    progress = ticks_ms()
+                elif ticks_diff(ticks_ms(), progress) > timeout_ms:
+                    self.dma.active(0)
+                    raise OSError("6809 stopped taking bytes: sent %d/%d" % (len(buf) - left, len(buf)))
+            if self.gap_us is not None:
+                sleep_us(self.gap_us) # let the last strobe finish
+        except KeyboardInterrupt:
+            sent = len(buf) - self.pending()
+            self.dma.active(0)
+            print(f"Download/exec interrupted by user, sent {sent}/{len(buf)} bytes")
+            raise
+
+
+class PortAReceiver:
+    "Port A receiver: recv_handshake streams bytes by DMA into a ring buffer"
+
+    # The DMA transfer count is set once, at start, and the ring wraps
+    # under it; at 2**32 bytes it would need re-arming.
+    COUNT = 0xFFFFFFFF
+
+    def __init__(self, sm_id=1, size=1024, freq=10_000_000):
+        self.sm_id = sm_id
+        self.freq = freq
+        self.sm = rp2.StateMachine(sm_id)
+        self.dma = rp2.DMA()
+        self.ca1 = Pin(CA1_GPIO)
+        # The DMA ring wraps on the low address bits, so the buffer must
+        # be aligned to its size; over-allocate and use the aligned part.
+        self.raw = bytearray(2 * size)
+        offset = -addressof(self.raw) & (size - 1)
+        self.ring = ByteRing(size, memoryview(self.raw)[offset:offset + size])
+        self.ring_bits = size.bit_length() - 1
+
+    def start(self):
+        "Take over CA1 and start capturing"
+        ctrl = self.dma.pack_ctrl(size=0, inc_read=False, inc_write=True,
+                                  ring_size=self.ring_bits, ring_sel=True,
+                                  treq_sel=DREQ_PIO0_RX0 + self.sm_id)
+        self.dma.config(read=self.sm, write=self.ring.buf, count=self.COUNT,
+                        ctrl=ctrl, trigger=True)
+        self.ring.head = self.ring.tail = 0
+        self.sm.init(recv_handshake, freq=self.freq,
+                     in_base=Pin(PA0_GPIO), set_base=self.ca1)
+        self.sm.active(1)
+
+    def stop(self):
+        self.sm.active(0)
+        self.dma.active(0)
+
+    def drain(self):
+        "Everything received since the last drain (possibly empty)"
+        return self.ring.drain(self.COUNT - self.dma.count)
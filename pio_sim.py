@@ -0,0 +1,795 @@
+"""Host-side stand-in for MicroPython's rp2 module.
+
+Provides asm_pio, PIO, StateMachine and DMA with the same calling
+conventions as on the Pico, backed by a cycle-stepped simulation of the
+state machines, the GPIO pins and any simulated devices wired to them.
+Time only passes when the host polls the hardware (FIFO levels, DMA
+status, pin reads) or calls run(), so code written for the Pico runs
+unchanged against it. Modules that need rp2 do:
+
+    try:
+        import rp2
+    except ImportError:
+        import pio_sim as rp2
+"""
+
+from collections import deque
+
+NUM_PINS = 30
+POLL_CYCLES = 8     # simulated cycles that pass each time the host polls the hardware
+
+
+class PIO:
+    IN_LOW = 0
+    IN_HIGH = 1
+    OUT_LOW = 2
+    OUT_HIGH = 3
+    SHIFT_LEFT = 0
+    SHIFT_RIGHT = 1
+    JOIN_NONE = 0
+    JOIN_TX = 1
+    JOIN_RX = 2
+
+
+# DREQ numbers for DMA transfers paced by the PIO FIFOs
+DREQ_PIO0_TX0 = 0
+DREQ_PIO0_RX0 = 4
+DREQ_PIO1_TX0 = 8
+DREQ_PIO1_RX0 = 12
+
+
+class PIOASMError(Exception):
+    pass
+
+
+# Assembler
+
+class _Operand:
+    def __init__(self, name, value=None):
+        self.name = name
+        self.value = value
+
+    def __repr__(self):
+        return self.name
+
+
+class _Instr:
+    def __init__(self, op, *args):
+        self.op = op
+        self.args = args
+        self.delay = 0
+        self.sideset = None
+
+    def __getitem__(self, delay):
+        self.delay = delay
+        return self
+
+    def side(self, value):
+        self.sideset = value
+        return self
+
+    def __repr__(self):
+        return "%s%r" % (self.op, self.args)
+
+
+def rel(index):
+    return _Operand('rel', index)
+
+
+def invert(operand):
+    return _Operand('invert', operand)
+
+
+def reverse(operand):
+    return _Operand('reverse', operand)
+
+
+_OPERANDS = ['pins', 'x', 'y', 'null', 'pindirs', 'pc', 'isr', 'osr', 'exec',
+             'status', 'block', 'noblock', 'iffull', 'ifempty', 'clear',
+             'gpio', 'pin', 'not_x', 'x_dec', 'not_y', 'y_dec', 'x_not_y',
+             'not_osre']
+
+
+def _namespace(program):
+    ns = {name: _Operand(name) for name in _OPERANDS}
+    ns['rel'] = rel
+    ns['invert'] = invert
+    ns['reverse'] = reverse
+
+    def emit(op):
+        def instr(*args):
+            instruction = _Instr(op, *args)
+            if program is not None:
+                program.instrs.append(instruction)
+            return instruction
+        return instr
+
+    for op in ('jmp', 'wait', 'in_', 'out', 'push', 'pull', 'mov', 'irq', 'set', 'nop'):
+        ns[op] = emit(op)
+
+    def label(name):
+        program.labels[name] = len(program.instrs)
+
+    def wrap_target():
+        program.wrap_target = len(program.instrs)
+
+    def wrap():
+        program.wrap = len(program.instrs) - 1
+
+    ns['label'] = label
+    ns['wrap_target'] = wrap_target
+    ns['wrap'] = wrap
+    # irq is both an instruction and the source operand of wait()
+    ns['irq'].name = 'irq'
+    return ns
+
+
+class Program:
+    "An assembled PIO program and the configuration given to asm_pio"
+
+    def __init__(self, name, config):
+        self.name = name
+        self.config = config
+        self.instrs = []
+        self.labels = {}
+        self.wrap_target = 0
+        self.wrap = None
+
+
+def asm_pio(**config):
+    "Decorator that assembles a PIO program written in MicroPython's rp2 syntax"
+    def assemble(func):
+        program = Program(func.__name__, config)
+        # As rp2 does, run the body with the PIO namespace in place of the
+        # module's globals, so a program that uses a module name fails here
+        # with the NameError it would get on the Pico
+        saved = func.__globals__.copy()
+        func.__globals__.clear()
+        func.__globals__.update(_namespace(program))
+        try:
+            func()
+        finally:
+            func.__globals__.clear()
+            func.__globals__.update(saved)
+        if program.wrap is None:
+            program.wrap = len(program.instrs) - 1
+        if len(program.instrs) > 32:
+            raise PIOASMError("program too long")
+        return program
+    return assemble
+
+
+# Pins
+
+class PinBank:
+    "Levels of the GPIO pads, as driven by SIO, the PIO state machines and external devices"
+
+    def __init__(self):
+        self.func = ['sio'] * NUM_PINS
+        self.sio_out = [0] * NUM_PINS
+        self.sio_oe = [False] * NUM_PINS
+        self.pio_out = [0] * NUM_PINS
+        self.pio_oe = [False] * NUM_PINS
+        self.ext = [None] * NUM_PINS     # level driven from outside the Pico, if any
+
+    def read(self, n):
+        if self.func[n] == 'pio':
+            if self.pio_oe[n]:
+                return self.pio_out[n]
+        elif self.sio_oe[n]:
+            return self.sio_out[n]
+        if self.ext[n] is not None:
+            return self.ext[n]
+        return 1    # pulled up
+
+    def drive(self, n, value):
+        "Drive a pin from an external device, or release it with None"
+        self.ext[n] = value
+
+
+class Pin:
+    "Enough of machine.Pin for the link code, on the simulated pin bank"
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.init(mode, pull, value)
+
+    def init(self, mode=-1, pull=-1, value=None):
+        bank = sim.bank
+        if mode != -1:
+            bank.func[self.id] = 'sio'
+            bank.sio_oe[self.id] = mode == Pin.OUT
+        if value is not None:
+            bank.sio_out[self.id] = 1 if value else 0
+
+    def value(self, value=None):
+        if value is None:
+            sim.poll()
+            return sim.bank.read(self.id)
+        sim.bank.sio_out[self.id] = 1 if value else 0
+
+    __call__ = value
+
+    def low(self):
+        self.value(0)
+
+    def high(self):
+        self.value(1)
+
+    on = high
+    off = low
+
+    def toggle(self):
+        self.value(1 - sim.bank.sio_out[self.id])
+
+
+def _pin_id(pin):
+    if pin is None or isinstance(pin, int):
+        return pin
+    return pin.id
+
+
+# State machines
+
+class StateMachine:
+    "Cycle-stepped model of one PIO state machine"
+
+    def __init__(self, id, program=None, freq=125_000_000, **kwargs):
+        self.id = id
+        self.running = False
+        self.handler = None
+        if program is not None:
+            self.init(program, freq, **kwargs)
+        if self not in sim.machines:
+            sim.machines.append(self)
+
+    def init(self, program, freq=125_000_000, *, in_base=None, out_base=None,
+             set_base=None, jmp_pin=None, sideset_base=None,
+             in_shiftdir=None, out_shiftdir=None, push_thresh=None, pull_thresh=None):
+        config = program.config
+        self.program = program
+        self.freq = freq
+        self.in_base = _pin_id(in_base)
+        self.out_base = _pin_id(out_base)
+        self.set_base = _pin_id(set_base)
+        self.jmp_pin = _pin_id(jmp_pin)
+        self.sideset_base = _pin_id(sideset_base)
+        self.in_shiftdir = config.get('in_shiftdir', PIO.SHIFT_LEFT) if in_shiftdir is None else in_shiftdir
+        self.out_shiftdir = config.get('out_shiftdir', PIO.SHIFT_RIGHT) if out_shiftdir is None else out_shiftdir
+        join = config.get('fifo_join', PIO.JOIN_NONE)
+        self.tx_depth = 8 if join == PIO.JOIN_TX else 0 if join == PIO.JOIN_RX else 4
+        self.rx_depth = 8 if join == PIO.JOIN_RX else 0 if join == PIO.JOIN_TX else 4
+        self.out_count = self._init_pins(self.out_base, config.get('out_init'), 32)
+        self.set_count = self._init_pins(self.set_base, config.get('set_init'), 5)
+        self.sideset_count = self._init_pins(self.sideset_base, config.get('sideset_init'), 0)
+        self.restart()
+        sim.freq = freq
+
+    def _init_pins(self, base, init, default):
+        if init is None:
+            return default
+        if not isinstance(init, tuple):
+            init = (init,)
+        bank = sim.bank
+        for i, mode in enumerate(init):
+            n = base + i
+            bank.func[n] = 'pio'
+            bank.pio_oe[n] = mode in (PIO.OUT_LOW, PIO.OUT_HIGH)
+            bank.pio_out[n] = 1 if mode in (PIO.OUT_HIGH, PIO.IN_HIGH) else 0
+        return len(init)
+
+    def restart(self):
+        self.pc = 0
+        self.x = 0
+        self.y = 0
+        self.isr = 0
+        self.isr_count = 0
+        self.osr = 0
+        self.osr_count = 32     # output shift register starts empty
+        self.delay = 0
+        self.tx = deque()
+        self.rx = deque()
+        self.stalled = False
+
+    def active(self, value=None):
+        if value is None:
+            return self.running
+        self.running = bool(value)
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        self.handler = handler
+
+    def put(self, value, shift=0):
+        values = [value] if isinstance(value, int) else value
+        for word in values:
+            while len(self.tx) >= self.tx_depth:
+                sim.run(1)
+            self.tx.append((word << shift) & 0xFFFFFFFF)
+
+    def get(self, buf=None, shift=0):
+        if buf is None:
+            while not self.rx:
+                sim.run(1)
+            return self.rx.popleft() >> shift
+        for i in range(len(buf)):
+            while not self.rx:
+                sim.run(1)
+            buf[i] = self.rx.popleft() >> shift
+
+    def tx_fifo(self):
+        sim.poll()
+        return len(self.tx)
+
+    def rx_fifo(self):
+        sim.poll()
+        return len(self.rx)
+
+    def exec(self, instr):
+        if isinstance(instr, str):
+            instr = eval(instr, _namespace(None))
+        self._execute(instr, immediate=True)
+
+    # Execution
+
+    def step(self):
+        if self.delay:
+            self.delay -= 1
+            return
+        instr = self.program.instrs[self.pc]
+        if instr.sideset is not None:
+            self._write_pins(self.sideset_base, self.sideset_count, instr.sideset)
+        self._execute(instr)
+
+    def _advance(self):
+        if self.pc == self.program.wrap:
+            self.pc = self.program.wrap_target
+        else:
+            self.pc += 1
+
+    def _jump(self, target):
+        if isinstance(target, str):
+            target = self.program.labels[target]
+        self.pc = target
+
+    def _write_pins(self, base, count, value, dirs=False):
+        bank = sim.bank
+        for i in range(count):
+            n = (base + i) % 32
+            if n >= NUM_PINS:
+                continue
+            bit = (value >> i) & 1
+            if dirs:
+                bank.pio_oe[n] = bool(bit)
+            else:
+                bank.pio_out[n] = bit
+
+    def _read_pins(self):
+        bank = sim.bank
+        value = 0
+        for i in range(32):
+            n = (self.in_base + i) % 32
+            if n < NUM_PINS:
+                value |= bank.read(n) << i
+        return value
+
+    def _source(self, src):
+        if src.name == 'invert':
+            return ~self._source(src.value) & 0xFFFFFFFF
+        if src.name == 'reverse':
+            return int('{:032b}'.format(self._source(src.value))[::-1], 2)
+        name = src.name
+        if name == 'pins':
+            return self._read_pins()
+        if name == 'x':
+            return self.x
+        if name == 'y':
+            return self.y
+        if name == 'null':
+            return 0
+        if name == 'isr':
+            return self.isr
+        if name == 'osr':
+            return self.osr
+        if name == 'status':
+            return 0xFFFFFFFF if len(self.tx) < 1 else 0
+        raise PIOASMError("bad source %r" % src)
+
+    def _destination(self, dest, value, bits):
+        name = dest.name
+        if name == 'pins':
+            self._write_pins(self.out_base, min(bits, self.out_count), value)
+        elif name == 'pindirs':
+            self._write_pins(self.out_base, min(bits, self.out_count), value, dirs=True)
+        elif name == 'x':
+            self.x = value
+        elif name == 'y':
+            self.y = value
+        elif name == 'null':
+            pass
+        elif name == 'pc':
+            self.pc = value
+            return True
+        elif name == 'isr':
+            self.isr = value
+            self.isr_count = bits if bits < 32 else 0
+        elif name == 'osr':
+            self.osr = value
+            self.osr_count = 0
+        elif name == 'exec':
+            self._execute(self._decode_exec(value), immediate=True)
+        else:
+            raise PIOASMError("bad destination %r" % dest)
+        return False
+
+    def _decode_exec(self, value):
+        raise PIOASMError("executing encoded instructions is not simulated")
+
+    def _execute(self, instr, immediate=False):
+        "Execute one instruction; a stalled instruction leaves the pc where it is"
+        op = instr.op
+        args = instr.args
+        jumped = False
+        stall = False
+
+        if op == 'jmp':
+            if len(args) == 1:
+                cond, target = None, args[0]
+            else:
+                cond, target = args
+            take = True
+            if cond is not None:
+                name = cond.name
+                if name == 'not_x':
+                    take = self.x == 0
+                elif name == 'x_dec':
+                    take = self.x != 0
+                    self.x = (self.x - 1) & 0xFFFFFFFF
+                elif name == 'not_y':
+                    take = self.y == 0
+                elif name == 'y_dec':
+                    take = self.y != 0
+                    self.y = (self.y - 1) & 0xFFFFFFFF
+                elif name == 'x_not_y':
+                    take = self.x != self.y
+                elif name == 'pin':
+                    take = sim.bank.read(self.jmp_pin) == 1
+                elif name == 'not_osre':
+                    take = self.osr_count < 32
+            if take:
+                self._jump(target)
+                jumped = True
+
+        elif op == 'wait':
+            polarity, src, index = args
+            if src.name == 'gpio':
+                stall = sim.bank.read(index) != polarity
+            elif src.name == 'pin':
+                stall = sim.bank.read((self.in_base + index) % 32) != polarity
+            else:   # irq
+                flag = self._irq_index(index)
+                stall = sim.irq_flags[flag] != polarity
+                if not stall and polarity == 1:
+                    sim.irq_flags[flag] = 0
+
+        elif op == 'in_':
+            src, bits = args
+            data = self._source(src) & ((1 << bits) - 1 if bits < 32 else 0xFFFFFFFF)
+            if self.in_shiftdir == PIO.SHIFT_LEFT:
+                self.isr = ((self.isr << bits) | data) & 0xFFFFFFFF
+            else:
+                self.isr = ((self.isr >> bits) | (data << (32 - bits))) & 0xFFFFFFFF
+            self.isr_count = min(32, self.isr_count + bits)
+
+        elif op == 'out':
+            dest, bits = args
+            mask = (1 << bits) - 1 if bits < 32 else 0xFFFFFFFF
+            if self.out_shiftdir == PIO.SHIFT_RIGHT:
+                data = self.osr & mask
+                self.osr = self.osr >> bits if bits < 32 else 0
+            else:
+                data = (self.osr >> (32 - bits)) & mask
+                self.osr = (self.osr << bits) & 0xFFFFFFFF
+            self.osr_count = min(32, self.osr_count + bits)
+            jumped = self._destination(dest, data, bits)
+
+        elif op == 'push':
+            names = [arg.name for arg in args]
+            if 'iffull' in names and self.isr_count < 32:
+                pass
+            elif len(self.rx) >= self.rx_depth:
+                stall = 'noblock' not in names
+                if not stall:
+                    self.isr = 0
+                    self.isr_count = 0
+            else:
+                self.rx.append(self.isr)
+                self.isr = 0
+                self.isr_count = 0
+
+        elif op == 'pull':
+            names = [arg.name for arg in args]
+            if 'ifempty' in names and self.osr_count < 32:
+                pass
+            elif not self.tx:
+                stall = 'noblock' not in names
+                if not stall:
+                    self.osr = self.x
+                    self.osr_count = 0
+            else:
+                self.osr = self.tx.popleft()
+                self.osr_count = 0
+
+        elif op == 'mov':
+            dest, src = args
+            value = self._source(src)
+            jumped = self._destination(dest, value, 32)
+
+        elif op == 'irq':
+            names = [arg.name for arg in args if isinstance(arg, _Operand) and arg.name != 'rel']
+            index = [arg for arg in args if not (isinstance(arg, _Operand) and arg.name != 'rel')][0]
+            flag = self._irq_index(index)
+            if 'clear' in names:
+                sim.irq_flags[flag] = 0
+            else:
+                if not self.stalled:
+                    sim.raise_irq(flag)
+                stall = 'block' in names and sim.irq_flags[flag]
+
+        elif op == 'set':
+            dest, value = args
+            if dest.name == 'pins':
+                self._write_pins(self.set_base, self.set_count, value)
+            elif dest.name == 'pindirs':
+                self._write_pins(self.set_base, self.set_count, value, dirs=True)
+            elif dest.name == 'x':
+                self.x = value
+            elif dest.name == 'y':
+                self.y = value
+
+        elif op == 'nop':
+            pass
+
+        else:
+            raise PIOASMError("unknown instruction %s" % op)
+
+        self.stalled = stall
+        if immediate or stall:
+            return
+        if not jumped:
+            self._advance()
+        self.delay = instr.delay
+
+    def _irq_index(self, index):
+        if isinstance(index, _Operand):     # rel(n)
+            return (index.value & 4) | ((index.value + self.id) & 3)
+        return index
+
+
+# DMA
+
+def addressof(buf):
+    "Simulated bus address of a buffer, aligned to 64 KiB so any ring size fits"
+    return sim.address(buf)
+
+
+class DMA:
+    "One DMA channel, paced by a state machine FIFO"
+
+    def __init__(self):
+        self.count = 0          # transfers remaining
+        self.enabled = False
+        self.ctrl = {}
+        self._read = self._write = None
+        self._read_pos = self._write_pos = 0
+        self._count = 0
+        sim.dmas.append(self)
+
+    def pack_ctrl(self, default=None, **kwargs):
+        ctrl = dict(default or {})
+        ctrl.update(kwargs)
+        return ctrl
+
+    def config(self, read=None, write=None, count=None, ctrl=None, trigger=False):
+        if read is not None:
+            self._read = read
+            self._read_pos = 0
+        if write is not None:
+            self._write = write
+            self._write_pos = 0
+        if count is not None:
+            self._count = count
+        if ctrl is not None:
+            self.ctrl = ctrl
+        self.enabled = False
+        if trigger:
+            self.active(1)
+
+    def active(self, value=None):
+        if value is None:
+            sim.poll()
+            return self.enabled and self.count > 0
+        self.enabled = bool(value)
+        if self.enabled:
+            self.count = self._count
+
+    @property
+    def write(self):
+        if isinstance(self._write, StateMachine):
+            return 0
+        return sim.address(self._write) + self._write_pos
+
+    @property
+    def read(self):
+        if isinstance(self._read, StateMachine):
+            return 0
+        return sim.address(self._read) + self._read_pos
+
+    def service(self):
+        "Move at most one item, if the pacing FIFO allows it"
+        if not self.enabled or self.count <= 0:
+            return
+        src = self._read
+        dst = self._write
+        ctrl = self.ctrl
+        if isinstance(dst, StateMachine):
+            if len(dst.tx) >= dst.tx_depth:
+                return
+            dst.tx.append(src[self._read_pos])
+            if ctrl.get('inc_read', True):
+                self._read_pos += 1
+        elif isinstance(src, StateMachine):
+            if not src.rx:
+                return
+            word = src.rx.popleft()
+            dst[self._write_pos] = word & 0xFF if ctrl.get('size', 2) == 0 else word
+            if ctrl.get('inc_write', True):
+                self._write_pos += 1
+                if ctrl.get('ring_size') and ctrl.get('ring_sel'):
+                    self._write_pos &= (1 << ctrl['ring_size']) - 1
+        else:
+            return
+        self.count -= 1
+
+    def close(self):
+        if self in sim.dmas:
+            sim.dmas.remove(self)
+
+
+# Simulator
+
+class Simulator:
+    "The shared simulated hardware: pins, state machines, DMA channels and devices"
+
+    def __init__(self):
+        self.bank = PinBank()
+        self.machines = []
+        self.dmas = []
+        self.devices = []
+        self.irq_flags = [0] * 8
+        self.cycle = 0
+        self.freq = 125_000_000
+        self.addresses = {}
+
+    def address(self, buf):
+        key = id(buf)
+        if key not in self.addresses:
+            self.addresses[key] = 0x20000000 + 0x10000 * len(self.addresses)
+        return self.addresses[key]
+
+    def raise_irq(self, flag):
+        self.irq_flags[flag] = 1
+        if flag < 4:
+            for sm in self.machines:
+                if sm.handler is not None and (sm.id & 3) == flag:
+                    self.irq_flags[flag] = 0
+                    sm.handler(sm)
+
+    def run(self, cycles):
+        for _ in range(cycles):
+            for dma in self.dmas:
+                dma.service()
+            for sm in self.machines:
+                if sm.running:
+                    sm.step()
+            for device in self.devices:
+                device.tick(self)
+            self.cycle += 1
+
+    def run_until(self, condition, limit=1_000_000):
+        "Run until condition() is true; returns False if limit cycles pass first"
+        for _ in range(limit):
+            if condition():
+                return True
+            self.run(1)
+        return condition()
+
+    def poll(self):
+        self.run(POLL_CYCLES)
+
+
+sim = Simulator()
+
+
+def sleep_us(us):
+    "time.sleep_us, in simulated time"
+    sim.run(us * sim.freq // 1_000_000)
+
+
+def ticks_ms():
+    "time.ticks_ms, in simulated time"
+    return sim.cycle * 1000 // sim.freq
+
+
+def ticks_diff(new, old):
+    return new - old
+
+
+def reset():
+    "Start again with fresh simulated hardware"
+    global sim
+    sim = Simulator()
+    return sim
+
+
+class SimVIAPortA:
+    """The 6809's 6522 port A as seen from the Pico, with CA1/CA2 in handshake mode.
+
+    Bytes the Pico sends are collected in received; bytes given to send()
+    are presented to the Pico with CA2 as data ready and CA1 as data taken.
+    latency is the number of cycles the 6809 takes to respond to each edge.
+    """
+
+    def __init__(self, port_base=12, ca1=20, ca2=11, latency=20):
+        self.port_base = port_base
+        self.ca1 = ca1
+        self.ca2 = ca2
+        self.latency = latency
+        self.received = bytearray()
+        self.outgoing = deque()
+        self.prev_ca1 = 1
+        self.due = None         # cycle at which the pending action happens
+        self.sending = False
+        sim.bank.drive(ca2, 1)
+        sim.devices.append(self)
+
+    def send(self, data):
+        self.outgoing.extend(data)
+
+    def tick(self, sim):
+        bank = sim.bank
+        ca1 = bank.read(self.ca1)
+        falling = self.prev_ca1 == 1 and ca1 == 0
+        self.prev_ca1 = ca1
+
+        if falling:
+            # An active CA1 edge sets CA2 high in handshake mode
+            bank.drive(self.ca2, 1)
+            self.due = sim.cycle + self.latency
+
+        if self.due is not None and sim.cycle >= self.due:
+            self.due = None
+            if self.sending:
+                # Pico has taken our byte; release the port
+                self.sending = False
+                for i in range(8):
+                    bank.drive(self.port_base + i, None)
+            else:
+                # Read ORA: take the byte and pull CA2 low (data taken)
+                value = 0
+                for i in range(8):
+                    value |= bank.read(self.port_base + i) << i
+                self.received.append(value)
+                bank.drive(self.ca2, 0)
+                return
+
+        if not self.sending and self.due is None and self.outgoing:
+            # Write ORA: present the next byte and pull CA2 low (data ready)
+            value = self.outgoing.popleft()
+            for i in range(8):
+                bank.drive(self.port_base + i, (value >> i) & 1)
+            bank.drive(self.ca2, 0)
+            self.sending = True
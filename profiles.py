@@ -0,0 +1,79 @@
+"""Board profiles: pin map, chip selects and handshake polarity per board, from boards.json.
+
+Each profile names its pins in the same terms as board.BCM_PINS (chip
+selects CS_portA, CS_portB, CS_handshake and optionally CS_x_axis and
+CS_y_axis; an optional RST line), gives the numbering they're in ("BCM"
+or "BOARD") and whether the 6522 handshakes are "active-low" or
+"active-high". A board missing from the file falls back to the built-in
+profile of the same name, so "board" works with no boards.json at all.
+
+A profile may also name its GPIO "backend" (see gpio_backend.load_backend),
+used unless one is given explicitly. Boards on a real backend share this
+Pi's one GPIO block, so boards driven at the same time must not share a
+pin; pin_conflicts() finds any that do. Emulated boards ("sim" or "emu")
+each have pins of their own.
+"""
+
+import json
+
+from board import Board, BCM_PINS
+from gpio_backend import EMULATED, backend_name
+
+PATH = 'boards.json'
+
+BUILTIN = {
+    'board': {'numbering': 'BCM', 'handshake': 'active-low', 'pins': BCM_PINS},
+}
+
+
+def load(path=PATH):
+    "All the profiles, by board name"
+    profiles = dict(BUILTIN)
+    try:
+        with open(path) as f:
+            profiles.update(json.load(f))
+    except OSError:
+        pass
+    return profiles
+
+
+def get(name, path=PATH):
+    "One board's profile"
+    profiles = load(path)
+    if name not in profiles:
+        raise KeyError("no profile for board %r in %s" % (name, path))
+    profile = profiles[name]
+    if profile.get('handshake', 'active-low') not in ('active-low', 'active-high'):
+        raise ValueError("board %r: handshake must be active-low or active-high" % name)
+    return profile
+
+
+def bcm_pins(profile):
+    "A profile's pins in Broadcom GPIO numbering, by name"
+    if profile.get('numbering', 'BCM') != 'BOARD':
+        return dict(profile['pins'])
+    from gpiomem import BOARD_TO_BCM
+    return {role: BOARD_TO_BCM[pin] for role, pin in profile['pins'].items()}
+
+
+def pin_conflicts(names, backend=None, path=PATH):
+    """GPIOs that more than one of the named boards would drive, as {gpio: [(board, pin name), ...]}.
+
+    backend, if given, overrides the profiles' own, as it does for load_backend().
+    """
+    users = {}
+    for name in names:
+        profile = get(name, path)
+        if backend_name(backend or profile.get('backend')) in EMULATED:
+            continue
+        for role, gpio in bcm_pins(profile).items():
+            users.setdefault(gpio, []).append((name, role))
+    return {gpio: boards for gpio, boards in users.items() if len(boards) > 1}
+
+
+def make_board(gpio, name, path=PATH, **kwargs):
+    "A Board for the named profile, on gpio"
+    profile = get(name, path)
+    mode = gpio.BOARD if profile.get('numbering', 'BCM') == 'BOARD' else gpio.BCM
+    return Board(gpio, profile['pins'], mode=mode, name=name,
+                 active_low=profile.get('handshake', 'active-low') == 'active-low', **kwargs)
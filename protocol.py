@@ -0,0 +1,39 @@
+"Command bytes and checksums of the host to 6809 bootloader protocol (runs under MicroPython too)"
+
+# Commands, sent as the first byte of a transaction on port A
+DLOAD_EXEC = 0xAA   # load address, length, data, exec address
+DLOAD_CRC = 0xAB    # load address, length, block size, then per block:
+                    #   host sends the block, target answers its CRC-16 on port B,
+                    #   host sends ACK to go on or NAK to send the block again;
+                    # then exec address
+CHECKSUM = 0xAC     # address, length; target answers the region's CRC-16
+DLOAD_BULK = 0xAD   # region count, then address, length, data for each region;
+                    # then one exec address (see bundle.py)
+DLOAD_FRAMED = 0xAE # load address, length, block size, then sequence-numbered
+                    # frames, each acknowledged on port B (see framed.py)
+DLOAD_BURST = 0xAF  # load address, length, then windows strobed without
+                    # per-byte handshake, each checked by CRC-16 (see burst.py)
+
+# Replies
+ACK = 0x06
+NAK = 0x15
+
+
+def _crc16_table():
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+CRC16_TABLE = _crc16_table()
+
+
+def crc16(data, crc=0xFFFF):
+    "CRC-16/CCITT-FALSE (poly 0x1021, init 0xFFFF), as computed by the 6809 side"
+    table = CRC16_TABLE
+    for int8 in data:
+        crc = ((crc << 8) & 0xFF00) ^ table[(crc >> 8) ^ int8]
+    return crc
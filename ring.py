@@ -0,0 +1,164 @@
+"Circular buffers shared by the link code (plain Python, runs under MicroPython too)"
+
+from array import array
+
+
+class ByteRing:
+    """Circular byte buffer with one producer and one consumer.
+
+    Positions are running totals of bytes written and read, so they never
+    wrap and an overrun is just the producer getting more than size ahead.
+    The producer is either Python code calling write(), or hardware (DMA)
+    whose running total is passed to drain().
+    """
+
+    def __init__(self, size, buf=None):
+        assert size & (size - 1) == 0, "ring size must be a power of two"
+        self.size = size
+        self.mask = size - 1
+        self.buf = bytearray(size) if buf is None else buf
+        self.head = 0           # total bytes written
+        self.tail = 0           # total bytes read
+        self.overruns = 0       # bytes lost to the producer lapping the consumer
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def write(self, data):
+        "Producer side: append data, overwriting the oldest bytes if the consumer is behind"
+        buf = self.buf
+        mask = self.mask
+        head = self.head
+        for int8 in data:
+            buf[head & mask] = int8
+            head += 1
+        self.head = head
+
+    def drain(self, head=None):
+        "Consumer side: return everything written since the last drain, as one bytes object"
+        if head is not None:
+            self.head = head
+        head = self.head
+        count = head - self.tail
+        if count > self.size:
+            self.overruns += count - self.size
+            self.tail = head - self.size
+            count = self.size
+        if count <= 0:
+            return b''
+        start = self.tail & self.mask
+        end = start + count
+        if end <= self.size:
+            data = bytes(self.buf[start:end])
+        else:
+            data = bytes(self.buf[start:]) + bytes(self.buf[:end - self.size])
+        self.tail = head
+        return data
+
+
+class ArrayRing:
+    """Circular buffer of numbers in an array.array, in the same style as ByteRing.
+
+    append() stores into the preallocated array, so a producer running at
+    a fixed rate doesn't allocate; drain() hands the consumer everything
+    since its last call as one array.
+    """
+
+    def __init__(self, typecode, size):
+        assert size & (size - 1) == 0, "ring size must be a power of two"
+        self.typecode = typecode
+        self.size = size
+        self.mask = size - 1
+        self.buf = array(typecode, [0]) * size
+        self.head = 0           # total values written
+        self.tail = 0           # total values read
+        self.overruns = 0       # values lost to the producer lapping the consumer
+
+    def __len__(self):
+        return self.head - self.tail
+
+    def append(self, value):
+        "Producer side: add one value, overwriting the oldest if the consumer is behind"
+        self.buf[self.head & self.mask] = value
+        self.head += 1
+
+    def last(self, default=0):
+        "The most recent value"
+        return self.buf[(self.head - 1) & self.mask] if self.head else default
+
+    def drain(self):
+        "Consumer side: return everything appended since the last drain, oldest first"
+        head = self.head
+        count = head - self.tail
+        if count > self.size:
+            self.overruns += count - self.size
+            self.tail = head - self.size
+            count = self.size
+        start = self.tail & self.mask
+        end = start + count
+        if end <= self.size:
+            data = self.buf[start:end]
+        else:
+            data = self.buf[start:] + self.buf[:end - self.size]
+        self.tail = head
+        return data
+
+
+class ByteQueue:
+    """Bounded byte queue between two threads, or the RP2040's two cores, without locks.
+
+    Unlike ByteRing, nothing is ever overwritten: put() takes only what
+    fits, and the producer keeps the rest. The producer is the only
+    writer of head and the consumer the only writer of tail, and each
+    moves its position only after the bytes are in place, so neither
+    side can see a half-written byte. Positions count modulo twice the
+    size, which tells full from empty and keeps them small ints (no
+    allocation, and one store to update, under MicroPython).
+    """
+
+    def __init__(self, size):
+        assert size & (size - 1) == 0, "queue size must be a power of two"
+        self.size = size
+        self.mask = size - 1
+        self.wrap = 2 * size - 1
+        self.buf = bytearray(size)
+        self.head = 0           # bytes written, modulo 2 * size: producer only
+        self.tail = 0           # bytes read, modulo 2 * size: consumer only
+
+    def __len__(self):
+        return (self.head - self.tail) & self.wrap
+
+    def free(self):
+        return self.size - len(self)
+
+    def put(self, data):
+        "Producer side: append as much of data as fits; returns how many bytes that was"
+        head = self.head
+        count = min(len(data), self.size - ((head - self.tail) & self.wrap))
+        if count <= 0:
+            return 0
+        buf = self.buf
+        start = head & self.mask
+        first = min(count, self.size - start)
+        buf[start:start + first] = data[:first]
+        if count > first:
+            buf[:count - first] = data[first:count]
+        self.head = (head + count) & self.wrap
+        return count
+
+    def get(self, limit=None):
+        "Consumer side: take up to limit bytes (all there are by default), as one bytes object"
+        tail = self.tail
+        count = (self.head - tail) & self.wrap
+        if limit is not None and limit < count:
+            count = limit
+        if not count:
+            return b''
+        start = tail & self.mask
+        end = start + count
+        if end <= self.size:
+            data = bytes(self.buf[start:end])
+        else:
+            data = bytes(self.buf[start:]) + bytes(self.buf[:end - self.size])
+        self.tail = (tail + count) & self.wrap
+        return data
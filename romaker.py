@@ -1,17 +1,23 @@
-# Create a bytearray of 8192 bytes, filled with 0xFF
-rom_data = bytearray([0xFF] * 8192)
+"""Build boot.rom from boot.ex9: an 8 KiB image based at 0xF000 (so 0xF000-0xFFFF twice), filled with 0xFF (see rombuild.py)
 
-with open('boot.ex9', 'rb') as f:
-    # Read the contents of the file into the bytearray
-    load_address = int.from_bytes(f.read(2), byteorder='big')
-    data_length = int.from_bytes(f.read(2), byteorder='big')
-    file_data = f.read(data_length)
-    exec_address = int.from_bytes(f.read(2), byteorder='big')
-    print(f"Load address: {hex(load_address)}, Data length: {data_length}, Exec address: {hex(exec_address)}")
-    rom_address = load_address - 0xF000  # Adjust load address to fit in 0xF000-0xFFFF
-    rom_data[rom_address:rom_address + len(file_data)] = file_data
-    rom_data[0x1FFE:0x2000] = exec_address.to_bytes(2, byteorder='big')
+With --diff, also write boot.patch.hex holding only the EEPROM pages that
+changed since the previous boot.rom.
+"""
+
+import sys
+
+import ex9
+import rombuild
+
+load_address, file_data, exec_address = ex9.load('boot.ex9')
+print(f"Load address: {hex(load_address)}, Data length: {len(file_data)}, Exec address: {hex(exec_address)}")
+
+rom = rombuild.Rom(size=8192, base=0xF000, fill=0xFF)
+rom.place_image('boot.ex9')
+rom.set_vector('RESET', exec_address)
+
+if '--diff' in sys.argv:
+    rombuild.write_patch(rom, 'boot.rom')
 
 # Write the bytearray to a file
-with open('boot.rom', 'wb') as f:
-    f.write(rom_data)
\ No newline at end of file
+rom.write('boot.rom')
@@ -0,0 +1,296 @@
+"""Build ROM images from .ex9 files, as raw binary, Intel HEX or Motorola S-records.
+
+A ROM of `size` bytes has its first byte at CPU address `base`. A part
+that reaches past 0xFFFF (romaker's 8 KiB at 0xF000, say) is mirrored:
+the CPU sees 0x10000 - base bytes of it, and each slice of the part that
+size holds a copy of them. Images and vectors are placed by CPU address,
+so the vectors need a ROM covering 0xFFF0-0xFFFF. Any number of images
+can be placed in it; overlapping or out-of-range regions are errors.
+
+    python rombuild.py boot.ex9 [other.ex9[@addr] ...] [--size 8192] [--base 0xF000]
+                       [--vector NMI=0xF100 ...] [-f raw|ihex|srec ...] [-o boot.rom]
+                       [--diff [--page-size 64]]
+    python rombuild.py --batch roms.json
+
+A batch file is a JSON list of ROMs, each a dict of "output", "images" and
+optionally "size", "base", "fill", "vectors" and "formats". Images shared
+between ROMs are only read once.
+
+With --diff, the previous raw image is compared with the new one before it
+is overwritten, and only the changed bytes go to a .patch.hex file, one
+record per EEPROM page write, so a small change programs in seconds.
+"""
+
+import bisect
+import json
+
+import ex9
+
+# Vector addresses, as seen by the 6809
+VECTORS = {
+    'SWI3': 0xFFF2,
+    'SWI2': 0xFFF4,
+    'FIRQ': 0xFFF6,
+    'IRQ': 0xFFF8,
+    'SWI': 0xFFFA,
+    'NMI': 0xFFFC,
+    'RESET': 0xFFFE,
+}
+
+FORMATS = {'raw': '.rom', 'ihex': '.hex', 'srec': '.s19'}
+
+
+class IntervalIndex:
+    "Non-overlapping [start, end) intervals, kept sorted by start"
+
+    def __init__(self):
+        self.starts = []
+        self.intervals = []     # (start, end, name), in the same order
+
+    def add(self, start, end, name):
+        "Add an interval; raises ValueError if it overlaps one already there"
+        i = bisect.bisect_right(self.starts, start)
+        for other in self.intervals[max(i - 1, 0):i + 1]:
+            if other[0] < end and start < other[1]:
+                raise ValueError("%s (0x%04X-0x%04X) overlaps %s (0x%04X-0x%04X)" %
+                                 (name, start, end - 1, other[2], other[0], other[1] - 1))
+        self.starts.insert(i, start)
+        self.intervals.insert(i, (start, end, name))
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+
+class Rom:
+    """A ROM image being built.
+
+    If the part is bigger than the address space from base up, every
+    copy of the window the CPU sees gets the same bytes, so the ROM reads
+    the same whichever copy the address decoding selects.
+    """
+
+    def __init__(self, size=8192, base=0xF000, fill=0xFF):
+        if not 0 <= base < 0x10000:
+            raise ValueError("ROM base 0x%X is outside the 6809's address space" % base)
+        self.size = size
+        self.base = base
+        self.window = min(size, 0x10000 - base)    # bytes of the part the CPU sees
+        if size % self.window:
+            raise ValueError("%d bytes at 0x%04X don't mirror into whole copies of the %d the CPU sees" %
+                             (size, base, self.window))
+        self.end = base + self.window               # CPU address just past the ROM
+        self.data = bytearray([fill]) * size
+        self.regions = IntervalIndex()  # in CPU addresses
+
+    def _store(self, addr, data):
+        "Write data at CPU address addr into every copy"
+        for offset in range(addr - self.base, self.size, self.window):
+            self.data[offset:offset + len(data)] = data
+
+    def place(self, addr, data, name):
+        "Put data at CPU address addr"
+        if addr < self.base or addr + len(data) > self.end:
+            raise ValueError("%s (0x%04X-0x%04X) is outside the ROM (0x%04X-0x%04X)" %
+                             (name, addr, addr + len(data) - 1, self.base, self.end - 1))
+        if data:
+            self.regions.add(addr, addr + len(data), name)
+        self._store(addr, data)
+
+    def place_image(self, path, addr=None):
+        "Put an .ex9 image at its load address (or addr); returns its exec address"
+        load_addr, data, exec_addr = ex9.load(path)
+        if addr is not None:
+            exec_addr += addr - load_addr
+            load_addr = addr
+        self.place(load_addr, data, path)
+        return exec_addr
+
+    def set_vector(self, name, addr):
+        "Point one of the 6809 vectors at addr"
+        if name not in VECTORS:
+            raise ValueError("unknown vector " + name)
+        vector = VECTORS[name]
+        if vector < self.base or vector + 2 > self.end:
+            raise ValueError("the %s vector (0x%04X) is outside the ROM (0x%04X-0x%04X)" %
+                             (name, vector, self.base, self.end - 1))
+        self.regions.add(vector, vector + 2, name + " vector")
+        self._store(vector, addr.to_bytes(2, 'big'))
+
+    def patch(self, old, page_size=64):
+        """Records (offset, data) covering only the bytes that differ from old.
+
+        Each record lies within one page_size-aligned EEPROM page, from the
+        first changed byte in the page to the last, so it can be programmed
+        with a single page write.
+        """
+        if len(old) != self.size:
+            raise ValueError("previous image is %d bytes, not %d" % (len(old), self.size))
+        new = self.data
+        records = []
+        for page in range(0, self.size, page_size):
+            end = min(page + page_size, self.size)
+            if old[page:end] == new[page:end]:
+                continue
+            first = page
+            while old[first] == new[first]:
+                first += 1
+            last = end - 1
+            while old[last] == new[last]:
+                last -= 1
+            records.append((first, new[first:last + 1]))
+        return records
+
+    def ihex(self, record_size=16, records=None):
+        "Intel HEX text, addressed by ROM offset, of the whole ROM or just some records"
+        lines = []
+        upper = 0
+        for start, data in self._chunks(record_size, records):
+            if start >> 16 != upper:
+                upper = start >> 16
+                lines.append(_ihex_record(0, 0x04, upper.to_bytes(2, 'big')))
+            lines.append(_ihex_record(start & 0xFFFF, 0x00, data))
+        lines.append(_ihex_record(0, 0x01, b''))
+        return '\n'.join(lines) + '\n'
+
+    def srec(self, record_size=16, records=None, header=b'rombuild'):
+        "Motorola S-records, addressed by ROM offset, of the whole ROM or just some records"
+        wide = self.size > 0x10000
+        lines = [_srec_record('S0', 2, 0, header)]
+        for start, data in self._chunks(record_size, records):
+            lines.append(_srec_record('S2' if wide else 'S1', 3 if wide else 2, start, data))
+        lines.append(_srec_record('S8' if wide else 'S9', 3 if wide else 2, 0, b''))
+        return '\n'.join(lines) + '\n'
+
+    def _chunks(self, record_size, records):
+        if records is None:
+            records = [(0, self.data)]
+        for offset, data in records:
+            for i in range(0, len(data), record_size):
+                yield offset + i, data[i:i + record_size]
+
+    def write(self, path, fmt='raw', records=None):
+        if fmt == 'raw':
+            assert records is None, "raw output is always the whole ROM"
+            with open(path, 'wb') as f:
+                f.write(self.data)
+            return
+        text = self.ihex(records=records) if fmt == 'ihex' else self.srec(records=records)
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def _ihex_record(addr, kind, data):
+    record = bytes([len(data)]) + addr.to_bytes(2, 'big') + bytes([kind]) + bytes(data)
+    checksum = -sum(record) & 0xFF
+    return ':' + record.hex().upper() + '%02X' % checksum
+
+
+def _srec_record(kind, addr_size, addr, data):
+    record = bytes([addr_size + len(data) + 1]) + addr.to_bytes(addr_size, 'big') + bytes(data)
+    checksum = ~sum(record) & 0xFF
+    return kind + record.hex().upper() + '%02X' % checksum
+
+
+def build(spec):
+    """Build one ROM from a dict like a batch file entry; returns the Rom.
+
+    The RESET vector defaults to the exec address of the first image.
+    """
+    rom = Rom(spec.get('size', 8192), _number(spec.get('base', 0xF000)),
+              _number(spec.get('fill', 0xFF)))
+    exec_addrs = []
+    for image in spec['images']:
+        path, _, addr = image.partition('@')
+        exec_addrs.append(rom.place_image(path, _number(addr) if addr else None))
+    vectors = dict(spec.get('vectors', {}))
+    if 'RESET' not in vectors and exec_addrs:
+        vectors['RESET'] = exec_addrs[0]
+    for name, addr in vectors.items():
+        rom.set_vector(name, _number(addr))
+    return rom
+
+
+def output_paths(spec):
+    "(path, format) for each output of a spec"
+    output = spec['output']
+    formats = spec.get('formats', ['raw'])
+    if len(formats) == 1:
+        return [(output, formats[0])]
+    stem = output.rsplit('.', 1)[0] if '.' in output else output
+    return [(stem + FORMATS[fmt], fmt) for fmt in formats]
+
+
+def write_patch(rom, path, page_size=64):
+    """Write <path stem>.patch.hex with the pages that differ from the ROM already at path.
+
+    Returns the records, or None if there is no previous build to compare with.
+    """
+    try:
+        with open(path, 'rb') as f:
+            old = f.read()
+    except OSError:
+        print("no previous", path, "- program the whole part")
+        return None
+    records = rom.patch(old, page_size)
+    stem = path.rsplit('.', 1)[0] if '.' in path else path
+    rom.write(stem + '.patch.hex', 'ihex', records)
+    print("patch %s.patch.hex: %d bytes in %d page writes" %
+          (stem, sum(len(data) for _, data in records), len(records)))
+    return records
+
+
+def _number(value):
+    return int(value, 0) if isinstance(value, str) else value
+
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Build ROM images from .ex9 files")
+    parser.add_argument('images', nargs='*', help=".ex9 files, each optionally @address")
+    parser.add_argument('--size', type=lambda s: int(s, 0), default=8192, help="ROM size in bytes")
+    parser.add_argument('--base', type=lambda s: int(s, 0), default=0xF000,
+                        help="CPU address of the first ROM byte")
+    parser.add_argument('--fill', type=lambda s: int(s, 0), default=0xFF)
+    parser.add_argument('--vector', action='append', default=[], metavar='NAME=ADDR',
+                        help="set a vector (%s)" % ', '.join(VECTORS))
+    parser.add_argument('-f', '--format', action='append', choices=list(FORMATS))
+    parser.add_argument('-o', '--output', default='boot.rom')
+    parser.add_argument('--batch', help="JSON file listing several ROMs to build")
+    parser.add_argument('--diff', action='store_true',
+                        help="also write a patch of the pages that changed since the last raw build")
+    parser.add_argument('--page-size', type=int, default=64,
+                        help="EEPROM page size for --diff (default 64)")
+    args = parser.parse_args(argv)
+
+    if args.batch:
+        with open(args.batch) as f:
+            specs = json.load(f)
+    elif args.images:
+        specs = [{
+            'output': args.output,
+            'images': args.images,
+            'size': args.size,
+            'base': args.base,
+            'fill': args.fill,
+            'vectors': dict(v.split('=', 1) for v in args.vector),
+            'formats': args.format or ['raw'],
+        }]
+    else:
+        parser.error("no images given")
+
+    for spec in specs:
+        try:
+            rom = build(spec)
+        except ValueError as e:
+            parser.exit(1, "%s: %s\n" % (spec['output'], e))
+        for start, end, name in rom.regions:
+            print("ROM 0x%04X-0x%04X %s" % (start, end - 1, name))
+        for path, fmt in output_paths(spec):
+            if args.diff and fmt == 'raw':
+                write_patch(rom, path, args.page_size)
+            rom.write(path, fmt)
+            print("wrote", path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""asyncio runtime for a running board: console, buttons, axes and NMI as separate tasks.
+
+Each source runs at its own rate (or, for the console, on the data ready
+edge), the way new_board-1.py's uasyncio tasks do on the Pico. Tasks take
+the data bus through one asyncio lock, so claim_bus/release_bus never see
+two owners.
+
+The console is woken by an extra callback on port B data ready rather than
+through the board's EdgeWaiter, so it never consumes an edge that a
+download holding the bus is waiting for. Backends without callbacks fall
+back to checking every console_timeout.
+"""
+
+import asyncio
+import contextlib
+
+from hctl import Sampler
+
+
+class Runtime:
+    "The listen() loop of a Board, split into tasks"
+
+    def __init__(self, board, console_timeout=0.05, button_interval=None,
+                 axis_interval=None, nmi_interval=None):
+        self.board = board
+        self.console_timeout = console_timeout  # longest sleep between console checks
+        self.button_interval = board.poll_interval if button_interval is None else button_interval
+        self.axis_interval = board.poll_interval if axis_interval is None else axis_interval
+        self.nmi_interval = board.nmi_interval if nmi_interval is None else nmi_interval
+        self.bus_lock = asyncio.Lock()
+        self.data_ready = asyncio.Event()
+        self.loop = None
+        self.tasks = []
+        self.sampler = Sampler(board, rate=1.0 / self.axis_interval)
+        self.reported = None
+        self.output = None      # if set, called with the console's bytes instead of printing them
+
+    def _data_ready(self, pin):
+        # Called on a GPIO thread
+        try:
+            self.loop.call_soon_threadsafe(self.data_ready.set)
+        except RuntimeError:    # loop closed, we're finished
+            pass
+
+    @contextlib.asynccontextmanager
+    async def bus(self):
+        "Exclusive use of the data bus, for one or more Board calls"
+        async with self.bus_lock:
+            yield self.board
+
+    async def call(self, fn, *args):
+        """Run a Board method (a download, say) holding the bus.
+
+        It runs on a worker thread, so the loop stays free for whatever
+        doesn't need the bus.
+        """
+        async with self.bus_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def console(self):
+        "Print whatever the 6809 sends, waking on its data ready edge"
+        board = self.board
+        try:
+            board.gpio.add_event_callback(board.PortB_DATA_READY, self._data_ready)
+        except NotImplementedError:
+            pass
+        while True:
+            # Clear before looking, so an edge while we look still wakes us
+            self.data_ready.clear()
+            async with self.bus_lock:
+                in_bytes = board.get_bytes()
+            if in_bytes:
+                if self.output is not None:
+                    self.output(bytes(in_bytes))
+                else:
+                    print(str(in_bytes, encoding='utf-8'), end='')
+                continue
+            try:
+                await asyncio.wait_for(self.data_ready.wait(), self.console_timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def buttons(self):
+        while True:
+            self.board.chk_buttons()
+            await asyncio.sleep(self.button_interval)
+
+    async def axes(self):
+        "Sample the HCTL-2000s at a fixed rate, printing the position when it changes"
+        await self.sampler.run(self.bus_lock, self._report_position)
+
+    def _report_position(self, sampler):
+        position = sampler.position()
+        if position != self.reported:
+            print("position =", position)
+            self.reported = position
+
+    async def nmi(self):
+        while True:
+            await asyncio.sleep(self.nmi_interval)
+            async with self.bus_lock:   # never in the middle of a download
+                self.board.pulse_nmi()
+
+    def start(self):
+        "Create the tasks; they run until cancelled"
+        self.loop = asyncio.get_running_loop()
+        self.tasks = [asyncio.create_task(coro) for coro in
+                      (self.console(), self.buttons(), self.axes(), self.nmi())]
+        return self.tasks
+
+    async def run(self):
+        print("Listening...")
+        try:
+            await asyncio.gather(*self.start())
+        finally:
+            for task in self.tasks:
+                task.cancel()
@@ -0,0 +1,59 @@
+"""Port A through the RP2040's SIO registers: a byte read, written or turned around in one access.
+
+machine.Pin does one pin per call, so reading or writing Port A as eight
+Pins costs eight calls and the bit twiddling around them. Here PA0..PA7
+are taken as one field of the SIO's GPIO registers, starting at the
+port's first GPIO, and every read, write and direction change is a
+single machine.mem32 access.
+"""
+
+from array import array
+from machine import mem32
+
+SIO_BASE = 0xd0000000
+GPIO_IN = SIO_BASE + 0x004
+GPIO_OUT_CLR = SIO_BASE + 0x018
+GPIO_OUT_XOR = SIO_BASE + 0x01c
+GPIO_OE_SET = SIO_BASE + 0x024
+GPIO_OE_CLR = SIO_BASE + 0x028
+
+IO_BANK0_BASE = 0x40014000      # GPIOn_CTRL is at IO_BANK0_BASE + 8 * n + 4
+FUNCSEL_SIO = 5
+
+
+class SIOPort:
+    "Consecutive GPIOs (eight by default) as one port"
+
+    def __init__(self, base, width=8):
+        self.base = base
+        self.width = width
+        self.values = (1 << width) - 1
+        self.mask = self.values << base
+        # Each value shifted into place, so a write is one lookup: no
+        # formatting or unpacking bits
+        self.shifted = array('I', [value << base for value in range(self.values + 1)])
+        self.last = 0           # what's in GPIO_OUT for the port: write() only sends changes
+
+    def claim(self):
+        "Give the pins back to the SIO, from a PIO state machine that had them"
+        for gpio in range(self.base, self.base + self.width):
+            mem32[IO_BANK0_BASE + 8 * gpio + 4] = FUNCSEL_SIO
+
+    def output(self):
+        "Drive the port, starting from 0"
+        mem32[GPIO_OUT_CLR] = self.mask
+        self.last = 0
+        mem32[GPIO_OE_SET] = self.mask
+
+    def input(self):
+        "Stop driving the port"
+        mem32[GPIO_OE_CLR] = self.mask
+
+    def write(self, int8):
+        # XOR in the bits that differ from the last byte: one store, and
+        # the pins that stay the same don't glitch
+        mem32[GPIO_OUT_XOR] = self.shifted[self.last ^ int8]
+        self.last = int8
+
+    def read(self):
+        return (mem32[GPIO_IN] >> self.base) & self.values
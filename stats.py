@@ -0,0 +1,125 @@
+"""Transfer statistics for a Board: byte counts, throughput, handshake latencies and spins.
+
+Nothing here runs unless Board.enable_stats() has been called; with
+stats off the transfer paths only test one attribute per call.
+"""
+
+from array import array
+import bisect
+
+# Upper bounds of the latency buckets, in microseconds; the last bucket is everything above
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+SPIN_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+class Histogram:
+    "Counts in fixed buckets, so adding a sample never allocates"
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = array('L', [0]) * (len(bounds) + 1)
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def samples(self):
+        return sum(self.counts)
+
+    def mean(self):
+        n = self.samples()
+        return self.total / n if n else 0
+
+    def percentile(self, fraction):
+        "Upper bound of the bucket holding this fraction of samples (None: above the last)"
+        target = fraction * self.samples()
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return self.bounds[i] if i < len(self.bounds) else None
+        return 0
+
+    def as_dict(self):
+        labels = ['<=%d' % bound for bound in self.bounds] + ['>%d' % self.bounds[-1]]
+        return {
+            'samples': self.samples(),
+            'mean': self.mean(),
+            'max': self.max,
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class TransferStats:
+    "Counters for one Board"
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.send_time = 0.0
+        self.bytes_received = 0
+        self.receive_time = 0.0
+        self.transfers = 0          # downloads
+        self.transfer_bytes = 0
+        self.transfer_time = 0.0
+        self.mismatches = 0         # readback differed from the byte sent
+        self.latency = {}           # waiter name -> Histogram of latencies, in us
+        self.spins = {}             # waiter name -> Histogram of spin polls per wait
+
+    def transfer(self, length, seconds):
+        "Note one download of length bytes"
+        self.transfers += 1
+        self.transfer_bytes += length
+        self.transfer_time += seconds
+
+    def recorder(self, name):
+        "A callback for EdgeWaiter.recorder, filing its waits under name"
+        latency = self.latency[name] = Histogram(LATENCY_BUCKETS)
+        spins = self.spins[name] = Histogram(SPIN_BUCKETS)
+
+        def record(seconds, polls):
+            latency.add(seconds * 1e6)
+            spins.add(polls)
+        return record
+
+    def as_dict(self):
+        return {
+            'bytes_sent': self.bytes_sent,
+            'send_time': self.send_time,
+            'bytes_received': self.bytes_received,
+            'receive_time': self.receive_time,
+            'transfers': self.transfers,
+            'transfer_bytes': self.transfer_bytes,
+            'transfer_time': self.transfer_time,
+            'mismatches': self.mismatches,
+            'latency_us': {name: h.as_dict() for name, h in self.latency.items()},
+            'spins': {name: h.as_dict() for name, h in self.spins.items()},
+        }
+
+    def summary(self):
+        "A few lines for the end of a run"
+        lines = []
+
+        def rate(count, seconds):
+            return "%.0f bytes/s" % (count / seconds) if seconds else "-"
+
+        lines.append("sent %d bytes (%s), received %d bytes (%s)" %
+                     (self.bytes_sent, rate(self.bytes_sent, self.send_time),
+                      self.bytes_received, rate(self.bytes_received, self.receive_time)))
+        lines.append("%d downloads, %d bytes (%s), %d readback mismatches" %
+                     (self.transfers, self.transfer_bytes,
+                      rate(self.transfer_bytes, self.transfer_time), self.mismatches))
+        for name, h in self.latency.items():
+            if not h.samples():
+                continue
+            p99 = h.percentile(0.99)
+            spins = self.spins[name]
+            lines.append("%s: %d waits, latency mean %.1f us, 99%% <= %s us, max %.1f us; "
+                         "spins mean %.0f, max %d" %
+                         (name, h.samples(), h.mean(),
+                          p99 if p99 is not None else '>%d' % h.bounds[-1], h.max,
+                          spins.mean(), spins.max))
+        return '\n'.join(lines)
@@ -0,0 +1,49 @@
+"Tests for board.py's download paths, against the simulated target (gpio_backend.SimTarget)"
+
+import pytest
+
+DATA = bytes(range(256)) * 3 + bytes(100)
+
+
+def test_dload_exec(sim_board):
+    target = sim_board.gpio.target
+    sim_board.dload_exec(0x1000, DATA, 0x1002)
+    assert target.memory[0x1000:0x1000 + len(DATA)] == DATA
+    assert target.execs == [0x1002]
+
+
+def test_dload_exec_crc(sim_board):
+    target = sim_board.gpio.target
+    sim_board.dload_exec_crc(0x1000, DATA, 0x1000, block_size=64)
+    assert target.memory[0x1000:0x1000 + len(DATA)] == DATA
+    assert target.execs == [0x1000]
+    assert sim_board.resent_blocks == 0
+
+
+def test_dload_exec_crc_resends_a_bad_block(sim_board):
+    target = sim_board.gpio.target
+    header = 7      # command, address, length, block size
+    target.faults = {header + 64 + 1 + 10}  # in the second block (after the first and its ACK)
+    sim_board.dload_exec_crc(0x1000, DATA, 0x1000, block_size=64)
+    assert target.memory[0x1000:0x1000 + len(DATA)] == DATA
+    assert sim_board.resent_blocks == 1
+
+
+def test_dload_exec_crc_gives_up(sim_board):
+    target = sim_board.gpio.target
+    sim_board.max_retries = 2
+    header = 7
+    target.faults = {header, header + 16 + 1}     # the first block, both attempts
+    with pytest.raises(IOError):
+        sim_board.dload_exec_crc(0x1000, DATA, 0x1000, block_size=16)
+    assert target.execs == []
+    assert sim_board.bus_owner is None
+
+
+def test_block_crc_setting_selects_it(sim_board):
+    target = sim_board.gpio.target
+    sim_board.block_crc = 128
+    target.faults = {7 + 3}
+    sim_board.dload_exec(0x1000, DATA, 0x1000)
+    assert target.memory[0x1000:0x1000 + len(DATA)] == DATA
+    assert sim_board.resent_blocks == 1
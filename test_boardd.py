@@ -0,0 +1,97 @@
+"Tests for boardd.py's socket handling and boardctl.py's arguments"
+
+import asyncio
+import socket
+import time
+
+import pytest
+
+import boardctl
+import boardd
+
+
+def test_stale_socket_is_removed(tmp_path):
+    path = str(tmp_path / 'board.sock')
+    left = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    left.bind(path)     # bound but not listening, as a dead daemon leaves it
+    left.close()
+    boardd.claim_socket(path)
+    assert not (tmp_path / 'board.sock').exists()
+    boardd.claim_socket(path)   # nothing there is fine too
+
+
+def test_live_socket_is_refused(tmp_path):
+    path = str(tmp_path / 'board.sock')
+    live = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    live.bind(path)
+    live.listen(1)
+    try:
+        with pytest.raises(RuntimeError):
+            boardd.claim_socket(path)
+        assert (tmp_path / 'board.sock').exists()
+    finally:
+        live.close()
+
+
+@pytest.mark.parametrize('argv', [[], ['download'], ['--board'], ['flash']])
+def test_boardctl_usage_errors(argv):
+    with pytest.raises(SystemExit) as e:
+        boardctl.main(argv)
+    assert e.value.code == 2
+
+
+def test_boardctl_without_daemon(tmp_path):
+    assert boardctl.main(['--socket', str(tmp_path / 'none.sock'), 'status']) == 1
+
+
+def test_download_modes_are_set_holding_the_bus(sim_board):
+    daemon = boardd.Daemon(sim_board, 'unused.sock')
+    seen = []
+
+    def dload_exec_file(filename):
+        modes = (sim_board.block_crc, sim_board.burst, sim_board.compress)
+        time.sleep(0.05)    # a second request arrives meanwhile
+        seen.append((filename, modes, (sim_board.block_crc, sim_board.burst, sim_board.compress)))
+
+    sim_board.dload_exec_file = dload_exec_file
+
+    async def two_downloads():
+        await asyncio.gather(
+            daemon.op_download({'op': 'download', 'file': 'a', 'crc': True}),
+            daemon.op_download({'op': 'download', 'file': 'b', 'burst': True, 'compress': True}))
+
+    asyncio.run(two_downloads())
+    assert sorted(seen) == [('a', (256, False, False), (256, False, False)),
+                            ('b', (0, True, True), (0, True, True))]
+
+
+class Writer:
+    "Enough of an asyncio StreamWriter for console_output"
+
+    def __init__(self, backlog):
+        self.backlog = backlog
+        self.transport = self
+        self.data = b''
+        self.closed = False
+
+    def get_write_buffer_size(self):
+        return self.backlog
+
+    def is_closing(self):
+        return self.closed
+
+    def write(self, data):
+        self.data += data
+
+    def close(self):
+        self.closed = True
+
+
+def test_stalled_console_subscriber_is_dropped(sim_board):
+    daemon = boardd.Daemon(sim_board, 'unused.sock')
+    reading, stalled = Writer(0), Writer(boardd.CONSOLE_BACKLOG + 1)
+    daemon.subscribers.update((reading, stalled))
+    daemon.console_output(b'hello')
+    assert reading.data == b'hello' and not reading.closed
+    assert stalled.data == b'' and stalled.closed
+    assert daemon.subscribers == {reading}
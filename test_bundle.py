@@ -0,0 +1,51 @@
+"Tests for bundle.py: layout, and a bundle downloaded to the simulated target"
+
+import pytest
+
+import bundle
+
+RTS = b'\x39'
+
+
+def test_pack_relocates_below_memtop():
+    modules = [(0x2000, RTS * 16, 0x2000), (0, RTS * 0x20, 0x10), (0, RTS * 0x10, 0)]
+    regions, exec_addr = bundle.pack(modules, memtop=0x8000)
+    # 0x7FE0 and 0x7FD0 for the relocated modules, 9 bytes of trampoline below
+    assert exec_addr == 0x7FD0 - 9
+    assert [(addr, len(data)) for addr, data in regions] == [(0x2000, 16), (exec_addr, 9 + 0x30)]
+    assert regions[1][1][:9] == bytes([bundle.JSR, 0x20, 0x00, bundle.JSR, 0x7F, 0xF0,
+                                       bundle.JMP, 0x7F, 0xD0])
+
+
+def test_pack_without_relocation():
+    regions, exec_addr = bundle.pack([(0, RTS, 0)], memtop=0x8000, relocate=False)
+    assert regions[0][0] == 0 and exec_addr == 0x8000 - 3
+
+
+def test_pack_refuses_overlaps():
+    with pytest.raises(ValueError):
+        bundle.pack([(0x2000, bytes(16), 0x2000), (0x2008, bytes(16), 0x2008)])
+
+
+def test_dload_bundle(sim_board, tmp_path):
+    target = sim_board.gpio.target
+    modules = [(0x2000, b'\x12' * 100, 0x2000), (0x3000, b'\x34' * 50, 0x3010),
+               (0, b'\x56' * 40, 4)]
+    regions, exec_addr = bundle.pack(modules)
+    path = str(tmp_path / 'modules.b9')
+    with open(path, 'wb') as f:
+        f.write(bundle.MAGIC + bundle.body(regions, exec_addr))
+
+    sim_board.dload_exec_file(path)
+    assert target.memory[0x2000:0x2064] == b'\x12' * 100
+    assert target.memory[0x3000:0x3032] == b'\x34' * 50
+    assert target.memory[0xFE00 - 40:0xFE00] == b'\x56' * 40
+    # the trampoline ran every module, in order
+    assert target.execs == [0x2000, 0x3010, 0xFE00 - 40 + 4]
+
+
+def test_load_refuses_other_files(tmp_path):
+    path = tmp_path / 'blink7.ex9'
+    path.write_bytes(b'\x20\x00\x00\x01\x39\x20\x00')
+    with pytest.raises(ValueError):
+        bundle.load(str(path))
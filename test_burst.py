@@ -0,0 +1,58 @@
+"Tests for burst.py's window and strobe gap adaptation"
+
+import pytest
+
+import burst
+
+
+def test_window_shrinks_then_gap_grows():
+    window = burst.Window(10, 1)
+    sizes = []
+    while window.size > window.min_window:
+        assert window.failed()
+        sizes.append(window.size)
+    assert sizes == [128, 64, 32, 16]
+    assert window.gap == 10 and not window.slowed
+    assert window.failed()
+    assert window.gap == 15 and window.slowed
+
+
+def test_gives_up_only_after_the_gap_has_grown():
+    window = burst.Window(10, 1, max_retries=5)
+    failures = 0
+    while window.failed():
+        failures += 1
+    assert failures == 4 + 5     # halvings to the smallest window, then gap steps
+    assert window.gap == pytest.approx(10 * 1.5 ** 5)
+
+
+def test_success_resets_the_retries():
+    window = burst.Window(10, 1, max_window=16, max_retries=2)
+    assert window.failed() and window.failed()
+    window.ok()
+    assert window.failed() and window.failed()
+    assert not window.failed()
+
+
+def test_gap_has_a_minimum():
+    window = burst.Window(0, 2)
+    assert window.gap == 2
+    with pytest.raises(AssertionError):
+        burst.Window(0, 0)
+
+
+def test_window_grows_back():
+    window = burst.Window(10, 1, grow_after=2)
+    window.failed()
+    assert window.size == 128
+    window.ok()
+    window.ok()
+    assert window.size == 256
+
+
+def test_check():
+    data = b'some window'
+    crc = burst.crc16(data)
+    assert burst.check(bytes([crc >> 8, crc & 0xFF]), data)
+    assert not burst.check(bytes([crc >> 8, ~crc & 0xFF]), data)
+    assert not burst.check(None, data)
@@ -0,0 +1,50 @@
+"Tests for bustrace.py: the ring of events, and a Board's trace saved and replayed"
+
+import bustrace
+from board import BCM_PINS
+from gpio_backend import SimGPIO
+
+DATA = bytes(range(64))
+
+
+def test_tracer_keeps_the_latest():
+    tracer = bustrace.Tracer(8)
+    for value in range(11):
+        tracer.record(bustrace.WRITE, 0, value)
+    times, events = tracer.snapshot()
+    assert len(tracer) == 8 and tracer.lost() == 3
+    assert [bustrace.unpack(event) for event in events] == \
+        [(bustrace.WRITE, 0, value) for value in range(3, 11)]
+    assert list(times) == sorted(times)
+
+
+def traced(board, tmp_path):
+    "A download and a checksum, traced and saved; returns the loaded trace"
+    tracer = board.enable_trace()
+    board.dload_exec(0x2000, DATA, 0x2000)
+    assert board.checksum(0x2000, len(DATA)) is not None
+    assert board.disable_trace() is tracer
+    path = str(tmp_path / 'bus.trace')
+    tracer.save(path)
+    return bustrace.load(path)
+
+
+def test_replay(sim_board, tmp_path):
+    meta, times, events = traced(sim_board, tmp_path)
+    assert meta['lost'] == 0
+    kinds = set(bustrace.unpack(event)[0] for event in events)
+    assert {bustrace.WRITE, bustrace.READ, bustrace.OUT} <= kinds
+    assert len(list(bustrace.describe(meta, times, events))) == len(events)
+
+    gpio = SimGPIO(BCM_PINS)
+    assert bustrace.replay(meta, times, events, gpio, edge_polls=10) == []
+    assert gpio.target.memory[0x2000:0x2000 + len(DATA)] == DATA
+    assert gpio.target.execs == [0x2000]
+
+
+def test_replay_finds_differences(sim_board, tmp_path):
+    meta, times, events = traced(sim_board, tmp_path)
+    gpio = SimGPIO(BCM_PINS)
+    gpio.target.faults = {10}       # a download byte arrives wrong
+    mismatches = bustrace.replay(meta, times, events, gpio, edge_polls=10)
+    assert mismatches and all(kind == bustrace.READ for _, _, kind, _, _, _ in mismatches)
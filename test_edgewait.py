@@ -0,0 +1,95 @@
+"Tests for edgewait.py's EdgeWaiter, on a backend whose edges the test makes"
+
+import threading
+
+import pytest
+
+from edgewait import EdgeWaiter
+
+PIN = 5
+
+
+class Edges:
+    "Just enough of a GPIO backend: event detection, with or without callbacks"
+
+    def __init__(self, callbacks=True):
+        self.callbacks = callbacks
+        self.callback = None
+        self.pending = 0    # event_detected() calls before the edge shows
+        self.latched = False
+        self.detecting = False
+
+    def add_event_detect(self, pin, edge, callback=None):
+        if callback is not None and not self.callbacks:
+            raise NotImplementedError
+        self.callback = callback
+        self.detecting = True
+
+    def remove_event_detect(self, pin):
+        self.detecting = False
+
+    def event_detected(self, pin):
+        if self.pending:
+            self.pending -= 1
+            return False
+        latched, self.latched = self.latched, False
+        return latched
+
+    def edge(self):
+        self.latched = True
+        if self.callback is not None:
+            self.callback(PIN)
+
+
+def test_spins_for_a_prompt_edge():
+    gpio = Edges()
+    waiter = EdgeWaiter(gpio, PIN, 'falling', spin=10)
+    recorded = []
+    waiter.recorder = lambda seconds, polls: recorded.append(polls)
+    gpio.edge()
+    gpio.pending = 3
+    assert waiter.wait()
+    assert recorded == [4]
+    assert waiter.stats()['spun'] == 1 and waiter.stats()['blocked'] == 0
+
+
+@pytest.mark.parametrize('callbacks', [True, False])
+def test_blocks_for_a_late_edge(callbacks):
+    gpio = Edges(callbacks)
+    waiter = EdgeWaiter(gpio, PIN, 'falling', spin=10)
+    assert (waiter.event is None) != callbacks
+    timer = threading.Timer(0.02, gpio.edge)
+    timer.start()
+    assert waiter.wait(timeout=2.0)
+    timer.join()
+    stats = waiter.stats()
+    assert stats['blocked'] == 1 and stats['waits'] == 1
+    assert stats['max_latency'] >= 0.01
+
+
+@pytest.mark.parametrize('callbacks', [True, False])
+def test_timeout(callbacks):
+    waiter = EdgeWaiter(Edges(callbacks), PIN, 'falling', spin=10, timeout=0.01)
+    with pytest.raises(TimeoutError):
+        waiter.wait()
+    assert waiter.wait(raise_timeout=False) is False
+    assert waiter.stats()['timeouts'] == 2 and waiter.stats()['waits'] == 0
+
+
+def test_discard_and_close():
+    gpio = Edges()
+    waiter = EdgeWaiter(gpio, PIN, 'falling', spin=10, timeout=0.01)
+    gpio.edge()
+    waiter.discard()
+    assert not waiter.wait(raise_timeout=False)
+    waiter.reset_stats()
+    assert waiter.stats()['timeouts'] == 0
+    waiter.close()
+    assert not gpio.detecting
+
+
+def test_board_waits_on_the_simulator(sim_board):
+    sim_board.dload_exec(0x2000, bytes(32), 0x2000)
+    stats = sim_board.wait_stats()
+    assert stats['data_taken']['waits'] > 0
+    assert stats['data_taken']['timeouts'] == 0
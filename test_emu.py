@@ -0,0 +1,47 @@
+"Tests for emu.py: downloads and console output through the GPIO backend, on the emulated 6809"
+
+import emu
+
+
+def test_download_and_run(emu_board):
+    machine = emu_board.gpio.target
+    program = bytes([
+        0x86, 0x55,         # LDA #$55
+        0xB7, 0x30, 0x00,   # STA $3000
+        0x39,               # RTS, back to the boot ROM
+    ])
+    emu_board.dload_exec(0x2000, program, 0x2000)
+    machine.run(1000)
+    assert machine.memory[0x2000:0x2000 + len(program)] == program
+    assert machine.memory[0x3000] == 0x55
+    assert machine.cpu.pc >= emu.BOOT_BASE
+    # and it's ready for the next one
+    emu_board.dload_exec(0x2100, b'\x39', 0x2100)
+    assert machine.memory[0x2100] == 0x39
+
+
+def test_console_output(emu_board):
+    machine = emu_board.gpio.target
+    # Write "hi" on port B with the CB2 handshake, then return
+    program = bytes([
+        0x86, 0x80,             # LDA #$80: CB2 handshake, CB1 falling
+        0xB7, 0xFE, 0x0C,       # STA PCR
+        0x86, ord('h'),         # LDA #'h'
+        0x8D, 0x06,             # BSR put
+        0x86, ord('i'),         # LDA #'i'
+        0x8D, 0x02,             # BSR put
+        0x20, 0xFE,             # BRA *
+        0xB7, 0xFE, 0x00,       # put STA ORB
+        0xF6, 0xFE, 0x0D,       # wait LDB IFR
+        0xC5, 0x10,             #      BITB #CB1
+        0x27, 0xF9,             #      BEQ wait
+        0x39,                   #      RTS
+    ])
+    emu_board.dload_exec(0x2000, program, 0x2000)
+    received = bytearray()
+    for _ in range(50):
+        received += emu_board.get_bytes()
+        if len(received) >= 2:
+            break
+    assert bytes(received) == b'hi'
+    assert machine.stats()['instructions'] > 0
@@ -0,0 +1,44 @@
+"Tests for ex9.py's loader and its cache"
+
+import os
+
+import pytest
+
+import ex9
+
+
+def image(load_addr, data, exec_addr):
+    return (load_addr.to_bytes(2, 'big') + len(data).to_bytes(2, 'big') + data +
+            exec_addr.to_bytes(2, 'big'))
+
+
+def test_load(tmp_path):
+    path = str(tmp_path / 'a.ex9')
+    with open(path, 'wb') as f:
+        f.write(image(0x2000, b'\x12\x34\x39', 0x2001))
+    load_addr, data, exec_addr = ex9.load(path)
+    assert (load_addr, bytes(data), exec_addr) == (0x2000, b'\x12\x34\x39', 0x2001)
+    assert ex9.load(path)[1] is data     # from the cache
+
+
+def test_same_size_rewrite_in_the_same_second(tmp_path):
+    path = str(tmp_path / 'a.ex9')
+    second = 1700000000 * 10**9
+    with open(path, 'wb') as f:
+        f.write(image(0x2000, b'old', 0x2000))
+    os.utime(path, ns=(second, second))
+    assert bytes(ex9.load(path)[1]) == b'old'
+    new = str(tmp_path / 'new.ex9')
+    with open(new, 'wb') as f:
+        f.write(image(0x2000, b'new', 0x2000))
+    os.utime(new, ns=(second + 1000, second + 1000))
+    os.replace(new, path)   # as a rebuild does: same size, same second
+    assert bytes(ex9.load(path)[1]) == b'new'
+
+
+def test_bad_header(tmp_path):
+    path = str(tmp_path / 'bad.ex9')
+    with open(path, 'wb') as f:
+        f.write(image(0x2000, b'abc', 0x2000)[:-1])
+    with pytest.raises(ValueError):
+        ex9.load(path)
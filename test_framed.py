@@ -0,0 +1,61 @@
+"Tests for framed downloads (framed.py, Board.dload_exec_framed) against the simulated target"
+
+import pytest
+
+import framed
+
+DATA = bytes(range(100))    # 7 blocks of 16, the last one short
+HEADER = 7                  # command, address, length, block size
+FRAME = 2 + 16 + 2          # sequence number, payload, CRC
+
+
+def test_frame():
+    out = framed.frame(3, b'abc')
+    assert out[:5] == b'\x00\x03abc' and len(out) == 7
+    assert framed.acked(bytes([framed.ACK, 0, 3]), 3)
+    assert not framed.acked(bytes([framed.ACK, 0, 4]), 3)
+    assert not framed.acked(None, 3)
+
+
+def test_dload_exec_framed(sim_board):
+    target = sim_board.gpio.target
+    sim_board.framed = 16
+    target.faults = {HEADER + FRAME + 5}     # frame 1 is NAKed once
+    sim_board.dload_exec(0x2000, DATA, 0x2010)
+    assert target.memory[0x2000:0x2000 + len(DATA)] == DATA
+    assert target.execs == [0x2010]
+    assert sim_board.resent_blocks == 1
+
+
+def test_restarts_when_the_target_stops_answering(sim_board):
+    target = sim_board.gpio.target
+    sim_board.block_timeout = 0.1
+    target.drops = {HEADER + 2 * FRAME + 3}  # frame 2 comes up a byte short
+    sim_board.dload_exec_framed(0x2000, DATA, 0x2000, 16)
+    assert target.memory[0x2000:0x2000 + len(DATA)] == DATA
+    assert target.execs == [0x2000]
+
+
+def test_resume(sim_board, tmp_path):
+    target = sim_board.gpio.target
+    sim_board.resume_log = framed.ResumeLog(str(tmp_path / 'resume.json'))
+    sim_board.max_retries = 2
+    target.faults = {HEADER + 3 * FRAME + 5, HEADER + 4 * FRAME + 5}    # frame 3, both attempts
+    with pytest.raises(IOError):
+        sim_board.dload_exec_framed(0x2000, DATA, 0x2000, 16)
+    assert target.execs == []
+    assert target.memory[0x2000:0x2030] == DATA[:0x30]
+
+    # The next run picks up from frame 3
+    log = framed.ResumeLog(str(tmp_path / 'resume.json'))
+    transfer = framed.key(0x2000, DATA)
+    assert log.start(transfer, 16) == 3
+    assert log.start(transfer, 32) == 0     # a different block size starts over
+    sim_board.resume_log = log
+    target.faults = set()
+    sent = target.received
+    sim_board.dload_exec_framed(0x2000, DATA, 0x2000, 16)
+    assert target.received - sent == HEADER + 3 * FRAME + 2 + 4 + 2 + 2 + 2 + 2
+    assert target.memory[0x2000:0x2000 + len(DATA)] == DATA
+    assert target.execs == [0x2000]
+    assert framed.ResumeLog(str(tmp_path / 'resume.json')).entries == {}
@@ -0,0 +1,73 @@
+"Tests for gpiomem.py, with a plain file standing in for /dev/gpiomem"
+
+import pytest
+
+import gpiomem
+from gpiomem import GpioMemBackend, bus_tables, GPSET0, GPCLR0, GPLEV0, GPREN0, GPFEN0, GPEDS0
+from gpio_backend import BCM, OUT, IN, FALLING, BOTH
+
+DATA_BUS = [17, 18, 27, 22, 23, 10, 9, 11]  # D0..D7, as in board.BCM_PINS
+
+
+@pytest.fixture
+def gpio(tmp_path):
+    path = tmp_path / 'gpiomem'
+    path.write_bytes(bytes(gpiomem.BLOCK_SIZE))
+    gpio = GpioMemBackend(str(path), soc='bcm2711')
+    gpio.setmode(BCM)
+    yield gpio
+    gpio.close()
+
+
+def test_bus_tables_round_trip():
+    set_masks, clr_masks, runs, gather = bus_tables(DATA_BUS)
+    bus = sum(1 << pin for pin in DATA_BUS)
+    for int8 in range(256):
+        assert set_masks[int8] | clr_masks[int8] == bus
+        assert set_masks[int8] & clr_masks[int8] == 0
+        key = 0
+        for shift, mask in runs:
+            key |= (set_masks[int8] >> shift) & mask
+        assert gather[key] == int8
+
+
+def test_write_byte_is_one_set_and_one_clear(gpio):
+    set_masks, clr_masks, runs, gather = bus_tables(DATA_BUS)
+    gpio.write_byte(DATA_BUS, 0xA5)
+    assert gpio.regs[GPSET0 // 4] == set_masks[0xA5]
+    assert gpio.regs[GPCLR0 // 4] == clr_masks[0xA5]
+
+
+def test_read_byte(gpio):
+    set_masks, clr_masks, runs, gather = bus_tables(DATA_BUS)
+    for int8 in (0x00, 0x3C, 0xFF):
+        gpio.regs[GPLEV0 // 4] = set_masks[int8] | (1 << 2)    # and a pin off the bus
+        assert gpio.read_byte(DATA_BUS) == int8
+
+
+def test_setup_sets_function(gpio):
+    gpio.setup(17, OUT)
+    assert (gpio.regs[1] >> 21) & 7 == 1
+    gpio.setup(17, IN)
+    assert (gpio.regs[1] >> 21) & 7 == 0
+
+
+def test_event_detect(gpio, monkeypatch):
+    monkeypatch.setattr(gpiomem, 'line_owner', lambda pin: None)
+    gpio.add_event_detect(6, FALLING)
+    assert gpio.regs[GPFEN0 // 4] == 1 << 6
+    assert gpio.regs[GPREN0 // 4] == 0
+    gpio.regs[GPEDS0 // 4] = 0          # a file doesn't clear on writing 1s, as the hardware does
+    assert not gpio.event_detected(6)
+    gpio.regs[GPEDS0 // 4] = 1 << 6     # the hardware saw the edge
+    assert gpio.event_detected(6)
+    gpio.remove_event_detect(6)
+    assert gpio.regs[GPFEN0 // 4] == 0
+
+
+def test_event_detect_refuses_claimed_lines(gpio, monkeypatch):
+    monkeypatch.setattr(gpiomem, 'line_owner', lambda pin: 'pinctrl' if pin == 6 else None)
+    with pytest.raises(RuntimeError):
+        gpio.add_event_detect(6, BOTH)
+    assert gpio.regs[GPREN0 // 4] == gpio.regs[GPFEN0 // 4] == 0
+    gpio.add_event_detect(13, BOTH)
@@ -0,0 +1,48 @@
+"Tests for hctl.py: unwrapping the counters, and sampling them on the simulated board"
+
+import pytest
+
+from board import Board, BCM_PINS
+from gpio_backend import SimGPIO
+from hctl import Axis, Sampler
+
+
+def test_unwrap_takes_the_short_way_round():
+    axis = Axis('x', 2, 16, 8, 1.0)
+    for count in (250, 254, 3, 10, 250, 128):
+        axis.update(count, 0.01)
+    # +4, +5 (across the wrap), +7, -16 (back across it), -122
+    assert list(axis.positions.drain()) == [0, 4, 9, 16, 0, -122]
+    assert axis.velocity == pytest.approx(-12200.0)
+
+
+def test_sampler_on_the_simulator(sim_board):
+    gpio = sim_board.gpio
+    x, y = sim_board.CS_x_axis, sim_board.CS_y_axis
+    sampler = Sampler(sim_board, rate=100, size=16)
+    assert [axis.mask for axis in sampler.axes] == [0xFF, 0xFF]
+    for i, (cx, cy) in enumerate([(0xF0, 5), (0xFC, 3), (0x08, 1), (0x20, 0xFF)]):
+        gpio.set_position(x, cx)
+        gpio.set_position(y, cy)
+        sampler.sample(now=i * 0.01)
+    assert sampler.position() == (0x30, -6)
+    samples = sampler.drain()
+    assert list(samples['t']) == pytest.approx([0, 0.01, 0.02, 0.03])
+    assert list(samples['x']) == [0, 12, 24, 48]
+    assert list(samples['y']) == [0, -2, -4, -6]
+    assert samples['vx'][-1] > 0 > samples['vy'][-1]
+    assert list(sampler.drain()['t']) == []
+    assert sim_board.bus_owner is None
+
+
+def test_both_bytes_with_a_select_line(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pins = dict(BCM_PINS, HCTL_SEL=24)
+    board = Board(SimGPIO(pins), pins, reset_delay=0)
+    sampler = Sampler(board, size=16)
+    assert sampler.axes[0].mask == 0xFFF
+    for count in (0xFF0, 0x010):
+        board.gpio.set_position(board.CS_x_axis, count)
+        sampler.sample()
+    assert sampler.position()[0] == 0x20
+    board.gpio.cleanup()
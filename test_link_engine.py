@@ -0,0 +1,58 @@
+"Tests for link_engine.py, with a fake port on an ordinary thread"
+
+import time
+
+from link_engine import LinkEngine
+
+
+class FakePort:
+    "Hands out incoming a few bytes at a time, and records what's sent"
+
+    def __init__(self, incoming):
+        self.incoming = bytearray(incoming)
+        self.sent = bytearray()
+        self.nmis = 0
+        self.active = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def receive(self):
+        data = bytes(self.incoming[:50])
+        del self.incoming[:50]
+        return data
+
+    def send(self, data):
+        self.sent += data
+
+    def pulse_nmi(self):
+        self.nmis += 1
+
+
+def test_engine_moves_bytes_both_ways():
+    incoming = bytes(n & 0xFF for n in range(5000))
+    outgoing = bytes(range(256)) * 10
+    port = FakePort(incoming)
+    engine = LinkEngine(port, rx_size=256, tx_size=128, idle_us=50)
+    engine.start()
+    try:
+        got = bytearray()
+        written = 0
+        deadline = time.time() + 10
+        while (len(got) < len(incoming) or written < len(outgoing)) and time.time() < deadline:
+            got += engine.read()
+            written += engine.write(outgoing[written:])
+            if written % 1000 < 10:
+                engine.nmi()
+        while not engine.flushed() and time.time() < deadline:
+            time.sleep(0.001)
+    finally:
+        engine.stop()
+    assert bytes(got) == incoming     # a small rx queue holds bytes back, never drops them
+    assert bytes(port.sent) == outgoing
+    assert engine.received == len(incoming) and engine.sent == len(outgoing)
+    assert port.nmis == engine.nmi_requests
+    assert not port.active
@@ -0,0 +1,64 @@
+"Tests for lz.py: the compressor, the reference decoder, the 6809 stub and staging"
+
+import pytest
+
+import emu
+import lz
+
+
+SAMPLES = [
+    b'',
+    b'x',
+    bytes(1000),                                    # one long fill
+    bytes(range(256)) * 4,                          # repeated table: copies
+    b'\x86\x01\xb7\xfe\x0b' * 50 + bytes(300) + b'\x39',
+    bytes((n * 37 + n // 7) & 0xFF for n in range(3000)),   # little to find
+]
+
+
+@pytest.mark.parametrize('data', SAMPLES)
+def test_round_trip(data):
+    assert lz.decompress(lz.compress(data), len(data)) == data
+
+
+def test_long_literal_runs_split():
+    data = bytes((n * 73) & 0xFF for n in range(300))
+    packed = lz.compress(data)
+    assert packed[0] == lz.MAX_LITERALS - 1
+    assert lz.decompress(packed, len(data)) == data
+
+
+def test_stub_length():
+    assert len(lz.STUB_CODE) + 6 == 84   # code, then dst, end and exec
+
+
+def test_stub_runs_on_the_emulator(emu_board):
+    machine = emu_board.gpio.target
+    data = bytearray(b'\x86\x01\xb7\xfe\x0b' * 40 + bytes(500) + bytes(range(200)) * 3)
+    data[-1] = 0x39     # RTS: the exec address, back to the boot ROM's command loop
+    load_addr = 0x1000
+    emu_board.dload_exec_compressed(load_addr, bytes(data), load_addr + len(data) - 1)
+    machine.run(200000)
+    assert machine.memory[load_addr:load_addr + len(data)] == data
+    assert machine.cpu.pc >= emu.BOOT_BASE      # returned, waiting for the next command
+
+
+def test_staging_above_then_below():
+    assert lz.staging_addr(0x1000, 0x100, 0x80, 0x2000) == 0x1100
+    assert lz.staging_addr(0x1F00, 0x100, 0x80, 0x2000) == 0x1E80
+    # a relocated destination, above the free RAM's top
+    assert lz.staging_addr(0x7000, 0x800, 0x80, 0x7000) == 0x6F80
+
+
+def test_staging_needs_room():
+    with pytest.raises(ValueError):
+        lz.staging_addr(0x0100, 0x7E00, 0x101, 0x8000)
+
+
+def test_board_keeps_staging_out_of_io(sim_board):
+    sim_board.memtop = 0x2000
+    with pytest.raises(ValueError):
+        sim_board.dload_exec_compressed(0x1000, bytes(2000), 0x1000, staging_addr=0x1FC0)
+    sim_board.memtop = 0x1100
+    with pytest.raises(ValueError):
+        sim_board.dload_exec_compressed(0x0100, bytes(0x1000), 0x0100)
@@ -0,0 +1,122 @@
+"Tests for manifest.py: skipping resident modules, and finding a resident loader"
+
+import json
+
+import pytest
+
+from manifest import Manifest
+
+LOADER = bytes(range(256)) * 2     # stands in for boot2.ex9's data
+LOADER_AT = 0x7000
+
+
+def probe_for(board):
+    "The Pico's probe_second_stage, on a Board"
+    def probe():
+        if board.checksum(0x0000, 0x0001) is None:
+            raise OSError("no answer from the second stage")
+    return probe
+
+
+def booted(board, tmp_path):
+    "The loader downloaded and noted, as bootstrap() leaves things"
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    board.dload_exec(LOADER_AT, LOADER, LOADER_AT)
+    manifest.forget()
+    manifest.record('boot2.ex9', LOADER, LOADER_AT, LOADER_AT)
+    manifest.save()
+    return manifest
+
+
+def test_warm_boot(sim_board, tmp_path):
+    booted(sim_board, tmp_path)
+    manifest = Manifest(str(tmp_path / 'manifest.json'))   # the next run
+    assert manifest.loader_resident('boot2.ex9', LOADER, LOADER_AT, LOADER_AT,
+                                    probe_for(sim_board), sim_board.checksum)
+
+
+def test_no_warm_boot_over_a_changed_loader(sim_board, tmp_path):
+    manifest = booted(sim_board, tmp_path)
+    sim_board.gpio.target.memory[LOADER_AT] ^= 0xFF
+    assert not manifest.loader_resident('boot2.ex9', LOADER, LOADER_AT, LOADER_AT,
+                                        probe_for(sim_board), sim_board.checksum)
+
+
+def test_no_probe_under_a_program_that_doesnt_return(sim_board, tmp_path):
+    manifest = booted(sim_board, tmp_path)
+    manifest.started('blink7.ex9')
+    manifest.save()
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    assert manifest.running == 'blink7.ex9'
+
+    def probe():
+        raise AssertionError("probed under the running program")
+
+    assert not manifest.loader_resident('boot2.ex9', LOADER, LOADER_AT, LOADER_AT,
+                                        probe, sim_board.checksum)
+    manifest.forget()   # the bootstrap that follows
+    assert manifest.running is None
+
+
+def test_first_stage_ignores_the_probe(emu_board, tmp_path):
+    machine = emu_board.gpio.target
+    before = bytes(machine.memory[0x0100:0xFE00])
+    with pytest.raises(OSError):
+        probe_for(emu_board)()
+    assert bytes(machine.memory[0x0100:0xFE00]) == before
+    # and it still takes a download
+    emu_board.dload_exec(0x2000, b'\x39', 0x2000)
+    assert machine.memory[0x2000] == 0x39
+
+
+def test_reads_the_old_format(tmp_path):
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps({'a.ex9': {'hash': '', 'load': 0x2000, 'length': 1, 'exec': 0x2000,
+                                          'crc': 0}}))
+    manifest = Manifest(str(path))
+    assert list(manifest.entries) == ['a.ex9'] and manifest.running is None
+
+
+def test_record_forgets_what_it_overwrites(tmp_path):
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    manifest.record('a.ex9', bytes(0x100), 0x2000, 0x2000)
+    manifest.record('b.ex9', bytes(0x100), 0x3000, 0x3000)
+    manifest.record('c.ex9', bytes(0x10), 0x20F0, 0x20F0)
+    assert sorted(manifest.entries) == ['b.ex9', 'c.ex9']
+    manifest.overwritten(0x2FFF, 2)
+    assert sorted(manifest.entries) == ['c.ex9']
+
+
+def write_ex9(path, load_addr, data, exec_addr):
+    with open(str(path), 'wb') as f:
+        f.write(load_addr.to_bytes(2, 'big') + len(data).to_bytes(2, 'big') + data +
+                exec_addr.to_bytes(2, 'big'))
+    return str(path)
+
+
+def test_download_skips_a_resident_module(sim_board, tmp_path):
+    target = sim_board.gpio.target
+    name = write_ex9(tmp_path / 'blink7.ex9', 0x3000, LOADER, 0x3000)
+    sim_board.manifest = Manifest(str(tmp_path / 'manifest.json'))
+    sim_board.dload_exec_file(name)
+    sent = target.received
+    assert sent > len(LOADER)
+
+    sim_board.manifest = Manifest(str(tmp_path / 'manifest.json'))   # the next run
+    sim_board.dload_exec_file(name)
+    assert target.received - sent < 16          # a checksum and an empty download
+    assert target.execs == [0x3000, 0x3000]
+    assert sim_board.manifest.skipped == len(LOADER)
+
+
+def test_download_resends_a_module_that_changed_in_ram(sim_board, tmp_path):
+    target = sim_board.gpio.target
+    name = write_ex9(tmp_path / 'blink7.ex9', 0x3000, LOADER, 0x3000)
+    sim_board.manifest = Manifest(str(tmp_path / 'manifest.json'))
+    sim_board.dload_exec_file(name)
+    target.memory[0x3100] ^= 0xFF               # the program scribbled on itself
+    sent = target.received
+    sim_board.dload_exec_file(name)
+    assert target.received - sent > len(LOADER)
+    assert target.memory[0x3000:0x3000 + len(LOADER)] == LOADER
+    assert sim_board.manifest.skipped == 0
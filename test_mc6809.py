@@ -0,0 +1,215 @@
+"Tests for mc6809.py: instruction results, flags, addressing modes and cycle counts"
+
+import pytest
+
+from mc6809 import CPU, N, Z, V, C, H
+
+ORIGIN = 0x1000
+PATTERN = bytes((n * 7 + (n >> 8)) & 0xFF for n in range(0x10000))
+
+
+def load(code, **registers):
+    "A CPU about to run code at ORIGIN, over memory filled with a pattern"
+    cpu = CPU(bytearray(PATTERN))
+    cpu.memory[ORIGIN:ORIGIN + len(code)] = bytes(code)
+    cpu.pc = ORIGIN
+    cpu.cc = 0
+    for name, value in registers.items():
+        setattr(cpu, name, value)
+    return cpu
+
+
+def step(cpu):
+    "Run one instruction; returns its cycles"
+    return cpu.run(1)
+
+
+def flags(cpu, mask=N | Z | V | C):
+    return cpu.cc & mask
+
+
+@pytest.mark.parametrize('a, m, result, cc', [
+    (0x7F, 0x01, 0x80, N | V),
+    (0xFF, 0x01, 0x00, Z | C),
+    (0x80, 0x80, 0x00, Z | V | C),
+    (0x12, 0x34, 0x46, 0),
+])
+def test_adda(a, m, result, cc):
+    cpu = load([0x8B, m], a=a)     # ADDA #m
+    assert step(cpu) == 2
+    assert cpu.a == result and flags(cpu) == cc
+
+
+def test_adda_half_carry():
+    cpu = load([0x8B, 0x01], a=0x0F)
+    step(cpu)
+    assert cpu.cc & H
+
+
+@pytest.mark.parametrize('a, m, result, cc', [
+    (0x80, 0x01, 0x7F, V),
+    (0x00, 0x01, 0xFF, N | C),
+    (0x7F, 0xFF, 0x80, N | V | C),
+    (0x05, 0x05, 0x00, Z),
+])
+def test_suba(a, m, result, cc):
+    cpu = load([0x80, m], a=a)     # SUBA #m
+    step(cpu)
+    assert cpu.a == result and flags(cpu) == cc
+
+
+def test_addd_and_subd_carry():
+    cpu = load([0xC3, 0x00, 0x01, 0x83, 0x00, 0x02], a=0xFF, b=0xFF)     # ADDD #1, SUBD #2
+    assert step(cpu) == 4
+    assert cpu.d == 0 and flags(cpu) == Z | C
+    step(cpu)
+    assert cpu.d == 0xFFFE and flags(cpu) == N | C
+
+
+@pytest.mark.parametrize('a, result, cc', [
+    (0x80, 0x80, N | V | C),
+    (0x00, 0x00, Z),
+    (0x01, 0xFF, N | C),
+])
+def test_nega(a, result, cc):
+    cpu = load([0x40], a=a)
+    assert step(cpu) == 2
+    assert cpu.a == result and flags(cpu) == cc
+
+
+@pytest.mark.parametrize('a, result, cc', [
+    (0x40, 0x80, N | V),
+    (0x80, 0x00, Z | V | C),
+    (0xC0, 0x80, N | C),
+])
+def test_asla(a, result, cc):
+    cpu = load([0x48], a=a)
+    step(cpu)
+    assert cpu.a == result and flags(cpu) == cc
+
+
+@pytest.mark.parametrize('a, carry, result, cc', [
+    (0x40, C, 0x81, N | V),
+    (0x80, 0, 0x00, Z | V | C),
+    (0xC0, C, 0x81, N | C),
+])
+def test_rola(a, carry, result, cc):
+    cpu = load([0x49], a=a, cc=carry)
+    step(cpu)
+    assert cpu.a == result and flags(cpu) == cc
+
+
+def test_shifts_leave_v():
+    cpu = load([0x44, 0x46, 0x47], a=0x81, cc=V)     # LSRA, RORA, ASRA
+    step(cpu)
+    assert cpu.a == 0x40 and flags(cpu) == V | C
+    step(cpu)
+    assert cpu.a == 0xA0 and flags(cpu) == N | V
+    step(cpu)
+    assert cpu.a == 0xD0 and flags(cpu) == N | V
+
+
+def read16(cpu, addr):
+    return cpu.memory[addr] << 8 | cpu.memory[addr + 1]
+
+
+# LDA with each indexed mode: postbyte and operand bytes, registers, the
+# address it should load from, total cycles, and X (or Y) afterwards
+INDEXED = [
+    ([0x84], {'x': 0x2000}, lambda cpu: 0x2000, 4, 0x2000),                  # ,X
+    ([0x1F], {'x': 0x2000}, lambda cpu: 0x1FFF, 5, 0x2000),                  # -1,X
+    ([0x80], {'x': 0x2000}, lambda cpu: 0x2000, 6, 0x2001),                  # ,X+
+    ([0x81], {'x': 0x2000}, lambda cpu: 0x2000, 7, 0x2002),                  # ,X++
+    ([0x82], {'x': 0x2000}, lambda cpu: 0x1FFF, 6, 0x1FFF),                  # ,-X
+    ([0x83], {'x': 0x2000}, lambda cpu: 0x1FFE, 7, 0x1FFE),                  # ,--X
+    ([0x85], {'x': 0x2000, 'b': 0xFE}, lambda cpu: 0x1FFE, 5, 0x2000),       # B,X
+    ([0x86], {'x': 0x2000, 'a': 0x10}, lambda cpu: 0x2010, 5, 0x2000),       # A,X
+    ([0x88, 0x80], {'x': 0x2000}, lambda cpu: 0x1F80, 5, 0x2000),            # n8,X
+    ([0x89, 0x12, 0x34], {'x': 0x2000}, lambda cpu: 0x3234, 8, 0x2000),      # n16,X
+    ([0x8B], {'x': 0x2000, 'a': 0x01, 'b': 0x02}, lambda cpu: 0x2102, 8, 0x2000),  # D,X
+    ([0x8C, 0x10], {}, lambda cpu: ORIGIN + 3 + 0x10, 5, 0),                 # n8,PCR
+    ([0x8D, 0x01, 0x00], {}, lambda cpu: ORIGIN + 4 + 0x100, 9, 0),          # n16,PCR
+    ([0x94], {'x': 0x2000}, lambda cpu: read16(cpu, 0x2000), 7, 0x2000),     # [,X]
+    ([0x91], {'x': 0x2000}, lambda cpu: read16(cpu, 0x2000), 10, 0x2002),    # [,X++]
+    ([0x99, 0x01, 0x00], {'x': 0x2000}, lambda cpu: read16(cpu, 0x2100), 11, 0x2000),  # [n16,X]
+    ([0x9F, 0x30, 0x00], {}, lambda cpu: read16(cpu, 0x3000), 9, 0),         # [n16]
+    ([0xA4], {'y': 0x2345}, lambda cpu: 0x2345, 4, 0x2345),                  # ,Y
+]
+
+
+@pytest.mark.parametrize('operand, registers, address, cycles, index', INDEXED)
+def test_indexed(operand, registers, address, cycles, index):
+    cpu = load([0xA6] + operand, **registers)
+    expected = cpu.memory[address(cpu)]
+    assert step(cpu) == cycles
+    assert cpu.a == expected
+    assert cpu.y == index if 'y' in registers else cpu.x == index
+
+
+@pytest.mark.parametrize('postbyte', [0x87, 0x8A, 0x8E, 0x8F, 0xAF, 0x90, 0x92, 0xB2])
+def test_illegal_indexed_postbytes(postbyte):
+    cpu = load([0xA6, postbyte, 0x00, 0x00], x=0x2000, y=0x2000)
+    with pytest.raises(ValueError):
+        step(cpu)
+
+
+def test_leax_sets_z_and_leas_arms_nmi():
+    cpu = load([0x30, 0x1F, 0x32, 0x84], x=0x0001, s=0x0100)   # LEAX -1,X; LEAS ,X
+    step(cpu)
+    assert cpu.x == 0 and cpu.cc & Z
+    assert not cpu.nmi_armed
+    step(cpu)
+    assert cpu.s == 0 and cpu.nmi_armed
+
+
+def signed(value):
+    return value - 0x100 if value & 0x80 else value
+
+
+BRANCHES = {
+    0x20: lambda a, m: True,                        # BRA
+    0x21: lambda a, m: False,                       # BRN
+    0x22: lambda a, m: a > m,                       # BHI
+    0x23: lambda a, m: a <= m,                      # BLS
+    0x24: lambda a, m: a >= m,                      # BHS
+    0x25: lambda a, m: a < m,                       # BLO
+    0x26: lambda a, m: a != m,                      # BNE
+    0x27: lambda a, m: a == m,                      # BEQ
+    0x2C: lambda a, m: signed(a) >= signed(m),      # BGE
+    0x2D: lambda a, m: signed(a) < signed(m),       # BLT
+    0x2E: lambda a, m: signed(a) > signed(m),       # BGT
+    0x2F: lambda a, m: signed(a) <= signed(m),      # BLE
+}
+VALUES = [0x00, 0x01, 0x7F, 0x80, 0x81, 0xFF]
+
+
+@pytest.mark.parametrize('opcode', sorted(BRANCHES))
+def test_branch_after_compare(opcode):
+    for a in VALUES:
+        for m in VALUES:
+            cpu = load([0x81, m, opcode, 0x10], a=a)     # CMPA #m; Bcc +16
+            step(cpu)
+            assert step(cpu) == 3
+            taken = cpu.pc == ORIGIN + 4 + 0x10
+            assert taken == BRANCHES[opcode](a, m), "%02X: %02X vs %02X" % (opcode, a, m)
+
+
+@pytest.mark.parametrize('opcode, cc, taken', [
+    (0x28, 0, True), (0x28, V, False),     # BVC
+    (0x29, V, True), (0x29, 0, False),     # BVS
+    (0x2A, 0, True), (0x2A, N, False),     # BPL
+    (0x2B, N, True), (0x2B, 0, False),     # BMI
+])
+def test_branch_on_a_flag(opcode, cc, taken):
+    cpu = load([opcode, 0xFE], cc=cc)      # to itself
+    step(cpu)
+    assert (cpu.pc == ORIGIN) == taken
+
+
+def test_long_branch_cycles():
+    cpu = load([0x10, 0x27, 0x01, 0x00], cc=Z)     # LBEQ +256
+    assert step(cpu) == 6
+    assert cpu.pc == ORIGIN + 4 + 0x100
+    cpu = load([0x10, 0x27, 0x01, 0x00])
+    assert step(cpu) == 5
+    assert cpu.pc == ORIGIN + 4
@@ -0,0 +1,109 @@
+"Tests for pio_link.py's Port A drivers, on the simulated rp2 in pio_sim.py"
+
+import pytest
+
+import pio_sim
+from pio_sim import SimVIAPortA
+from pio_link import PortASender, PortAReceiver
+
+DATA = bytes(range(256)) + b'the quick brown fox'
+
+
+@pytest.fixture
+def via():
+    pio_sim.reset()
+    return SimVIAPortA()
+
+
+def test_asm_pio_hides_module_globals():
+    # As on the Pico, a program can't see the names of the module it's in
+    with pytest.raises(NameError):
+        @pio_sim.asm_pio()
+        def uses_global():
+            wait(1, gpio, DATA)
+    assert DATA[0] == 0     # and the module's globals are back afterwards
+
+
+def test_asm_pio():
+    @pio_sim.asm_pio(set_init=pio_sim.PIO.OUT_HIGH)
+    def blink():
+        label('top')
+        set(pins, 0)    [3]
+        set(pins, 1)
+        jmp('top')
+    assert [instr.op for instr in blink.instrs] == ['set', 'set', 'jmp']
+    assert blink.instrs[0].delay == 3
+    assert blink.labels == {'top': 0}
+
+
+def test_send(via):
+    sender = PortASender(sm_id=0)
+    sender.start()
+    try:
+        sender.send(DATA)
+    finally:
+        sender.stop()
+    assert bytes(via.received) == DATA
+    assert not sender.busy()
+
+
+def test_submit_in_the_background(via):
+    sender = PortASender(sm_id=0)
+    sender.start()
+    sender.submit(DATA)
+    assert sender.pending() > 0
+    assert pio_sim.sim.run_until(lambda: not sender.busy())
+    sender.stop()
+    assert bytes(via.received) == DATA
+
+
+def test_receive(via):
+    receiver = PortAReceiver(sm_id=1, size=64)
+    receiver.start()
+    try:
+        via.send(DATA[:50])
+        assert pio_sim.sim.run_until(lambda: not via.outgoing and not via.sending)
+        assert receiver.drain() == DATA[:50]
+        assert receiver.drain() == b''
+    finally:
+        receiver.stop()
+
+
+def test_receive_wraps_the_ring(via):
+    receiver = PortAReceiver(sm_id=1, size=64)
+    receiver.start()
+    received = bytearray()
+    try:
+        via.send(DATA)
+        while len(received) < len(DATA):
+            pio_sim.sim.run(500)
+            received += receiver.drain()
+    finally:
+        receiver.stop()
+    assert bytes(received) == DATA
+    assert receiver.ring.overruns == 0
+
+
+def test_receive_counts_overruns(via):
+    receiver = PortAReceiver(sm_id=1, size=64)
+    receiver.start()
+    try:
+        via.send(DATA[:100])
+        assert pio_sim.sim.run_until(lambda: not via.outgoing and not via.sending)
+        assert receiver.drain() == DATA[36:100]    # the newest 64
+        assert receiver.ring.overruns == 36
+    finally:
+        receiver.stop()
+
+
+def test_send_gives_up_on_a_stalled_6809():
+    pio_sim.reset()
+    SimVIAPortA(latency=10 ** 9)    # never reads the port
+    sender = PortASender(sm_id=0)
+    sender.start()
+    try:
+        with pytest.raises(OSError):
+            sender.send(DATA, timeout_ms=1)
+    finally:
+        sender.stop()
+    assert not sender.dma.active()
@@ -0,0 +1,42 @@
+"Tests for profiles.py's pin checks"
+
+import json
+
+import profiles
+
+
+def write(tmp_path, boards):
+    path = tmp_path / 'boards.json'
+    path.write_text(json.dumps(boards))
+    return str(path)
+
+
+def test_shared_pins_conflict(tmp_path):
+    path = write(tmp_path, {
+        'a': {'pins': {'NMI': 8, 'D0': 17}},
+        'b': {'pins': {'NMI': 8, 'D0': 4}},
+    })
+    assert profiles.pin_conflicts(['a', 'b'], 'rpi', path) == {8: [('a', 'NMI'), ('b', 'NMI')]}
+
+
+def test_board_numbering_is_compared_as_bcm(tmp_path):
+    path = write(tmp_path, {
+        'a': {'numbering': 'BCM', 'pins': {'NMI': 17}},
+        'b': {'numbering': 'BOARD', 'pins': {'D0': 11}},    # header pin 11 is GPIO17
+    })
+    assert profiles.pin_conflicts(['a', 'b'], 'rpi', path) == {17: [('a', 'NMI'), ('b', 'D0')]}
+
+
+def test_emulated_boards_have_their_own_pins(tmp_path):
+    path = write(tmp_path, {
+        'real': {'pins': {'NMI': 8}},
+        'emu': {'backend': 'emu', 'pins': {'NMI': 8}},
+    })
+    assert profiles.pin_conflicts(['real', 'emu'], None, path) == {}
+    assert profiles.pin_conflicts(['real', 'real'], 'sim', path) == {}
+
+
+def test_shipped_profiles(monkeypatch):
+    monkeypatch.delenv('BOARD_GPIO', raising=False)
+    assert profiles.pin_conflicts(['board', 'board1'])
+    assert profiles.pin_conflicts(['board', 'emu1', 'emu2']) == {}
@@ -0,0 +1,84 @@
+"Tests for ring.py's buffers"
+
+import sys
+import threading
+
+import ring
+
+
+def test_queue_empty():
+    q = ring.ByteQueue(8)
+    assert len(q) == 0 and q.free() == 8
+    assert q.get() == b''
+    assert q.get(4) == b''
+
+
+def test_queue_full():
+    q = ring.ByteQueue(8)
+    assert q.put(b'0123456789') == 8     # only what fits
+    assert len(q) == 8 and q.free() == 0
+    assert q.put(b'x') == 0
+    assert q.get() == b'01234567'
+    assert len(q) == 0
+
+
+def test_queue_wraparound():
+    q = ring.ByteQueue(8)
+    q.put(b'abcdef')
+    assert q.get(4) == b'abcd'
+    assert q.put(b'ghijkl') == 6         # runs off the end of the buffer and back to the start
+    assert len(q) == 8
+    assert q.get(3) == b'efg'
+    assert q.get() == b'hijkl'
+
+
+def test_queue_positions_wrap():
+    q = ring.ByteQueue(8)
+    for n in range(100):     # well past 2 * size, so head and tail wrap many times
+        chunk = bytes([n, n + 1, n + 2])
+        assert q.put(chunk) == 3
+        assert q.get() == chunk
+    assert q.head < 16 and q.tail < 16
+    assert len(q) == 0 and q.free() == 8
+
+
+def test_queue_between_threads():
+    q = ring.ByteQueue(64)
+    data = bytes(n * 7 & 0xFF for n in range(5000))
+    out = bytearray()
+
+    def produce():
+        i = 0
+        while i < len(data):
+            i += q.put(data[i:i + 37])
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)     # switch often, so the two sides interleave
+    try:
+        producer = threading.Thread(target=produce)
+        producer.start()
+        while len(out) < len(data):
+            out += q.get(29)
+        producer.join()
+    finally:
+        sys.setswitchinterval(interval)
+    assert bytes(out) == data
+
+
+def test_byte_ring_overrun():
+    r = ring.ByteRing(8)
+    r.write(b'0123456789ab')
+    assert r.drain() == b'456789ab'      # the oldest 4 were lapped
+    assert r.overruns == 4
+    r.write(b'cd')
+    assert r.drain() == b'cd'
+    assert r.drain() == b''
+
+
+def test_array_ring():
+    r = ring.ArrayRing('H', 4)
+    assert r.last(-1) == -1
+    for value in range(6):
+        r.append(value)
+    assert list(r.drain()) == [2, 3, 4, 5]
+    assert r.overruns == 2 and r.last() == 5
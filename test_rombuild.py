@@ -0,0 +1,80 @@
+"Tests for rombuild.py's placement and vector checks"
+
+import pytest
+
+from rombuild import Rom, write_patch
+
+
+def test_place_and_vector():
+    rom = Rom(size=0x1000, base=0xF000)
+    rom.place(0xF000, b'\x12\x34', 'code')
+    rom.set_vector('RESET', 0xF000)
+    assert rom.data[:2] == b'\x12\x34'
+    assert rom.data[-2:] == b'\xF0\x00'
+    assert [name for start, end, name in rom.regions] == ['code', 'RESET vector']
+
+
+def test_mirrored_rom_has_every_copy():
+    # romaker's layout: 8 KiB at 0xF000, so the CPU sees 4 KiB of it
+    rom = Rom(size=8192, base=0xF000)
+    rom.place(0xF000, b'abc', 'code')
+    rom.set_vector('RESET', 0xF000)
+    for copy in (0, 0x1000):
+        assert rom.data[copy:copy + 3] == b'abc'
+        assert rom.data[copy + 0xFFE:copy + 0x1000] == b'\xF0\x00'
+
+
+def test_code_over_the_vectors():
+    rom = Rom(size=8192, base=0xF000)
+    rom.place(0xFFF0, bytes(16), 'code')
+    with pytest.raises(ValueError):
+        rom.set_vector('RESET', 0xF000)
+
+
+def test_vectors_outside_the_rom():
+    rom = Rom(size=0x1000, base=0xE000)
+    with pytest.raises(ValueError):
+        rom.set_vector('RESET', 0xE000)
+    assert rom.data == bytearray([0xFF]) * 0x1000
+
+
+@pytest.mark.parametrize('addr, length', [(0x10800, 1), (0xFFFF, 2), (0xEFFF, 2)])
+def test_place_outside_the_rom(addr, length):
+    rom = Rom(size=8192, base=0xF000)
+    with pytest.raises(ValueError):
+        rom.place(addr, bytes(length), 'far')
+
+
+def test_overlap():
+    rom = Rom(size=0x1000, base=0xF000)
+    rom.place(0xF100, bytes(0x100), 'a')
+    with pytest.raises(ValueError):
+        rom.place(0xF1FF, bytes(2), 'b')
+    rom.place(0xF200, bytes(2), 'c')
+
+
+def test_copies_must_be_whole():
+    with pytest.raises(ValueError):
+        Rom(size=0x1800, base=0xF000)
+
+
+def test_patch_keeps_to_pages():
+    rom = Rom(size=0x1000, base=0xF000)
+    old = bytes(rom.data)
+    rom.place(0xF03E, b'abcd', 'code')     # across the first page boundary
+    rom.place(0xF105, b'x', 'data')
+    records = rom.patch(old, page_size=64)
+    assert records == [(0x3E, b'ab'), (0x40, b'cd'), (0x105, b'x')]
+    assert rom.patch(bytes(rom.data)) == []
+    with pytest.raises(ValueError):
+        rom.patch(old[:-1])
+
+
+def test_write_patch(tmp_path):
+    path = str(tmp_path / 'boot.rom')
+    rom = Rom(size=0x1000, base=0xF000)
+    assert write_patch(rom, path) is None
+    rom.write(path)
+    rom.place(0xF010, b'\x12\x34', 'code')
+    assert write_patch(rom, path) == [(0x10, b'\x12\x34')]
+    assert (tmp_path / 'boot.patch.hex').read_text() == ':020010001234A8\n:00000001FF\n'
@@ -0,0 +1,60 @@
+"Tests for runtime.py: the listen() tasks sharing the bus with downloads"
+
+import asyncio
+
+from runtime import Runtime
+
+DATA = bytes(range(256))
+
+
+def test_tasks_share_the_bus(sim_board):
+    target = sim_board.gpio.target
+    runtime = Runtime(sim_board, console_timeout=0.001, button_interval=0.001,
+                      axis_interval=0.001, nmi_interval=0.001)
+    console = bytearray()
+    runtime.output = console.extend
+
+    async def session():
+        tasks = runtime.start()
+        try:
+            for addr in (0x2000, 0x3000, 0x4000):
+                await runtime.call(sim_board.dload_exec, addr, DATA, addr)
+            target.write(b'hi')
+            for _ in range(100):
+                if console:
+                    break
+                await asyncio.sleep(0.005)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(session())
+    for addr in (0x2000, 0x3000, 0x4000):
+        assert target.memory[addr:addr + len(DATA)] == DATA
+    assert target.execs == [0x2000, 0x3000, 0x4000]
+    assert target.nmi_count > 0
+    assert bytes(console) == b'hi'
+    assert sim_board.bus_owner is None
+
+
+def test_call_waits_for_the_bus(sim_board):
+    runtime = Runtime(sim_board)
+    order = []
+
+    async def holder():
+        async with runtime.bus() as board:
+            assert board is sim_board
+            order.append('held')
+            await asyncio.sleep(0.02)
+            order.append('released')
+
+    async def download():
+        await asyncio.sleep(0)      # let the holder take the lock first
+        await runtime.call(lambda: order.append('download'))
+
+    async def both():
+        await asyncio.gather(holder(), download())
+
+    asyncio.run(both())
+    assert order == ['held', 'released', 'download']
@@ -0,0 +1,37 @@
+"Tests for stats.py, and the statistics a Board collects"
+
+from stats import Histogram, LATENCY_BUCKETS
+
+
+def test_histogram():
+    h = Histogram((1, 10, 100))
+    for value in (0.5, 1, 3, 10, 50, 500):
+        h.add(value)
+    assert list(h.counts) == [2, 2, 1, 1]
+    assert h.samples() == 6 and h.max == 500
+    assert h.mean() == (0.5 + 1 + 3 + 10 + 50 + 500) / 6
+    assert h.percentile(0.3) == 1
+    assert h.percentile(0.5) == 10
+    assert h.percentile(0.8) == 100
+    assert h.percentile(1.0) is None    # above the last bound
+    assert h.as_dict()['buckets'] == {'<=1': 2, '<=10': 2, '<=100': 1, '>100': 1}
+
+
+def test_empty_histogram():
+    h = Histogram(LATENCY_BUCKETS)
+    assert h.samples() == 0 and h.mean() == 0 and h.percentile(0.99) == 0
+
+
+def test_board_stats(sim_board):
+    stats = sim_board.enable_stats()
+    data = bytes(range(200))
+    sim_board.dload_exec(0x2000, data, 0x2000)
+    assert stats.transfers == 1 and stats.transfer_bytes == len(data)
+    assert stats.bytes_sent >= len(data) + 7
+    assert stats.mismatches == 0
+    waits = stats.latency['data_taken']
+    assert waits.samples() == stats.spins['data_taken'].samples() > 0
+    assert 'downloads' in stats.summary()
+    assert sim_board.disable_stats() is stats
+    sim_board.dload_exec(0x2000, data, 0x2000)
+    assert stats.transfers == 1
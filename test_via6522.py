@@ -0,0 +1,117 @@
+"Tests for via6522.py: port latching and the CA1/CA2 and CB1/CB2 handshakes"
+
+from mc6809 import CPU
+from via6522 import (VIA, HIGH, LOW, ORB, ORA, ORA_NH, DDRB, ACR, PCR, IFR, IER,
+                     IFR_CA1, IFR_CB1)
+
+
+def via_on_cpu():
+    "A 6522 at 0xFE00, recording the CA2 and CB2 levels it drives"
+    via = VIA()
+    cpu = CPU(io_base=0xFE00, device=via)
+    via.attach(cpu)
+    via.ca2_levels = []
+    via.cb2_levels = []
+    via.on_ca2 = via.ca2_levels.append
+    via.on_cb2 = via.cb2_levels.append
+    return via
+
+
+def test_port_a_latched_on_ca1():
+    via = via_on_cpu()
+    pins = [0x42]
+    via.pa_pins = lambda: pins[0]
+    via.write(ACR, 0x01)        # latch port A
+    via.write(PCR, 0x00)        # CA1 active on the falling edge
+    via.set_ca1(LOW)
+    assert via.read(IFR) & IFR_CA1
+    pins[0] = 0x99              # the host moves on; the latch holds
+    assert via.read(ORA_NH) == 0x42
+    assert via.read(IFR) & IFR_CA1      # no handshake read
+    assert via.read(ORA) == 0x42
+    assert not via.read(IFR) & IFR_CA1
+
+
+def test_port_a_unlatched():
+    via = via_on_cpu()
+    via.pa_pins = lambda: 0x5A
+    assert via.read(ORA) == 0x5A
+
+
+def test_ca1_rising_edge():
+    via = via_on_cpu()
+    via.write(PCR, 0x01)
+    via.set_ca1(LOW)
+    assert not via.read(IFR) & IFR_CA1
+    via.set_ca1(HIGH)
+    assert via.read(IFR) & IFR_CA1
+
+
+def test_ca2_handshake():
+    via = via_on_cpu()
+    via.write(PCR, 0x08)        # CA2 handshake output
+    via.read(ORA)
+    assert via.ca2 == LOW       # data taken...
+    via.set_ca1(LOW)
+    assert via.ca2 == HIGH      # ...until the next data ready
+    assert via.ca2_levels == [LOW, HIGH]
+
+
+def test_ca2_pulse():
+    via = via_on_cpu()
+    via.write(PCR, 0x0A)        # CA2 pulse output
+    via.read(ORA)
+    assert via.ca2_levels == [LOW, HIGH]
+    via.read(ORA_NH)            # no handshake
+    assert via.ca2_levels == [LOW, HIGH]
+
+
+def test_ca2_manual():
+    via = via_on_cpu()
+    via.write(PCR, 0x0C)
+    assert via.ca2 == LOW
+    via.write(PCR, 0x0E)
+    assert via.ca2 == HIGH
+
+
+def test_cb2_handshake():
+    via = via_on_cpu()
+    via.write(DDRB, 0xFF)
+    via.write(PCR, 0x80)        # CB2 handshake output, CB1 falling
+    via.write(ORB, 0x33)
+    assert via.port_b == 0x33
+    assert via.cb2 == LOW       # data ready...
+    via.set_cb1(LOW)
+    assert via.cb2 == HIGH      # ...until the host takes it
+    assert via.read(IFR) & IFR_CB1
+    via.write(ORB, 0x34)
+    assert not via.read(IFR) & IFR_CB1
+
+
+def test_cb2_pulse():
+    via = via_on_cpu()
+    via.write(PCR, 0xA0)
+    via.write(ORB, 0x01)
+    assert via.cb2_levels == [LOW, HIGH]
+
+
+def test_port_b_latched_on_cb1():
+    via = via_on_cpu()
+    pins = [0x11]
+    via.pb_pins = lambda: pins[0]
+    via.write(ACR, 0x02)
+    via.write(PCR, 0x10)        # CB1 rising
+    via.set_cb1(LOW)
+    via.set_cb1(HIGH)
+    pins[0] = 0x22
+    assert via.read(ORB) == 0x11
+
+
+def test_ca1_interrupt():
+    via = via_on_cpu()
+    via.write(IER, 0x80 | IFR_CA1)
+    via.set_ca1(LOW)
+    assert via.cpu.irq
+    assert via.read(IFR) == 0x80 | IFR_CA1
+    via.read(ORA)
+    assert not via.cpu.irq
@@ -0,0 +1,41 @@
+"""Calibrated handshake timing, persisted per board (runs under MicroPython too).
+
+Fixed delays sized for the slowest case cap throughput, so instead the
+scripts measure the latencies they depend on, pick the smallest interval
+that covers every sample with a margin, and keep the result in
+timing.json under the board's name for next time.
+"""
+
+import json
+
+PATH = 'timing.json'
+MARGIN = 0.5        # fraction added to the worst latency seen
+
+
+def load(name, defaults, path=PATH):
+    "The saved timing for a board, over defaults"
+    values = dict(defaults)
+    try:
+        with open(path) as f:
+            values.update(json.load(f).get(name, {}))
+    except (OSError, ValueError):
+        pass
+    return values
+
+
+def save(name, values, path=PATH):
+    try:
+        with open(path) as f:
+            boards = json.load(f)
+    except (OSError, ValueError):
+        boards = {}
+    boards.setdefault(name, {}).update(values)
+    with open(path, 'w') as f:
+        json.dump(boards, f)
+
+
+def pick(latencies, floor, margin=MARGIN):
+    "Smallest safe interval for these latencies: the worst plus a margin, and at least floor"
+    if not latencies:
+        return None
+    return max(floor, max(latencies) * (1 + margin))
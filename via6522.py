@@ -0,0 +1,329 @@
+"""MOS 6522 VIA model, for the 6809 emulator (see emu.py and mc6809.py).
+
+Ports A and B with input latching and the CA1/CA2 and CB1/CB2 handshakes
+in every PCR mode, timer 1 (one-shot and free-running), timer 2 (one-shot),
+the shift register, and the interrupt flag and enable registers driving
+the CPU's IRQ line. Timers count CPU cycles; they are worked out from the
+cycle count when read, and the CPU is told when the next one expires.
+
+The board side sets the input lines with set_ca1()/set_cb1(), supplies
+the port pins through pa_pins()/pb_pins(), and sees CA2/CB2 change
+through on_ca2/on_cb2.
+"""
+
+from mc6809 import NEVER
+
+HIGH = 1
+LOW = 0
+
+# Register numbers
+ORB, ORA, DDRB, DDRA, T1CL, T1CH, T1LL, T1LH, T2CL, T2CH, SR, ACR, PCR, IFR, IER, ORA_NH = range(16)
+
+# IFR bits
+IFR_CA2 = 0x01
+IFR_CA1 = 0x02
+IFR_SR = 0x04
+IFR_CB2 = 0x08
+IFR_CB1 = 0x10
+IFR_T2 = 0x20
+IFR_T1 = 0x40
+
+# CA2/CB2 output modes (PCR bits 3-1 and 7-5)
+HANDSHAKE = 4
+PULSE = 5
+MANUAL_LOW = 6
+MANUAL_HIGH = 7
+
+IDLE_READS = 3      # identical reads of one register in a row that mean the program is waiting
+
+
+class VIA:
+    "One 6522, clocked by a CPU"
+
+    def __init__(self, cpu=None):
+        self.cpu = cpu
+        self.on_ca2 = None
+        self.on_cb2 = None
+        self.pa_pins = lambda: 0xFF
+        self.pb_pins = lambda: 0xFF
+        self.reset()
+
+    def attach(self, cpu):
+        self.cpu = cpu
+        self.schedule()
+
+    def reset(self):
+        self.ora = self.orb = 0
+        self.ddra = self.ddrb = 0
+        self.ira = self.irb = 0xFF      # latched inputs
+        self.t1_latch = self.t2_latch = 0xFFFF
+        self.t1_expires = self.t2_expires = NEVER
+        self.t1_armed = self.t2_armed = False
+        self.sr = 0
+        self.sr_done = NEVER
+        self.shifted = bytearray()      # bytes shifted out, for inspection
+        self.acr = self.pcr = 0
+        self.ifr = self.ier = 0
+        self.ca1 = self.cb1 = HIGH
+        self.ca2 = self.cb2 = HIGH
+        self.last_read = None
+        self.same_reads = 0
+        self.waiting_since = 0
+        if self.cpu is not None:
+            self.cpu.set_irq(False)
+            self.schedule()
+
+    # CPU side
+
+    def read(self, reg):
+        now = self.cpu.cycles
+        if reg == ORB:
+            value = (self.orb & self.ddrb) | (self.port_b_input() & ~self.ddrb & 0xFF)
+            self.clear(IFR_CB1 | (0 if self.cb2_independent() else IFR_CB2))
+        elif reg == ORA or reg == ORA_NH:
+            value = self.port_a_input()
+            if reg == ORA:
+                self.clear(IFR_CA1 | (0 if self.ca2_independent() else IFR_CA2))
+                self.ca2_access()
+        elif reg == DDRB:
+            value = self.ddrb
+        elif reg == DDRA:
+            value = self.ddra
+        elif reg == T1CL:
+            value = self.t1_count(now) & 0xFF
+            self.clear(IFR_T1)
+        elif reg == T1CH:
+            value = self.t1_count(now) >> 8
+        elif reg == T1LL:
+            value = self.t1_latch & 0xFF
+        elif reg == T1LH:
+            value = self.t1_latch >> 8
+        elif reg == T2CL:
+            value = self.t2_count(now) & 0xFF
+            self.clear(IFR_T2)
+        elif reg == T2CH:
+            value = self.t2_count(now) >> 8
+        elif reg == SR:
+            value = self.sr
+            self.clear(IFR_SR)
+            self.start_shift(now)
+        elif reg == ACR:
+            value = self.acr
+        elif reg == PCR:
+            value = self.pcr
+        elif reg == IFR:
+            value = self.ifr | (0x80 if self.ifr & self.ier else 0)
+        else:
+            value = self.ier | 0x80
+        # A program reading the same value from the same register over
+        # and over is waiting for something to happen: let the CPU skip.
+        if (reg, value) == self.last_read:
+            self.same_reads += 1
+            if self.same_reads >= IDLE_READS:
+                self.cpu.idle(self.waiting_since)
+                self.waiting_since = self.cpu.cycles
+        else:
+            self.last_read = (reg, value)
+            self.same_reads = 0
+            self.waiting_since = now
+        return value
+
+    def write(self, reg, value):
+        now = self.cpu.cycles
+        self.changed()
+        if reg == ORB:
+            self.orb = value
+            self.clear(IFR_CB1 | (0 if self.cb2_independent() else IFR_CB2))
+            mode = self.pcr >> 5
+            if mode == HANDSHAKE:
+                self.set_cb2(LOW)
+            elif mode == PULSE:
+                self.set_cb2(LOW)
+                self.set_cb2(HIGH)
+        elif reg == ORA or reg == ORA_NH:
+            self.ora = value
+            if reg == ORA:
+                self.clear(IFR_CA1 | (0 if self.ca2_independent() else IFR_CA2))
+                self.ca2_access()
+        elif reg == DDRB:
+            self.ddrb = value
+        elif reg == DDRA:
+            self.ddra = value
+        elif reg == T1CL or reg == T1LL:
+            self.t1_latch = (self.t1_latch & 0xFF00) | value
+        elif reg == T1CH:
+            self.t1_latch = (self.t1_latch & 0x00FF) | value << 8
+            self.clear(IFR_T1)
+            # The counter counts down through zero N + 1.5 cycles after loading
+            self.t1_expires = now + self.t1_latch + 1
+            self.t1_armed = True
+        elif reg == T1LH:
+            self.t1_latch = (self.t1_latch & 0x00FF) | value << 8
+            self.clear(IFR_T1)
+        elif reg == T2CL:
+            self.t2_latch = (self.t2_latch & 0xFF00) | value
+        elif reg == T2CH:
+            self.t2_latch = (self.t2_latch & 0x00FF) | value << 8
+            self.clear(IFR_T2)
+            self.t2_expires = now + self.t2_latch + 1
+            self.t2_armed = not self.acr & 0x20     # pulse counting on PB6 isn't modelled
+        elif reg == SR:
+            self.sr = value
+            self.clear(IFR_SR)
+            self.start_shift(now)
+        elif reg == ACR:
+            self.acr = value
+        elif reg == PCR:
+            self.pcr = value
+            for mode, set_line in ((value >> 1 & 7, self.set_ca2), (value >> 5, self.set_cb2)):
+                if mode == MANUAL_LOW:
+                    set_line(LOW)
+                elif mode == MANUAL_HIGH or mode < HANDSHAKE:
+                    set_line(HIGH)
+        elif reg == IFR:
+            self.clear(value & 0x7F)
+        else:
+            if value & 0x80:
+                self.ier |= value & 0x7F
+            else:
+                self.ier &= ~value
+            self.irq()
+        self.schedule()
+
+    def update(self):
+        "Called by the CPU when a timer or the shift register is due"
+        now = self.cpu.cycles
+        if now >= self.t1_expires:
+            if self.t1_armed:
+                self.flag(IFR_T1)
+            if self.acr & 0x40:     # free-running: reload from the latch
+                period = self.t1_latch + 2
+                self.t1_expires += period * ((now - self.t1_expires) // period + 1)
+            else:
+                self.t1_armed = False
+                self.t1_expires = NEVER
+        if now >= self.t2_expires:
+            if self.t2_armed:
+                self.flag(IFR_T2)
+            self.t2_armed = False
+            self.t2_expires = NEVER
+        if now >= self.sr_done:
+            self.sr_done = NEVER
+            self.flag(IFR_SR)
+        self.schedule()
+
+    def schedule(self):
+        self.cpu.next_event = min(self.t1_expires, self.t2_expires, self.sr_done)
+
+    # Board side
+
+    def set_ca1(self, level):
+        if level == self.ca1:
+            return
+        self.ca1 = level
+        if level == (self.pcr & 0x01):     # the active edge
+            if self.acr & 0x01:
+                self.ira = self.pa_pins()
+            self.flag(IFR_CA1)
+            if self.pcr >> 1 & 7 == HANDSHAKE:
+                self.set_ca2(HIGH)
+
+    def set_cb1(self, level):
+        if level == self.cb1:
+            return
+        self.cb1 = level
+        if level == (self.pcr >> 4 & 0x01):
+            if self.acr & 0x02:
+                self.irb = self.pb_pins()
+            self.flag(IFR_CB1)
+            if self.pcr >> 5 == HANDSHAKE:
+                self.set_cb2(HIGH)
+
+    @property
+    def port_a(self):
+        "What port A drives onto its pins (inputs float high)"
+        return (self.ora & self.ddra) | (~self.ddra & 0xFF)
+
+    @property
+    def port_b(self):
+        return (self.orb & self.ddrb) | (~self.ddrb & 0xFF)
+
+    # Internals
+
+    def port_a_input(self):
+        pins = self.ira if self.acr & 0x01 else self.pa_pins()
+        return (pins & ~self.ddra & 0xFF) | (self.ora & self.ddra)
+
+    def port_b_input(self):
+        return self.irb if self.acr & 0x02 else self.pb_pins()
+
+    def ca2_independent(self):
+        return self.pcr & 0x0A == 0x02     # input modes 001 and 011
+
+    def cb2_independent(self):
+        return self.pcr & 0xA0 == 0x20
+
+    def ca2_access(self):
+        "A read or write of ORA, as the CA2 output modes see it"
+        mode = self.pcr >> 1 & 7
+        if mode == HANDSHAKE:
+            self.set_ca2(LOW)
+        elif mode == PULSE:
+            self.set_ca2(LOW)
+            self.set_ca2(HIGH)
+
+    def set_ca2(self, level):
+        if level != self.ca2:
+            self.ca2 = level
+            if self.on_ca2 is not None:
+                self.on_ca2(level)
+
+    def set_cb2(self, level):
+        if level != self.cb2:
+            self.cb2 = level
+            if self.on_cb2 is not None:
+                self.on_cb2(level)
+
+    def t1_count(self, now):
+        if self.t1_expires == NEVER:
+            return 0xFFFF
+        return (self.t1_expires - now - 1) & 0xFFFF
+
+    def t2_count(self, now):
+        if self.t2_expires == NEVER:
+            return 0xFFFF
+        return (self.t2_expires - now - 1) & 0xFFFF
+
+    def start_shift(self, now):
+        "Shift modes that finish on their own set the SR flag after 8 bits"
+        mode = self.acr >> 2 & 7
+        if mode in (1, 5):                  # under T2
+            bit_time = 2 * ((self.t2_latch & 0xFF) + 2)
+        elif mode in (2, 6):                # at half the system clock
+            bit_time = 2
+        else:
+            self.sr_done = NEVER
+            if mode == 4:                   # free-running out under T2
+                self.shifted.append(self.sr)
+            return
+        if mode >= 4:
+            self.shifted.append(self.sr)
+        self.sr_done = now + 8 * bit_time
+
+    def flag(self, bits):
+        self.ifr |= bits
+        self.changed()
+        self.irq()
+
+    def clear(self, bits):
+        if self.ifr & bits:
+            self.ifr &= ~bits
+            self.irq()
+
+    def irq(self):
+        self.cpu.set_irq(bool(self.ifr & self.ier & 0x7F))
+
+    def changed(self):
+        "Something happened that a waiting program might be looking for"
+        self.last_read = None
+        self.same_reads = 0